@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Agent runs: how many may run at once, how many may wait and for how long.
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "16"))
+AGENT_QUEUE_SIZE = int(os.getenv("AGENT_QUEUE_SIZE", "64"))
+AGENT_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AGENT_QUEUE_TIMEOUT_SECONDS", "30"))
+# Model calls: in-flight limit and the provider's quota (0 disables a limit).
+# The defaults match Groq's free tier for the configured model. They are
+# totals for the deployment: uvicorn starts $WEB_CONCURRENCY workers by
+# default, and each worker enforces its share.
+WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def _per_worker(total: int) -> int:
+    return max(1, total // WORKERS) if total else 0
+
+
+LLM_MAX_CONCURRENCY = _per_worker(int(os.getenv("LLM_MAX_CONCURRENCY", "8")))
+LLM_RPM = _per_worker(int(os.getenv("LLM_RPM", "30")))
+LLM_TPM = _per_worker(int(os.getenv("LLM_TPM", "8000")))
+LLM_MAX_WAIT_SECONDS = float(os.getenv("LLM_MAX_WAIT_SECONDS", "60"))
+# Reserved for the completion until the response reports real usage.
+LLM_OUTPUT_TOKENS = 512
+# Pause after the provider answers 429 without saying for how long.
+RATE_LIMIT_COOLDOWN_SECONDS = 5.0
+
+_RETRY_RE = re.compile(r"try again in (?:(\d+)m)?(\d+(?:\.\d+)?)(ms|s)", re.IGNORECASE)
+
+
+class Overloaded(Exception):
+    # Raised instead of queueing work that cannot start in time; endpoints
+    # turn it into 503 with Retry-After.
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class Slots:
+    # FIFO counting semaphore whose waiters give up at a timeout. Futures are
+    # created on the running loop, so the instance is not tied to one loop.
+    def __init__(self, size: int):
+        self.size = size
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float) -> bool:
+        if self.active < self.size and not self._waiters:
+            self.active += 1
+            return True
+        if timeout <= 0:
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up.
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                return False
+            raise
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+
+class TokenBucket:
+    # `per_minute` units per minute: a burst of up to a quarter of that, and
+    # the rest refilled continuously, so no 60-second window (however the
+    # provider counts it) can see more than `per_minute`. take() charges the
+    # full amount and may drive the level negative; later callers then wait
+    # for the debt to be repaid, which keeps them in arrival order.
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute // 4 or per_minute
+        self.rate = (per_minute - self.capacity) / 60 or per_minute / 60
+        self.level = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float):
+        if self.capacity:
+            self._refill()
+            self.level -= amount
+
+    def refund(self, amount: float):
+        if self.capacity:
+            self.level = min(self.capacity, self.level + amount)
+
+    def backlog(self) -> float:
+        # Seconds until the bucket is out of debt.
+        if not self.capacity:
+            return 0.0
+        self._refill()
+        return max(0.0, -self.level / self.rate)
+
+
+class LlmLimiter:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY, rpm: int = LLM_RPM, tpm: int = LLM_TPM,
+                 max_wait: float = LLM_MAX_WAIT_SECONDS):
+        self.slots = Slots(max_concurrency)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_wait = max_wait
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.rate_limited = 0
+        self.throttled_seconds = 0.0
+
+    def backlog(self) -> float:
+        return max(self.requests.backlog(), self.tokens.backlog(), self.cooldown_until - time.monotonic())
+
+    async def acquire(self, tokens: int) -> dict:
+        start = time.monotonic()
+        if not await self.slots.acquire(self.max_wait):
+            raise Overloaded("Too many model calls are waiting.", self.max_wait)
+        ticket = {"reserved": tokens, "used": None, "released": False}
+        try:
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens),
+                       self.cooldown_until - time.monotonic())
+            if time.monotonic() - start + wait > self.max_wait:
+                raise Overloaded("The model's rate limit is exhausted.", wait)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except BaseException:
+            self.release(ticket)
+            raise
+        self.throttled_seconds += time.monotonic() - start
+        self.calls += 1
+        return ticket
+
+    def release(self, ticket: dict):
+        if ticket["released"]:
+            return
+        ticket["released"] = True
+        self.slots.release()
+        if ticket["used"] is not None:
+            self.tokens.refund(ticket["reserved"] - ticket["used"])
+
+    def cool_down(self, error: Exception):
+        # The provider rejected a call despite the buckets (e.g. another client
+        # shares the key): hold back new calls for as long as it asks.
+        match = _RETRY_RE.search(str(error))
+        if match:
+            minutes, amount, unit = match.groups()
+            seconds = int(minutes or 0) * 60 + float(amount) / (1000 if unit.lower() == "ms" else 1)
+        else:
+            seconds = RATE_LIMIT_COOLDOWN_SECONDS
+        self.rate_limited += 1
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+        logger.warning(f"Model rate limited, pausing calls for {seconds:.1f}s")
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.slots.active,
+            "waiting": self.slots.waiting,
+            "calls": self.calls,
+            "rate_limited": self.rate_limited,
+            "backlog_seconds": round(self.backlog(), 2),
+            "avg_wait_ms": round(self.throttled_seconds / self.calls * 1000, 1) if self.calls else 0.0,
+        }
+
+
+class AdmissionGate:
+    # Bounds concurrent agent runs. Requests beyond `max_active` wait in FIFO
+    # order for up to `timeout` seconds; once `max_queue` are waiting, or the
+    # model's rate-limit backlog alone exceeds the timeout, new requests are
+    # rejected straight away with an estimate of when to retry.
+    def __init__(self, limiter: LlmLimiter, max_active: int = AGENT_MAX_CONCURRENCY,
+                 max_queue: int = AGENT_QUEUE_SIZE, timeout: float = AGENT_QUEUE_TIMEOUT_SECONDS):
+        self.limiter = limiter
+        self.slots = Slots(max_active)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.avg_run_seconds = 5.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        queued_runs = (self.slots.waiting + 1) / max(1, self.slots.size)
+        return max(self.limiter.backlog(), queued_runs * self.avg_run_seconds)
+
+    def check(self):
+        if self.limiter.backlog() > self.timeout:
+            self.rejected += 1
+            raise Overloaded("The model's rate limit is saturated.", self.retry_after())
+        if self.slots.active >= self.slots.size and self.slots.waiting >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("Too many requests are queued.", self.retry_after())
+
+    @asynccontextmanager
+    async def admit(self):
+        self.check()
+        if not await self.slots.acquire(self.timeout):
+            self.rejected += 1
+            raise Overloaded("Timed out waiting for a free slot.", self.retry_after())
+        self.admitted += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.slots.release()
+            self.avg_run_seconds = 0.8 * self.avg_run_seconds + 0.2 * (time.monotonic() - start)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.slots.active,
+            "queued": self.slots.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_run_seconds": round(self.avg_run_seconds, 2),
+            "llm": self.limiter.stats(),
+        }
+
+
+llm_limiter = LlmLimiter()
+agent_admission = AdmissionGate(llm_limiter)
@@ -0,0 +1,56 @@
+# Everything the endpoints need from ADK. Importing this module loads
+# google.adk and litellm, which is most of the startup time, so app.main
+# imports it in lifespan rather than at module level.
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.events.event import Event
+from google.adk.memory import InMemoryMemoryService
+from google.adk.runners import Runner
+from google.genai.types import Content, Part
+
+from .agents.agent import direct_agent, root_agent, use_direct_route
+from .state import session_service
+
+# What app.main uses, as app.state.agents.<name>; use_direct_route is re-exported.
+__all__ = ["build_runners", "record_cached_turn", "streaming_config", "use_direct_route", "user_message"]
+
+
+def build_runners():
+    # Sessions live where STATE_BACKEND says; artifacts and memory are not
+    # used by the agents.
+    runner = Runner(
+        app_name="agents",
+        agent=root_agent,
+        session_service=session_service(),
+        artifact_service=InMemoryArtifactService(),
+        memory_service=InMemoryMemoryService(),
+    )
+    # The direct route shares the root runner's services so a conversation can
+    # move between the two agents within one session.
+    direct_runner = Runner(
+        app_name="agents",
+        agent=direct_agent,
+        session_service=runner.session_service,
+        artifact_service=runner.artifact_service,
+        memory_service=runner.memory_service,
+    )
+    return runner, direct_runner
+
+
+def user_message(prompt: str) -> Content:
+    return Content(parts=[Part(text=prompt)], role="user")
+
+
+def streaming_config() -> RunConfig:
+    return RunConfig(streaming_mode=StreamingMode.SSE)
+
+
+async def record_cached_turn(runner, sessions, session_id: str, prompt: str, response: str):
+    # Replay the cached exchange into the session so follow-ups have context.
+    session = await runner.session_service.get_session(
+        app_name=sessions.app_name, user_id=sessions.user_id, session_id=session_id
+    )
+    await runner.session_service.append_event(session, Event(author="user", content=user_message(prompt)))
+    await runner.session_service.append_event(
+        session, Event(author=root_agent.name, content=Content(parts=[Part(text=response)], role="model"))
+    )
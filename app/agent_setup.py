@@ -1,24 +1,106 @@
 import os
+import time
 from dotenv import load_dotenv
 
 import litellm
+from google.adk.models.base_llm import BaseLlm
 from google.adk.models.lite_llm import LiteLlm
+from google.adk.models.llm_request import LlmRequest
+from opentelemetry.trace import StatusCode
 
 load_dotenv()
 
+# Imported after load_dotenv(): the limits are read from the environment.
+from .admission import LLM_OUTPUT_TOKENS, Overloaded, llm_limiter
+from .telemetry import tracer
+from .tokens import fit_context
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 if not GROQ_API_KEY:
     print("WARNING: Missing GROQ_API_KEY in .env")
     GROQ_API_KEY = "dummy_key"
 
+LLM_API_BASE = os.getenv("LLM_API_BASE", "https://api.groq.com/openai/v1")
+# Rate limits are handled by the admission limiter; retrying 429s many times
+# over only multiplies the load during a spike.
+LLM_NUM_RETRIES = int(os.getenv("LLM_NUM_RETRIES", "2"))
+
 litellm.api_key = GROQ_API_KEY
-litellm.api_base = "https://api.groq.com/openai/v1"
-litellm.num_retries = 10
+litellm.api_base = LLM_API_BASE
+litellm.num_retries = LLM_NUM_RETRIES
 
 MODEL_NAME = "openai/openai/gpt-oss-120b"
 
-llm = LiteLlm(
+
+def estimate_tokens(llm_request: LlmRequest, prompt_tokens: int) -> int:
+    # The prompt's local token count plus the completion allowance.
+    config = llm_request.config
+    output = getattr(config, "max_output_tokens", None) or LLM_OUTPUT_TOKENS
+    return prompt_tokens + output
+
+
+class AdmittedLlm(BaseLlm):
+    # Wraps the real model so every call, including those made by sub-agents,
+    # goes through llm_limiter first.
+    llm: BaseLlm
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False):
+        # The slot is released before the final response is yielded: ADK runs
+        # the tools it asks for (including sub-agents, which call the model
+        # again) while this generator is suspended. For the same reason the
+        # span ends there too, unlike ADK's call_llm span.
+        labels = getattr(llm_request.config, "labels", None) or {}
+        span = tracer.start_span("llm.generate", attributes={
+            "gen_ai.request.model": llm_request.model or self.model,
+            "gen_ai.agent.name": labels.get("adk_agent_name", ""),
+        })
+        start = time.monotonic()
+        ticket = None
+        try:
+            # Counted from cached per-block token counts; over the context
+            # budget the oldest turns are dropped before anything is sent.
+            context = fit_context(llm_request)
+            tokens = estimate_tokens(llm_request, context["tokens"])
+            span.set_attribute("app.llm.prompt_tokens", context["tokens"])
+            span.set_attribute("app.llm.estimated_tokens", tokens)
+            if context["trimmed_turns"]:
+                span.set_attribute("app.llm.trimmed_turns", context["trimmed_turns"])
+            if context["truncated_outputs"]:
+                span.set_attribute("app.llm.truncated_outputs", context["truncated_outputs"])
+            ticket = await llm_limiter.acquire(tokens)
+            span.set_attribute("app.llm.queue_seconds", time.monotonic() - start)
+            async for response in self.llm.generate_content_async(llm_request, stream):
+                usage = response.usage_metadata
+                if usage and usage.total_token_count:
+                    ticket["used"] = usage.total_token_count
+                    span.set_attribute("gen_ai.usage.input_tokens", usage.prompt_token_count or 0)
+                    span.set_attribute("gen_ai.usage.output_tokens", usage.candidates_token_count or 0)
+                    span.set_attribute("gen_ai.usage.cached_input_tokens", usage.cached_content_token_count or 0)
+                if not response.partial:
+                    llm_limiter.release(ticket)
+                    span.end()
+                yield response
+        except Exception as e:
+            if isinstance(e, Overloaded):
+                span.set_attribute("app.outcome", "rejected")
+            else:
+                span.record_exception(e)
+                span.set_status(StatusCode.ERROR, str(e))
+            if "RateLimitError" in type(e).__name__ or "429" in str(e):
+                llm_limiter.cool_down(e)
+            raise
+        finally:
+            if ticket is not None:
+                llm_limiter.release(ticket)
+            if span.is_recording():
+                span.end()
+
+
+llm = AdmittedLlm(
     model=MODEL_NAME,
-    api_key=GROQ_API_KEY,
-    api_base="https://api.groq.com/openai/v1",
+    llm=LiteLlm(
+        model=MODEL_NAME,
+        api_key=GROQ_API_KEY,
+        api_base=LLM_API_BASE,
+    ),
 )
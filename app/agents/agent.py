@@ -1,35 +1,53 @@
 import base64
 import logging
 import os
-from datetime import date
+import re
 
 from google.adk.agents import LlmAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
 
-from .prompts import return_instructions_root
+from .prompts import ASSISTANT_IDENTITY, return_instructions_direct, return_instructions_root, with_context
 from .tools import call_sql_agent, generate_plot
+from .sub_agents.sql_agent.tools import SQL_WORKFLOW, column_stats, execute_sql, get_schema
 from app.agent_setup import llm
 
 logging.basicConfig(level=logging.INFO)
 _logger = logging.getLogger(__name__)
 
+# "root": every question goes through the root agent and call_sql_agent.
+# "auto": questions that don't ask for a chart go straight to direct_agent,
+# saving the root agent's extra LLM round trip.
+AGENT_ROUTING = os.getenv("AGENT_ROUTING", "root").lower()
+
+_CHART_RE = re.compile(r"\b(chart|plot|graph|visuali[sz]e)", re.IGNORECASE)
+
+def wants_chart(prompt: str) -> bool:
+    return bool(_CHART_RE.search(prompt))
+
+def use_direct_route(prompt: str, routing: str = None) -> bool:
+    return (routing or AGENT_ROUTING) == "auto" and not wants_chart(prompt)
+
 def get_root_agent() -> LlmAgent:
     tools = [call_sql_agent, generate_plot]
     
     agent = LlmAgent(
         model=llm,
         name="data_science_root_agent",
-        instruction=return_instructions_root(),
-        global_instruction=(
-            f"""
-            You are a Data Science AI Assistant.
-            Todays date: {date.today()}
-            """
-        ),
+        instruction=with_context(ASSISTANT_IDENTITY + return_instructions_root()),
         tools=tools,
         generate_content_config=types.GenerateContentConfig(temperature=0),
     )
     return agent
 
+def get_direct_agent() -> LlmAgent:
+    return LlmAgent(
+        model=llm,
+        name="direct_sql_agent",
+        instruction=with_context(ASSISTANT_IDENTITY + SQL_WORKFLOW + return_instructions_direct()),
+        tools=[get_schema, execute_sql, column_stats],
+        generate_content_config=types.GenerateContentConfig(temperature=0),
+    )
+
 root_agent = get_root_agent()
+direct_agent = get_direct_agent()
@@ -1 +0,0 @@
-from .sql_agent.tools import sql_agent
@@ -1 +1,8 @@
-from .tools import sql_agent
+# Resolved on first access, so importing the schema cache from this package
+# does not load the ADK stack.
+def __getattr__(name):
+    if name == "sql_agent":
+        from .tools import sql_agent
+
+        return sql_agent
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
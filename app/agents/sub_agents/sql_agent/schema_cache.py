@@ -0,0 +1,150 @@
+import logging
+import os
+import sqlite3
+import threading
+
+from app.approx import definitions as sample_definitions
+from app.db import DB_FILE, db_version, pool
+from .schema_index import SchemaIndex, select_tables
+
+logger = logging.getLogger(__name__)
+
+DISTINCT_SAMPLE_ROWS = 200
+DISTINCT_VALUES = 10
+SCHEMA_TOP_K = int(os.getenv("SCHEMA_TOP_K", "8"))
+SCHEMA_TOKEN_BUDGET = int(os.getenv("SCHEMA_TOKEN_BUDGET", "2000"))
+
+
+def load_tables(db_file: str = DB_FILE) -> list:
+    if db_file == DB_FILE:
+        with pool.reader() as conn:
+            return _load_tables(conn)
+    conn = sqlite3.connect(db_file)
+    try:
+        return _load_tables(conn)
+    finally:
+        conn.close()
+
+
+def _load_tables(conn) -> list:
+    cursor = conn.cursor()
+    # Rollup and sample tables are internal: execute_sql rewrites queries onto them.
+    cursor.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' "
+        "AND name NOT LIKE 'rollup\\_%' ESCAPE '\\' AND name NOT LIKE 'approx\\_%' ESCAPE '\\'"
+    )
+    tables = cursor.fetchall()
+    samples = {d["source"]: d for d in sample_definitions(conn)}
+
+    infos = []
+    for table, create_sql in tables:
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [(col[1], col[2]) for col in cursor.fetchall()]
+
+        cursor.execute(f"PRAGMA foreign_key_list({table})")
+        foreign_keys = sorted({fk[2] for fk in cursor.fetchall()})
+
+        # Sample rows and distinct values come from the table's maintained
+        # sample when it has one (rows from all over the table), else from a
+        # bounded prefix so that low-cardinality columns never turn into a
+        # full scan.
+        sample = samples.get(table)
+        quoted = ", ".join(f'"{name}"' for name, _ in columns)
+        if sample:
+            source = f'(SELECT * FROM "{sample["sample"]}" ORDER BY approx_slot LIMIT {DISTINCT_SAMPLE_ROWS})'
+            cursor.execute(f'SELECT {quoted} FROM "{sample["sample"]}" ORDER BY approx_slot LIMIT 3')
+        else:
+            source = f"(SELECT * FROM {table} LIMIT {DISTINCT_SAMPLE_ROWS})"
+            cursor.execute(f"SELECT * FROM {table} LIMIT 3")
+        rows = [tuple(row) for row in cursor.fetchall()]
+
+        distinct_values = {}
+        for name, ctype in columns:
+            if ctype.upper() not in ("TEXT", ""):
+                continue
+            cursor.execute(f'SELECT DISTINCT "{name}" FROM {source} LIMIT {DISTINCT_VALUES}')
+            distinct_values[name] = [row[0] for row in cursor.fetchall() if row[0] is not None]
+
+        infos.append({
+            "name": table,
+            "sql": create_sql or "",
+            "columns": columns,
+            "foreign_keys": foreign_keys,
+            "sample_rows": rows,
+            "distinct_values": distinct_values,
+            "approximate": bool(sample),
+        })
+    return infos
+
+
+def render_table(info: dict) -> str:
+    columns = [f"{name} ({ctype})" for name, ctype in info["columns"]]
+    rendered = f"""
+            Table: {info['name']}
+            Columns: {', '.join(columns)}
+            Sample Rows: {info['sample_rows']}
+            """
+    if info.get("approximate"):
+        rendered += "Approximate answers available (column_stats, execute_sql approximate=True)\n            "
+    return rendered
+
+
+class SchemaCache:
+    def __init__(self, probe, db_file: str = DB_FILE):
+        self._probe = probe
+        self._db_file = db_file
+        self._lock = threading.Lock()
+        self._version = None
+        self._tables = None
+        self._rendered = None
+        self._index = None
+        self.hits = 0
+        self.misses = 0
+
+    def _refresh(self):
+        version = self._probe.current()
+        if version == self._version and self._tables is not None:
+            self.hits += 1
+            return
+        self.misses += 1
+        logger.info(f"Schema cache miss, reloading catalog (version={version})")
+        tables = load_tables(self._db_file)
+        self._tables = tables
+        self._rendered = None
+        self._index = None
+        # The version is read before introspecting, so a commit that races the
+        # load shows up as another miss on the next call, never as a stale hit.
+        self._version = version
+
+    def tables(self) -> list:
+        with self._lock:
+            self._refresh()
+            return self._tables
+
+    def render(self) -> str:
+        with self._lock:
+            self._refresh()
+            if self._rendered is None:
+                self._rendered = "\n".join(render_table(info) for info in self._tables)
+            return self._rendered
+
+    def render_for(self, question: str, top_k: int = SCHEMA_TOP_K, token_budget: int = SCHEMA_TOKEN_BUDGET) -> str:
+        with self._lock:
+            self._refresh()
+            if self._index is None:
+                self._index = SchemaIndex(self._tables)
+            index = self._index
+        return select_tables(index, question, render_table, top_k, token_budget)
+
+    def render_tables(self, names: list) -> str:
+        wanted = {name.lower() for name in names}
+        tables = [info for info in self.tables() if info["name"].lower() in wanted]
+        return "\n".join(render_table(info) for info in tables)
+
+    def invalidate(self):
+        with self._lock:
+            self._probe.bump()
+            self._version = None
+
+
+schema_cache = SchemaCache(db_version)
@@ -0,0 +1,136 @@
+import math
+import re
+from collections import Counter
+
+_WORD_RE = re.compile(r"[A-Za-z]+|\d+")
+_CAMEL_RE = re.compile(r"(?<=[a-z])(?=[A-Z])")
+_COMMENT_RE = re.compile(r"--([^\n]*)|/\*(.*?)\*/", re.S)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "for", "from", "give",
+    "how", "i", "in", "is", "it", "list", "me", "many", "much", "my", "of", "on", "or",
+    "please", "show", "tell", "than", "that", "the", "their", "there", "to", "total",
+    "was", "we", "what", "when", "where", "which", "who", "with", "all", "each", "per",
+    "chart", "plot", "graph", "visualize", "pie", "bar", "line", "scatter", "top",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list:
+    tokens = []
+    for chunk in re.split(r"[^A-Za-z0-9]+", _CAMEL_RE.sub(" ", str(text))):
+        for word in _WORD_RE.findall(chunk):
+            word = word.lower()
+            if word in STOPWORDS or len(word) < 2:
+                continue
+            tokens.append(_stem(word))
+    return tokens
+
+
+def table_comments(create_sql: str) -> str:
+    if not create_sql:
+        return ""
+    return " ".join(a or b for a, b in _COMMENT_RE.findall(create_sql))
+
+
+def table_document(info: dict) -> list:
+    # Names are the strongest signal, so the table name is counted twice and
+    # column names once each; comments and sampled values only add recall.
+    parts = [info["name"], info["name"]]
+    parts.extend(name for name, _ in info["columns"])
+    parts.append(table_comments(info.get("sql", "")))
+    for values in info.get("distinct_values", {}).values():
+        parts.extend(str(v) for v in values)
+    return tokenize(" ".join(parts))
+
+
+class SchemaIndex:
+    def __init__(self, tables: list, k1: float = 1.2, b: float = 0.75):
+        self.tables = tables
+        self.rendered = None
+        self.k1 = k1
+        self.b = b
+        self._docs = [Counter(table_document(info)) for info in tables]
+        self._lengths = [sum(doc.values()) for doc in self._docs]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        doc_freq = Counter()
+        for doc in self._docs:
+            doc_freq.update(doc.keys())
+        n = len(self._docs)
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()
+        }
+
+    def score(self, question: str) -> list:
+        terms = set(tokenize(question))
+        scores = []
+        for i, doc in enumerate(self._docs):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / (self._avg_length or 1))
+            for term in terms:
+                tf = doc.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append((score, i))
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return scores
+
+    def search(self, question: str, top_k: int) -> list:
+        return [self.tables[i] for score, i in self.score(question)[:top_k] if score > 0]
+
+
+def select_tables(index: SchemaIndex, question: str, render, top_k: int, token_budget: int) -> str:
+    if index.rendered is None:
+        index.rendered = [render(info) for info in index.tables]
+    rendered_all = index.rendered
+    if sum(estimate_tokens(text) for text in rendered_all) <= token_budget:
+        return "\n".join(rendered_all)
+
+    by_name = {info["name"]: i for i, info in enumerate(index.tables)}
+    chosen = []
+    for info in index.search(question, top_k):
+        # A hit may already be in as the foreign-key target of an earlier one.
+        if info["name"] not in chosen:
+            chosen.append(info["name"])
+        # Pull in the tables this one references so the joins stay writable.
+        for ref in info.get("foreign_keys", []):
+            if ref in by_name and ref not in chosen:
+                chosen.append(ref)
+
+    parts = []
+    used = 0
+    for name in chosen:
+        text = rendered_all[by_name[name]]
+        cost = estimate_tokens(text)
+        if parts and used + cost > token_budget:
+            break
+        parts.append(text)
+        used += cost
+
+    others = [info["name"] for info in index.tables if info["name"] not in chosen[:len(parts)]]
+    if others:
+        # The name-only listing is capped so it never crowds out real schema.
+        header = """
+            Other tables (call get_schema with `tables` to see their columns): """
+        listing_budget = max(0, min(token_budget - used, token_budget // 4) - estimate_tokens(header))
+        listing = ""
+        for i, name in enumerate(others):
+            candidate = f"{listing}, {name}" if listing else name
+            if estimate_tokens(candidate) > listing_budget:
+                listing += f", ... ({len(others) - i} more)" if listing else f"... ({len(others)} tables)"
+                break
+            listing = candidate
+        parts.append(header + listing + "\n")
+
+    return "\n".join(parts)
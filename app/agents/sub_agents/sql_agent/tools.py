@@ -1,86 +1,121 @@
-import sqlite3
+import asyncio
 import logging
 from google.adk.agents import LlmAgent
+from google.adk.tools import ToolContext
+from opentelemetry import trace
+
+from app.approx import column_stats as sketch_stats, refresh_in_background
+from app.cache import record_sql
+from app.db import run_read
+from app.engines import query_engine, run_query
+from app.results import result_handles
+from .schema_cache import schema_cache
 
-DB_FILE = "demo.db"
 logger = logging.getLogger(__name__)
 
-def get_schema():
+def _question_from_context(tool_context) -> str:
+    # Under call_sql_agent the AgentTool request is the sub-agent's user
+    # message; on the direct route it is the user's own question.
+    if tool_context is None:
+        return ""
+    user_content = tool_context.user_content
+    if user_content and user_content.parts:
+        return " ".join(part.text for part in user_content.parts if part.text)
+    return ""
+
+
+async def get_schema(tables: str = "", tool_context: ToolContext = None):
+    # A cache miss introspects the catalog, so it runs off the event loop.
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-        tables = [row[0] for row in cursor.fetchall()]
-        
-        full_schema_info = []
-        
-        for table in tables:
-            cursor.execute(f"PRAGMA table_info({table})")
-            columns = [f"{col[1]} ({col[2]})" for col in cursor.fetchall()]
-            
-            cursor.execute(f"SELECT * FROM {table} LIMIT 3")
-            rows = cursor.fetchall()
-            
-            table_info = f"""
-            Table: {table}
-            Columns: {', '.join(columns)}
-            Sample Rows: {rows}
-            """
-            full_schema_info.append(table_info)
-            
-        conn.close()
-        
-        if not full_schema_info:
+        if tables:
+            names = [t.strip() for t in tables.split(",") if t.strip()]
+            schema = await asyncio.to_thread(schema_cache.render_tables, names)
+        else:
+            question = _question_from_context(tool_context)
+            schema = await asyncio.to_thread(schema_cache.render_for, question)
+
+        if not schema:
             return "No tables found in database."
-            
-        return "\n".join(full_schema_info)
-        
+
+        trace.get_current_span().set_attribute("app.schema.chars", len(schema))
+        return schema
+
     except Exception as e:
+        trace.get_current_span().set_attribute("app.outcome", "error")
         return f"Error loading schema: {e}"
 
-def execute_sql(query: str):
-    logger.info(f"Executing SQL: {query}")
+async def execute_sql(query: str, approximate: bool = False):
+    logger.info(f"Executing SQL{' (approximate)' if approximate else ''}: {query}")
     try:
-        query = query.replace("```sql", "").replace("```", "").strip()
-        
-        if query.strip().upper().startswith("SELECT") and "LIMIT" not in query.upper():
-            query += " LIMIT 10"
-
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute(query)
-        columns = [description[0] for description in cursor.description]
-        rows = cursor.fetchall()
-        conn.close()
-        
-        result = [dict(zip(columns, row)) for row in rows]
-        result_str = str(result)
-        if len(result_str) > 2000:
-             return result_str[:2000] + "... (truncated)"
-        return result_str
+        query = query.replace("```sql", "").replace("```", "").strip().rstrip(";").strip()
+
+        # Only a token-budgeted preview reaches the model; totals and numeric
+        # summaries cover every row, and the result_id lets generate_plot
+        # read the full data itself.
+        result = await run_query(query_engine.execute, query, approximate)
+        record_sql(result.query, result.fingerprint())
+        # The surrounding span is ADK's "execute_tool execute_sql".
+        span = trace.get_current_span()
+        span.set_attribute("db.rows", result.total)
+        span.set_attribute("app.sql.rewritten", result.query != query)
+        span.set_attribute("app.sql.approximate", bool(result.note and result.note.startswith("approximate")))
+        # Registering may write to the shared state store.
+        result_id = await asyncio.to_thread(result_handles.register, result)
+        return result.render(result_id)
     except Exception as e:
+        trace.get_current_span().set_attribute("app.outcome", "error")
         return f"Error executing SQL: {e}"
 
+async def column_stats(table: str, columns: str = ""):
+    # Answered from the table's stored sketches, without scanning it.
+    try:
+        names = [c.strip() for c in columns.split(",") if c.strip()]
+        text, stale = await run_read(sketch_stats, table, names)
+        if stale:
+            refresh_in_background(table)
+        return text
+    except Exception as e:
+        trace.get_current_span().set_attribute("app.outcome", "error")
+        return f"Error reading column stats: {e}"
+
 from app.agent_setup import llm
 
-sql_agent = LlmAgent(
-    model=llm,
-    name="sql_agent",
-    instruction="""
-    You are a SQL expert. Your task is to answer user questions by querying the local SQLite database.
+# Schema discovery, query writing and the approximate tools: shared by the
+# sql_agent and the direct agent, which differ in how they return results.
+SQL_WORKFLOW = """
+    You are a SQL expert. Your task is to answer user questions by querying the local {dialect} database.
     
     CRITICAL: DO NOT assume table names. You must discover them.
     
     1. FIRST, call the `get_schema` tool to inspect the database structure.
-    2. Based on the schema, generate a valid SQLite query (Always include descriptive columns!).
-    3. Use the `execute_sql` tool.
-    4. Return the results.
+       On large databases it only returns the tables relevant to the question and lists the rest by name;
+       call `get_schema(tables="name1,name2")` if you need the columns of a listed table.
+    2. Based on the schema, generate a valid {dialect} query (Always include descriptive columns!).
+    3. Use the `execute_sql` tool. Don't add a LIMIT just to keep the output short: the tool returns
+       the total row count, the first rows as CSV and min/max/avg/sum over all rows of numeric columns.
+
+    Large tables can have a sample and sketches (get_schema marks them "Approximate answers available"):
+    - For distinct counts, medians, percentiles or the range of a column, call
+      `column_stats(table="...", columns="a,b")` instead of scanning the table.
+    - For exploratory questions where an estimate is good enough (rough totals, shares, trends, charts),
+      call `execute_sql(query, approximate=True)`: it runs on the sample and scales COUNT/SUM.
+      Never use it when the user asks for exact figures.
+    - Whenever a tool output starts with or contains "approximate:", say the answer is approximate
+      and give the error bound it reports.
     
+    <DIALECT>{notes}    </DIALECT>
+    """.format(dialect=query_engine.dialect, notes=query_engine.notes)
+
+SQL_AGENT_INSTRUCTION = SQL_WORKFLOW + """
     <CONSTRAINTS>
     - Focus on accurate SQL generation.
-    - Return the tool output directly.
+    - Return the tool output directly, including the `result_id` line.
     </CONSTRAINTS>
-    """,
-    tools=[get_schema, execute_sql]
+    """
+
+sql_agent = LlmAgent(
+    model=llm,
+    name="sql_agent",
+    instruction=SQL_AGENT_INSTRUCTION,
+    tools=[get_schema, execute_sql, column_stats]
 )
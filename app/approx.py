@@ -0,0 +1,563 @@
+import base64
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from .db import _read, _write
+from .rollups import AGGREGATES, _select_aliases, _tokenize
+
+logger = logging.getLogger(__name__)
+
+APPROX_SAMPLE_ROWS = int(os.getenv("APPROX_SAMPLE_ROWS", "10000"))
+# Sketches are rebuilt in the background once the table's row count has
+# moved this far (as a fraction) from the count they were built over.
+APPROX_REFRESH_DRIFT = float(os.getenv("APPROX_REFRESH_DRIFT", "0.1"))
+APPROX_PREFIX = "approx_"
+CATALOG_TABLE = "approx_catalog"
+SKETCH_TABLE = "approx_sketches"
+HLL_PRECISION = 12  # 4096 registers, ~1.6% standard error
+DIGEST_COMPRESSION = 200
+SCAN_CHUNK_ROWS = 100_000
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+# z for the 95% bounds reported to the model.
+Z_95 = 1.96
+
+_NUMERIC_TYPES = ("INT", "REAL", "FLOA", "DOUB", "NUM", "DEC")
+_SCALED = {"COUNT", "SUM", "TOTAL"}
+# Words that can follow a table name and are not an alias.
+_AFTER_TABLE = {"WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "CROSS",
+                "NATURAL", "ON", "USING", "UNION", "INTERSECT", "EXCEPT", "WINDOW"}
+
+
+# --- Sketches ---
+
+class HyperLogLog:
+    # Distinct-count sketch over 64-bit hashes.
+    def __init__(self, precision: int = HLL_PRECISION, registers=None):
+        import numpy as np
+
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+
+    def add(self, hashes):
+        import numpy as np
+
+        if not len(hashes):
+            return
+        p = self.precision
+        index = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        # The sentinel bit caps the run of leading zeros at 64 - p.
+        rest = (hashes << np.uint64(p)) | np.uint64(1 << (p - 1))
+        rank = (64 - np.floor(np.log2(rest.astype(np.float64)))).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self) -> float:
+        import numpy as np
+
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small cardinalities
+        return float(estimate)
+
+    def relative_error(self) -> float:
+        return Z_95 * 1.04 / math.sqrt(len(self.registers))
+
+    def payload(self) -> str:
+        return base64.b64encode(self.registers.tobytes()).decode()
+
+    @classmethod
+    def from_payload(cls, payload: str):
+        import numpy as np
+
+        registers = np.frombuffer(base64.b64decode(payload), dtype=np.uint8).copy()
+        return cls(int(math.log2(len(registers))), registers)
+
+
+class TDigest:
+    # Merging t-digest with the k1 scale function: centroids are small near
+    # the tails and large in the middle, so extreme quantiles stay accurate.
+    def __init__(self, compression: int = DIGEST_COMPRESSION, means=None, weights=None, low=None, high=None):
+        import numpy as np
+
+        self.compression = compression
+        self.means = np.asarray(means if means is not None else [], dtype=np.float64)
+        self.weights = np.asarray(weights if weights is not None else [], dtype=np.float64)
+        self.low = low
+        self.high = high
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def add(self, values):
+        import numpy as np
+
+        if not len(values):
+            return
+        low, high = float(values.min()), float(values.max())
+        self.low = low if self.low is None else min(self.low, low)
+        self.high = high if self.high is None else max(self.high, high)
+        means = np.concatenate([self.means, values])
+        weights = np.concatenate([self.weights, np.ones(len(values))])
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+
+        # Points whose left edge falls in the same unit of k are merged.
+        left = (np.cumsum(weights) - weights) / weights.sum()
+        k = self.compression / (2 * math.pi) * np.arcsin(2 * left - 1)
+        cluster = np.floor(k - k[0]).astype(np.int64)
+        starts = np.flatnonzero(np.diff(cluster, prepend=-1))
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def _value(self, q: float) -> float:
+        import numpy as np
+
+        total = self.count
+        centers = np.cumsum(self.weights) - self.weights / 2
+        ranks = np.concatenate([[0.0], centers, [total]])
+        values = np.concatenate([[self.low], self.means, [self.high]])
+        return float(np.interp(min(max(q, 0.0), 1.0) * total, ranks, values))
+
+    def quantile(self, q: float):
+        # (estimate, low, high): the range covers the rank error of the
+        # centroid the quantile falls in.
+        import numpy as np
+
+        if not len(self.weights):
+            return None
+        index = min(int(np.searchsorted(np.cumsum(self.weights), q * self.count)), len(self.weights) - 1)
+        error = self.weights[index] / 2 / self.count
+        return self._value(q), self._value(q - error), self._value(q + error)
+
+    def payload(self) -> dict:
+        return {"means": self.means.tolist(), "weights": self.weights.tolist(), "low": self.low, "high": self.high}
+
+    @classmethod
+    def from_payload(cls, payload: dict):
+        return cls(DIGEST_COMPRESSION, payload["means"], payload["weights"], payload["low"], payload["high"])
+
+
+def _hashes(series):
+    import pandas as pd
+
+    # Integer columns come back as float when a chunk has NULLs; hash them as
+    # integers so the same value hashes alike in every chunk.
+    if series.dtype.kind == "f" and len(series) and (series == series.round()).all():
+        series = series.astype("int64")
+    return pd.util.hash_pandas_object(series, index=False).to_numpy()
+
+
+def compute_sketches(conn, source: str) -> dict:
+    # One pass over the table: a HyperLogLog per column, a t-digest per
+    # numeric column and exact NULL counts, read in chunks.
+    import pandas as pd
+
+    columns = [(row[1], row[2] or "") for row in conn.execute(f'PRAGMA table_info("{source}")')]
+    if not columns:
+        raise ValueError(f"no such table: {source}")
+    names = [name for name, _ in columns]
+    numeric = {name for name, ctype in columns if any(t in ctype.upper() for t in _NUMERIC_TYPES)}
+    hlls = {name: HyperLogLog() for name in names}
+    digests = {name: TDigest() for name in numeric}
+    nulls = dict.fromkeys(names, 0)
+    rows = 0
+
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(f'SELECT {", ".join(f"{chr(34)}{n}{chr(34)}" for n in names)} FROM "{source}"')
+    while True:
+        chunk = cursor.fetchmany(SCAN_CHUNK_ROWS)
+        if not chunk:
+            break
+        rows += len(chunk)
+        frame = pd.DataFrame.from_records(chunk, columns=names)
+        for name in names:
+            present = frame[name].dropna()
+            nulls[name] += len(frame) - len(present)
+            hlls[name].add(_hashes(present))
+            if name in digests:
+                digests[name].add(pd.to_numeric(present, errors="coerce").dropna().to_numpy(dtype="float64"))
+    logger.info(f"Sketched {source}: {rows} rows, {len(names)} columns in {time.perf_counter() - start:.1f}s")
+    return {
+        name: {
+            "rows": rows,
+            "nulls": nulls[name],
+            "hll": hlls[name].payload(),
+            "digest": digests[name].payload() if name in digests and digests[name].count else None,
+        }
+        for name in names
+    }
+
+
+def store_sketches(conn, source: str, sketches: dict):
+    _ensure_catalog(conn)
+    conn.execute(f"DELETE FROM {SKETCH_TABLE} WHERE source = ?", (source,))
+    now = time.time()
+    conn.executemany(
+        f"INSERT INTO {SKETCH_TABLE} (source, name, rows, nulls, payload, built) VALUES (?, ?, ?, ?, ?, ?)",
+        [(source, name, s["rows"], s["nulls"], json.dumps({"hll": s["hll"], "digest": s["digest"]}), now)
+         for name, s in sketches.items()],
+    )
+
+
+# --- Samples and their maintenance ---
+
+def sample_name(source: str) -> str:
+    return f"{APPROX_PREFIX}sample_{source}"
+
+
+def _ensure_catalog(conn):
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} "
+        "(source TEXT PRIMARY KEY, size INTEGER NOT NULL, seen INTEGER NOT NULL, rows INTEGER NOT NULL, created REAL)"
+    )
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {SKETCH_TABLE} (source TEXT NOT NULL, name TEXT NOT NULL, rows INTEGER, "
+        "nulls INTEGER, payload TEXT NOT NULL, built REAL, PRIMARY KEY (source, name))"
+    )
+
+
+def _triggers(source: str, columns: list) -> list:
+    # Reservoir sampling (algorithm R) in the inserting transaction: the
+    # n-th row ever inserted takes a random slot with probability size/n.
+    # Deleted rows leave their slot empty until a later insert lands there.
+    sample = sample_name(source)
+    quoted = ", ".join(f'"{c}"' for c in columns)
+    new = ", ".join(f'NEW."{c}"' for c in columns)
+    sets = ", ".join(f'"{c}" = NEW."{c}"' for c in columns)
+    where = f"WHERE source = '{source}'"
+    return [
+        f'CREATE TRIGGER "{sample}_insert" AFTER INSERT ON "{source}" BEGIN '
+        f"UPDATE {CATALOG_TABLE} SET seen = seen + 1, rows = rows + 1 {where}; "
+        f'INSERT OR REPLACE INTO "{sample}" (approx_slot, approx_src, {quoted}) SELECT slot, NEW.rowid, {new} '
+        f"FROM (SELECT CASE WHEN seen <= size THEN seen - 1 ELSE abs(random() % seen) END AS slot, size "
+        f"FROM {CATALOG_TABLE} {where}) WHERE slot < size; END",
+        f'CREATE TRIGGER "{sample}_delete" AFTER DELETE ON "{source}" BEGIN '
+        f"UPDATE {CATALOG_TABLE} SET rows = rows - 1 {where}; "
+        f'DELETE FROM "{sample}" WHERE approx_src = OLD.rowid; END',
+        f'CREATE TRIGGER "{sample}_update" AFTER UPDATE ON "{source}" BEGIN '
+        f'UPDATE "{sample}" SET approx_src = NEW.rowid, {sets} WHERE approx_src = OLD.rowid; END',
+    ]
+
+
+def definitions(conn) -> list:
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (CATALOG_TABLE,)).fetchone()
+    if not exists:
+        return []
+    samples = []
+    for source, size, rows, created in conn.execute(
+        f"SELECT source, size, rows, created FROM {CATALOG_TABLE} ORDER BY source"
+    ).fetchall():
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{source}")')]
+        built = conn.execute(f"SELECT MAX(rows), MAX(built) FROM {SKETCH_TABLE} WHERE source = ?", (source,)).fetchone()
+        samples.append({"source": source, "sample": sample_name(source), "size": size, "rows": rows,
+                        "columns": columns, "created": created, "sketched_rows": built[0], "sketched": built[1]})
+    return samples
+
+
+def sampled_source(conn, source: str):
+    # Name of the sample table for `source`, or None.
+    return next((d["sample"] for d in definitions(conn) if d["source"] == source), None)
+
+
+def create_sample(conn, source: str, size: int = APPROX_SAMPLE_ROWS) -> dict:
+    # Builds approx_sample_<source> with a uniform sample of `size` rows and
+    # the triggers that keep it uniform as rows are inserted. Re-running it
+    # rebuilds the sample.
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{source}")')]
+    if not columns:
+        raise ValueError(f"no such table: {source}")
+    if source.startswith(APPROX_PREFIX) or source.startswith("rollup_"):
+        raise ValueError(f"{source} is an internal table")
+    if size < 1:
+        raise ValueError("The sample needs at least one row")
+    try:
+        conn.execute(f'SELECT rowid FROM "{source}" LIMIT 0')
+    except Exception:
+        raise ValueError(f"{source} has no rowid, samples need a rowid table") from None
+    types = {row[1]: row[2] for row in conn.execute(f'PRAGMA table_info("{source}")')}
+    sample = sample_name(source)
+    quoted = ", ".join(f'"{c}"' for c in columns)
+
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    if any(d["source"] == source for d in definitions(conn)):
+        drop_sample(conn, source)
+    _ensure_catalog(conn)
+    start = time.perf_counter()
+    definitions_sql = ", ".join(f'"{c}" {types[c]}' for c in columns)
+    conn.execute(f'CREATE TABLE "{sample}" (approx_slot INTEGER PRIMARY KEY, approx_src INTEGER, {definitions_sql})')
+    conn.execute(f'CREATE INDEX "{sample}_src" ON "{sample}" (approx_src)')
+    conn.execute(
+        f'INSERT INTO "{sample}" SELECT ROW_NUMBER() OVER () - 1, rowid, {quoted} '
+        f'FROM (SELECT rowid, {quoted} FROM "{source}" ORDER BY random() LIMIT ?)',
+        (size,),
+    )
+    rows = conn.execute(f'SELECT COUNT(*) FROM "{source}"').fetchone()[0]
+    conn.execute(f"INSERT INTO {CATALOG_TABLE} (source, size, seen, rows, created) VALUES (?, ?, ?, ?, ?)",
+                 (source, size, rows, rows, time.time()))
+    for trigger in _triggers(source, columns):
+        conn.execute(trigger)
+    sampled = conn.execute(f'SELECT COUNT(*) FROM "{sample}"').fetchone()[0]
+    logger.info(f"Sampled {source}: {sampled} of {rows} rows in {time.perf_counter() - start:.1f}s")
+    return {"source": source, "sample": sample, "size": size, "sampled": sampled, "rows": rows}
+
+
+def drop_sample(conn, source: str):
+    if not any(d["source"] == source for d in definitions(conn)):
+        raise ValueError(f"No sample of {source}")
+    sample = sample_name(source)
+    for suffix in ("insert", "delete", "update"):
+        conn.execute(f'DROP TRIGGER IF EXISTS "{sample}_{suffix}"')
+    conn.execute(f'DROP TABLE IF EXISTS "{sample}"')
+    conn.execute(f"DELETE FROM {CATALOG_TABLE} WHERE source = ?", (source,))
+    conn.execute(f"DELETE FROM {SKETCH_TABLE} WHERE source = ?", (source,))
+
+
+def drop_samples_for(conn, source: str):
+    if any(d["source"] == source for d in definitions(conn)):
+        drop_sample(conn, source)
+
+
+_refreshing = set()
+_refresh_lock = threading.Lock()
+
+
+def refresh_in_background(source: str):
+    # Rebuilds the sketches of `source` off the request path; the stale ones
+    # keep answering meanwhile.
+    with _refresh_lock:
+        if source in _refreshing:
+            return
+        _refreshing.add(source)
+
+    def refresh():
+        try:
+            _write(store_sketches, source, _read(compute_sketches, source))
+        except Exception as e:
+            logger.warning(f"Sketch refresh of {source} failed: {e}")
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(source)
+
+    threading.Thread(target=refresh, name=f"sketch-{source}", daemon=True).start()
+
+
+# --- Answers ---
+
+def _format(value) -> str:
+    if isinstance(value, float):
+        return format(value, ",.6g") if abs(value) < 1e15 else format(value, ".6g")
+    return f"{value:,}" if isinstance(value, int) else str(value)
+
+
+def column_stats(conn, source: str, names: list = None):
+    # (text, stale) describing the columns of `source` from its sketches.
+    definition = next((d for d in definitions(conn) if d["source"].lower() == source.lower()), None)
+    if definition is None or not definition["sketched"]:
+        raise ValueError(f"No sketches for {source}; they are built with POST /api/approx")
+    stored = {
+        name: (rows, nulls, json.loads(payload))
+        for name, rows, nulls, payload in conn.execute(
+            f"SELECT name, rows, nulls, payload FROM {SKETCH_TABLE} WHERE source = ? ORDER BY rowid",
+            (definition["source"],),
+        )
+    }
+    wanted = [n for n in stored if not names or n.lower() in {w.lower() for w in names}]
+    if not wanted:
+        raise ValueError(f"Unknown column(s) {', '.join(names)}, available: {', '.join(stored)}")
+
+    sketched = definition["sketched_rows"] or 0
+    drift = abs(definition["rows"] - sketched) / max(sketched, 1)
+    age = time.time() - definition["sketched"]
+    lines = [f"{definition['source']}: {definition['rows']:,} rows now; sketches built over {sketched:,} rows "
+             f"{age / 60:.0f} min ago"]
+    hll_error = None
+    for name in wanted:
+        rows, nulls, payload = stored[name]
+        hll = HyperLogLog.from_payload(payload["hll"])
+        hll_error = hll.relative_error()
+        parts = [f"distinct≈{min(hll.estimate(), rows - nulls):,.0f}", f"nulls={nulls:,}"]
+        if payload["digest"]:
+            digest = TDigest.from_payload(payload["digest"])
+            parts.append(f"min={_format(digest.low)}")
+            for q in QUANTILES:
+                value, low, high = digest.quantile(q)
+                parts.append(f"p{q * 100:g}≈{_format(value)} [{_format(low)}..{_format(high)}]")
+            parts.append(f"max={_format(digest.high)}")
+        lines.append(f"  {name}: " + ", ".join(parts))
+    lines.append(f"approximate: distinct counts from HyperLogLog (±{hll_error:.1%} at 95%), quantiles from "
+                 f"t-digest (95% range in brackets), min/max/nulls exact when the sketches were built.")
+    if drift > APPROX_REFRESH_DRIFT:
+        lines.append(f"The table changed by {drift:.0%} since; the sketches are being rebuilt.")
+    return "\n".join(lines), drift > APPROX_REFRESH_DRIFT
+
+
+class Approximation:
+    # A query rewritten to read a table's sample instead of the table, with
+    # COUNT/SUM/TOTAL scaled up to the full table. `counting_query` adds the
+    # sample rows behind each output row when the outer query aggregates the
+    # sample directly.
+    def __init__(self, source: str, sample_rows: int, rows: int, query: str, counting_query: str = None,
+                 scaled: bool = False, limited: bool = False, distinct: bool = False):
+        self.source = source
+        self.sample_rows = sample_rows
+        self.rows = rows
+        self.query = query
+        self.counting_query = counting_query
+        self.scaled = scaled
+        self.limited = limited
+        self.distinct = distinct
+
+    @property
+    def fraction(self) -> float:
+        return self.sample_rows / self.rows
+
+    @property
+    def scale(self) -> float:
+        return self.rows / self.sample_rows
+
+    def margin(self, sampled: int) -> float:
+        # 95% relative error of a count scaled up from `sampled` rows.
+        return Z_95 * math.sqrt((1 - self.fraction) / sampled)
+
+    def note(self, conn, result) -> str:
+        parts = [f"approximate: computed on a uniform sample of {self.sample_rows:,} of {self.rows:,} rows of "
+                 f"{self.source} ({self.fraction:.2%})"]
+        if self.scaled:
+            parts.append(f"COUNT/SUM scaled by {self.scale:,.1f}")
+        smallest = None
+        if self.counting_query is not None:
+            smallest = conn.execute(f'SELECT MIN("approx_sample_rows") FROM ({self.counting_query})').fetchone()[0]
+        if self.counting_query is not None and not smallest:
+            parts.append(f"no sampled row matched, so groups of fewer than about {self.scale:,.0f} rows may be "
+                         f"missing")
+        elif smallest:
+            parts.append(f"counts are within ±{self.margin(smallest):.1%} (95%) for the smallest group "
+                         f"({smallest:,} sampled rows) and tighter for larger ones; sums and averages vary more "
+                         f"when values are spread out")
+        elif self.scaled:
+            parts.append(f"a count scaled up from n sampled rows is within about ±{Z_95 * 100:.0f}%·√(1/n) "
+                         f"(95%), e.g. ±{self.margin(100):.0%} for 100 rows")
+        else:
+            parts.append("the rows shown come from the sample")
+            if not self.limited:
+                parts.append(f"about {result.total * self.scale:,.0f} rows of the full table match")
+        if self.distinct:
+            parts.append("COUNT(DISTINCT) is not scaled: use column_stats for distinct counts")
+        return "; ".join(parts) + "."
+
+
+def approximate(conn, query: str):
+    # (Approximation, None) if the query can run on a sample, else
+    # (None, reason). Only queries over a single sampled table qualify.
+    samples = {d["source"].lower(): d for d in definitions(conn)}
+    if not samples:
+        return None, "no table has a sample"
+    tokens = _tokenize(query)
+    significant = [i for i, token in enumerate(tokens) if token[0] != "ws"]
+    words = [tokens[i][2].upper() if tokens[i][0] == "id" else tokens[i][1] for i in significant]
+
+    # Whether each position is in a FROM list, so comma joins are seen too.
+    in_from, clause, outer = [], None, []
+    for word in words:
+        if word == "(":
+            outer.append(clause)
+            clause = None
+        elif word == ")":
+            clause = outer.pop() if outer else None
+        elif word in ("SELECT", "FROM", "WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "ON", "USING", "WINDOW"):
+            clause = word
+        in_from.append(clause == "FROM")
+
+    tables, used = {}, set()
+    for position, index in enumerate(significant):
+        kind, _, value = tokens[index]
+        previous = words[position - 1] if position else ""
+        if kind != "id" or not (previous in ("FROM", "JOIN") or (previous == "," and in_from[position])):
+            continue
+        following = words[position + 1] if position + 1 < len(words) else ""
+        if value.lower() not in samples or following in ("(", "."):
+            continue
+        definition = samples[value.lower()]
+        aliased = following == "AS" or (
+            following and tokens[significant[position + 1]][0] == "id" and following not in _AFTER_TABLE
+        )
+        columns = ", ".join(f'"{c}"' for c in definition["columns"])
+        tables[index] = f'(SELECT {columns} FROM "{definition["sample"]}")' + ("" if aliased else f' AS "{value}"')
+        used.add(value.lower())
+    if not used:
+        return None, "the query reads no sampled table"
+    if len(used) > 1:
+        return None, "approximation covers queries over a single sampled table"
+    if len(tables) > 1:
+        # A join of the sample with itself grows with the square of the
+        # sampling ratio, so scaling COUNT/SUM linearly would be wrong.
+        return None, "the query reads the sampled table more than once"
+    definition = samples[used.pop()]
+    sample_rows = conn.execute(f'SELECT COUNT(*) FROM "{definition["sample"]}"').fetchone()[0]
+    if not sample_rows or sample_rows >= definition["rows"]:
+        return None, "the sample holds every row of the table"
+    scale = definition["rows"] / sample_rows
+
+    replacements, depth, depths = {}, 0, []
+    for position, word in enumerate(words):
+        depths.append(depth)
+        depth += {"(": 1, ")": -1}.get(word, 0)
+    for position, word in enumerate(words):
+        if word not in _SCALED or position + 1 >= len(words) or words[position + 1] != "(":
+            continue
+        end = position + 1
+        while end < len(words) and depths[end] + {"(": 1, ")": -1}.get(words[end], 0) > depths[position]:
+            end += 1
+        if end >= len(words) or (position + 2 < len(words) and words[position + 2] == "DISTINCT"):
+            continue
+        if any(significant[position] < index < significant[end] for index in tables):
+            return None, "the query reads the table inside an aggregate"
+        text = "".join(token[1] for token in tokens[significant[position]:significant[end] + 1])
+        scaled = f"CAST(ROUND({text} * {scale!r}) AS INTEGER)" if word == "COUNT" else f"({text} * {scale!r})"
+        replacements[significant[position]] = (significant[end], scaled)
+
+    aliases = _select_aliases(tokens, significant, words, replacements) if words[0] == "SELECT" else {}
+    # Per-group sample sizes for the error bound, when the outer query
+    # aggregates (adding COUNT(*) to it then keeps its groups).
+    top_from = next((p for p, w in enumerate(words) if w == "FROM" and depths[p] == 0), None)
+    aggregated = (
+        top_from is not None and top_from + 1 < len(words) and significant[top_from + 1] in tables
+        and not {"UNION", "INTERSECT", "EXCEPT"} & set(words)
+    ) and (
+        any(w in AGGREGATES and depths[p] == 0 and p + 1 < len(words) and words[p + 1] == "("
+            for p, w in enumerate(words[:top_from]))
+        or any(w == "GROUP" and depths[p] == 0 for p, w in enumerate(words))
+    )
+
+    def render(counting: bool) -> str:
+        out, skip_until = [], -1
+        for index, (_, text, _) in enumerate(tokens):
+            if index <= skip_until:
+                continue
+            if counting and index == significant[top_from]:
+                out.append(', COUNT(*) AS "approx_sample_rows" ')
+            if index in tables:
+                out.append(tables[index])
+            elif index in replacements:
+                end, template = replacements[index]
+                out.append(template)
+                skip_until = index = end
+            else:
+                out.append(text)
+            if index in aliases:
+                out.append(aliases[index])
+        return "".join(out)
+
+    limited = any(w == "LIMIT" and depths[p] == 0 for p, w in enumerate(words))
+    distinct = any(w == "COUNT" and words[p + 2:p + 3] == ["DISTINCT"] for p, w in enumerate(words))
+    return Approximation(definition["source"], sample_rows, definition["rows"], render(False),
+                         render(True) if aggregated else None, bool(replacements), limited, distinct), None
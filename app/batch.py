@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+from .cache import normalize_question
+
+logger = logging.getLogger(__name__)
+
+# Questions of one batch answered at the same time. The agent admission gate
+# still applies, so this never exceeds AGENT_MAX_CONCURRENCY in practice.
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "500"))
+# Times a question turned away by admission control is retried.
+BATCH_RETRIES = 2
+
+PROMPT_KEYS = ("prompt", "question", "title")
+ID_KEYS = ("id", "request_id")
+
+
+def parse_questions(text: str) -> list:
+    # One question per line: a JSON object with a prompt under one of
+    # PROMPT_KEYS (and optionally an id), a JSON string, or plain text. A
+    # JSON array of the same is accepted too.
+    text = text.strip()
+    if text.startswith("["):
+        items = json.loads(text)
+    else:
+        items = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except json.JSONDecodeError:
+                items.append(line)
+
+    questions = []
+    for n, item in enumerate(items, 1):
+        if isinstance(item, dict):
+            prompt = next((item[k] for k in PROMPT_KEYS if item.get(k)), None)
+            qid = next((item[k] for k in ID_KEYS if item.get(k) is not None), n)
+        else:
+            prompt, qid = item, n
+        if not isinstance(prompt, str) or not prompt.strip():
+            raise ValueError(f"Question {n} has no prompt")
+        questions.append({"id": qid, "prompt": prompt.strip()})
+    if not questions:
+        raise ValueError("No questions in the batch")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise ValueError(f"At most {BATCH_MAX_QUESTIONS} questions per batch, got {len(questions)}")
+    return questions
+
+
+async def run_batch(questions: list, answer, concurrency: int = BATCH_CONCURRENCY):
+    # Answers each distinct question once (by normalize_question) with at
+    # most `concurrency` in flight, and yields a result per input question as
+    # soon as its answer is ready, then a summary. `answer(prompt)` returns
+    # the /agent/query response dict, with an "error" when it failed.
+    groups = {}
+    for question in questions:
+        groups.setdefault(normalize_question(question["prompt"]), []).append(question)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    start = time.perf_counter()
+
+    async def ask(group):
+        async with semaphore:
+            began = time.perf_counter()
+            try:
+                result = await answer(group[0]["prompt"])
+            except Exception as e:
+                logger.error(f"Batch question failed: {e}")
+                result = {"response": None, "error": str(e)}
+            return group, result, time.perf_counter() - began
+
+    tasks = [asyncio.create_task(ask(group)) for group in groups.values()]
+    failed = 0
+    try:
+        for done in asyncio.as_completed(tasks):
+            group, result, seconds = await done
+            first = group[0]["id"]
+            failed += len(group) if result.get("error") else 0
+            for question in group:
+                line = {"id": question["id"], "prompt": question["prompt"], **result, "seconds": round(seconds, 3)}
+                if question["id"] != first:
+                    line["duplicate_of"] = first
+                yield line
+    finally:
+        # The client went away: stop the questions still running.
+        for task in tasks:
+            task.cancel()
+
+    yield {
+        "summary": True,
+        "questions": len(questions),
+        "unique": len(groups),
+        "failed": failed,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def main():
+    # Sends a JSONL file of questions to a running server and prints each
+    # result line as it arrives.
+    parser = argparse.ArgumentParser(description="Answer a file of questions with /agent/batch")
+    parser.add_argument("questions", help="JSONL file, one {\"id\": ..., \"prompt\": ...} per line ('-' for stdin)")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--no-cache", action="store_true", help="skip the response cache")
+    parser.add_argument("--output", help="write results here instead of stdout")
+    args = parser.parse_args()
+
+    if args.questions == "-":
+        body = sys.stdin.read()
+    else:
+        with open(args.questions, encoding="utf-8") as f:
+            body = f.read()
+    params = urllib.parse.urlencode({"concurrency": args.concurrency, "no_cache": args.no_cache})
+    request = urllib.request.Request(
+        f"{args.url.rstrip('/')}/agent/batch?{params}",
+        data=body.encode("utf-8"),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        with urllib.request.urlopen(request) as response:
+            for line in response:
+                out.write(line.decode("utf-8"))
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import contextvars
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .db import DB_FILE
+from .engines import query_engine
+from .results import shape
+from .sql_guard import guard
+from .state import shared_state
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+
+# SQL executed by the agent while answering the current request; execute_sql
+# appends to it so the cache can keep the queries behind each answer.
+sql_trace = contextvars.ContextVar("sql_trace", default=None)
+
+
+def record_sql(query: str, digest: str):
+    # `digest` fingerprints what the agent saw (see ShapedResult.fingerprint).
+    trace = sql_trace.get()
+    if trace is not None:
+        trace.append({"query": query, "digest": digest})
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip(" ?!.")
+
+
+class ResponseCache:
+    # Entries are keyed by the process's db_version. With a shared state
+    # store, answers are also written there; another worker that misses
+    # locally checks them like a version change (re-running the stored SQL)
+    # before serving them.
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS,
+                 db_file: str = DB_FILE, enabled: bool = RESPONSE_CACHE_ENABLED, shared=shared_state):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_file = db_file
+        self.enabled = enabled
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bypassed = 0
+
+    def lookup(self, question: str, version):
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry["stored_at"] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            if entry is None and self.shared is None:
+                self.misses += 1
+                return None
+            if entry is not None and entry["version"] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["response"]
+
+        if entry is None:
+            entry = self._shared_entry(key, version)
+            if entry is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+            if entry["version"] == version:
+                return entry["response"]
+
+        # The data changed since the answer was cached. Re-running the stored SQL
+        # is far cheaper than the LLM calls; if every result is unchanged the
+        # answer is still correct and only needs its version bumped.
+        if entry["sql"] and self._still_valid(entry["sql"]):
+            with self._lock:
+                entry["version"] = version
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.revalidated += 1
+            logger.info(f"Response cache revalidated: {key}")
+            return entry["response"]
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self.misses += 1
+        return None
+
+    def _shared_entry(self, key: str, version):
+        try:
+            stored = self.shared.get("response", key)
+        except Exception as e:
+            logger.warning(f"Shared response cache lookup failed: {e}")
+            return None
+        if stored is None:
+            return None
+        # Versions are per process; only the file and schema parts compare
+        # across workers. Answers that ran no SQL are trusted on those alone.
+        if not stored["sql"] and stored["schema"] != list(version[:2]):
+            return None
+        entry = {
+            "response": stored["response"],
+            "version": version if not stored["sql"] else None,
+            "sql": stored["sql"],
+            "stored_at": time.monotonic() - (time.time() - stored["stored_at"]),
+        }
+        if entry["version"] == version:
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                self.hits += 1
+        return entry
+
+    def _still_valid(self, trace: list) -> bool:
+        def unchanged(conn):
+            for item in trace:
+                with guard(conn):
+                    fingerprint = shape(conn, item["query"]).fingerprint()
+                if fingerprint != item["digest"]:
+                    return False
+            return True
+
+        try:
+            # The stored SQL is in the dialect of the query engine that ran it.
+            if self.db_file == DB_FILE:
+                return query_engine.read(unchanged)
+            conn = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True)
+            try:
+                return unchanged(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"Response cache revalidation failed: {e}")
+            return False
+
+    def store(self, question: str, version, response: str, sql: list):
+        key = normalize_question(question)
+        with self._lock:
+            self._entries[key] = {
+                "response": response,
+                "version": version,
+                "sql": list(sql or []),
+                "stored_at": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.shared is not None:
+            try:
+                self.shared.put("response", key, {
+                    "response": response,
+                    "schema": list(version[:2]),
+                    "sql": list(sql or []),
+                    "stored_at": time.time(),
+                }, self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Shared response cache store failed: {e}")
+
+    def generated_sql(self, question: str) -> list:
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get("response", key)
+        return [item["query"] for item in entry["sql"]] if entry else []
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.shared is not None:
+            self.shared.clear("response")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "bypassed": self.bypassed,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+        if self.shared is not None:
+            stats["shared_entries"] = self.shared.count("response")
+        return stats
+
+
+response_cache = ResponseCache()
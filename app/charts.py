@@ -0,0 +1,309 @@
+import datetime
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+CHART_DIR = os.getenv("CHART_DIR", "app/static/charts")
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))
+CHART_TOP_N = int(os.getenv("CHART_TOP_N", "15"))
+CHART_SOURCE_MAX_ROWS = int(os.getenv("CHART_SOURCE_MAX_ROWS", "200000"))
+CHART_STORE_MAX_MB = int(os.getenv("CHART_STORE_MAX_MB", "512"))
+CHART_MAX_AGE_SECONDS = int(os.getenv("CHART_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+CHART_MEMORY_MB = int(os.getenv("CHART_MEMORY_MB", "32"))
+
+PIE_COLORS = ['#6366f1', '#ef4444', '#22c55e', '#eab308', '#f97316', '#ec4899', '#06b6d4', '#8b5cf6']
+ACCENT_COLOR = '#2dd4bf'
+TEXT_COLOR = '#f8fafc'
+
+_import_lock = threading.Lock()
+
+
+def to_numbers(values) -> np.ndarray:
+    # Non-numeric values become 0, as pd.to_numeric(errors="coerce").fillna(0) did.
+    out = np.zeros(len(values), dtype=float)
+    for i, value in enumerate(values):
+        try:
+            out[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return np.nan_to_num(out)
+
+
+def _x_positions(x: list):
+    # Numeric coordinates for x: numbers as-is, ISO dates as timestamps,
+    # anything else (categories) by position. Returns (positions, sortable).
+    try:
+        return np.array([float(v) for v in x]), True
+    except (TypeError, ValueError):
+        pass
+    try:
+        return np.array([datetime.datetime.fromisoformat(str(v)).timestamp() for v in x]), True
+    except ValueError:
+        return np.arange(len(x), dtype=float), False
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    # Largest-Triangle-Three-Buckets: indices of `threshold` points that keep
+    # the visual shape of the series (peaks and troughs survive).
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(x: list, y: np.ndarray, max_points: int = CHART_MAX_POINTS):
+    positions, sortable = _x_positions(x)
+    if sortable and np.any(np.diff(positions) < 0):
+        order = np.argsort(positions, kind="stable")
+        positions, y, x = positions[order], y[order], [x[i] for i in order]
+    if len(x) <= max_points:
+        return x, y
+    keep = lttb(positions, y, max_points)
+    return [x[i] for i in keep], y[keep]
+
+
+def fold_top_n(x: list, y: np.ndarray, top_n: int = CHART_TOP_N):
+    # Keep the top_n - 1 largest categories in their original order and sum
+    # the rest into "Other".
+    if len(x) <= top_n:
+        return x, y
+    keep = np.sort(np.argsort(-y, kind="stable")[:top_n - 1])
+    rest = np.ones(len(x), dtype=bool)
+    rest[keep] = False
+    return [x[i] for i in keep] + ["Other"], np.append(y[keep], y[rest].sum())
+
+
+def reduce_points(x: list, y: list, plot_type: str):
+    x = ["" if v is None else v for v in x]
+    y = to_numbers(y)
+    if len(x) != len(y):
+        size = min(len(x), len(y))
+        x, y = x[:size], y[:size]
+    if plot_type in ("line", "scatter"):
+        return downsample(x, y)
+    return fold_top_n([str(v) for v in x], y)
+
+
+def build_figure(x: list, y: np.ndarray, plot_type: str, title: str, xlabel: str, ylabel: str) -> dict:
+    # Charts are built in worker threads; concurrent first imports of
+    # plotly.express (and pandas under it) can see half-initialised modules.
+    with _import_lock:
+        import plotly.express as px
+
+    # y stays a float array, so plotly writes it as a base64 typed array.
+    data = {'x': x, 'y': y}
+    labels = {'x': xlabel, 'y': ylabel}
+    if plot_type == 'bar':
+        fig = px.bar(data, x='x', y='y', title=title, labels=labels, template='plotly_dark', color='x')
+    elif plot_type == 'line':
+        fig = px.line(data, x='x', y='y', title=title, labels=labels, markers=len(x) <= 200, template='plotly_dark')
+        fig.update_traces(line_color=ACCENT_COLOR)
+    elif plot_type == 'scatter':
+        fig = px.scatter(data, x='x', y='y', title=title, labels=labels, template='plotly_dark')
+        fig.update_traces(marker_size=12 if len(x) <= 200 else 5, marker_color='#f472b6')
+    elif plot_type == 'pie':
+        fig = px.pie(data, names='x', values='y', title=title, template='plotly_dark', color_discrete_sequence=PIE_COLORS)
+        fig.update_traces(textposition='inside', textinfo='percent+label')
+    else:
+        fig = px.bar(data, x='x', y='y', title=title, template='plotly_dark', color='x')
+
+    fig.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(family="Inter, sans-serif", color=TEXT_COLOR, size=11),
+        margin=dict(t=40, l=10, r=10, b=10),
+        title_font_size=16,
+        showlegend=True,
+        autosize=True
+    )
+
+    figure = fig.to_plotly_json()
+    # The dark template carries defaults for every trace type; only the ones
+    # this figure uses are needed.
+    template = figure['layout'].get('template')
+    if template and 'data' in template:
+        used = {trace.get('type', 'scatter') for trace in figure['data']}
+        template['data'] = {kind: value for kind, value in template['data'].items() if kind in used}
+    return figure
+
+
+def encode_figure(figure: dict) -> bytes:
+    import plotly.io
+
+    return plotly.io.json.to_json_plotly(figure, pretty=False).encode()
+
+
+def prewarm():
+    # Pays the first-figure cost (imports, plotly_dark template) up front.
+    encode_figure(build_figure(["a", "b"], np.array([1.0, 2.0]), "bar", "", "", ""))
+
+
+class ChartStore:
+    # Content-addressed chart files with a disk budget. Identical charts share
+    # one gzipped file; the least recently used files are deleted once the
+    # directory exceeds `max_bytes` or a file is older than `max_age_seconds`.
+    # Recently served payloads are also kept in memory up to `memory_bytes`.
+    def __init__(self, directory: str = CHART_DIR, max_bytes: int = CHART_STORE_MAX_MB * 1024 * 1024,
+                 max_age_seconds: int = CHART_MAX_AGE_SECONDS, memory_bytes: int = CHART_MEMORY_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.memory_bytes = memory_bytes
+        self._files = None  # name -> [size, last_used], oldest first
+        self._disk_bytes = 0
+        self._memory = OrderedDict()  # name -> (payload, gzipped)
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def _index(self):
+        # Built lazily from the directory, oldest modification first.
+        if self._files is None:
+            entries = []
+            if os.path.isdir(self.directory):
+                for entry in os.scandir(self.directory):
+                    name = entry.name.removesuffix(".gz")
+                    if entry.is_file() and name.startswith("chart_") and name.endswith(".json"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, name, stat.st_size))
+            self._files = OrderedDict((name, [size, mtime]) for mtime, name, size in sorted(entries))
+            self._disk_bytes = sum(size for size, _ in self._files.values())
+            self._evict(time.time())
+        return self._files
+
+    def _path(self, name: str, gzipped: bool = True) -> str:
+        return os.path.join(self.directory, name + ".gz" if gzipped else name)
+
+    def put(self, payload: bytes) -> str:
+        name = f"chart_{hashlib.sha256(payload).hexdigest()[:32]}.json"
+        now = time.time()
+        with self._lock:
+            files = self._index()
+            if name in files and os.path.exists(self._path(name)):
+                files[name][1] = now
+                files.move_to_end(name)
+                return name
+
+        data = gzip.compress(payload, compresslevel=6, mtime=0)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._forget(name)
+            self._files[name] = [len(data), now]
+            self._disk_bytes += len(data)
+            self._remember(name, data, True)
+            self._evict(now)
+        return name
+
+    def get(self, name: str):
+        # (payload, gzipped) or None. Older charts are plain .json files.
+        if not name.startswith("chart_") or not name.endswith(".json") or "/" in name or "\\" in name:
+            return None
+        now = time.time()
+        with self._lock:
+            files = self._index()
+            if name in self._memory:
+                self._memory.move_to_end(name)
+                if name in files:
+                    files[name][1] = now
+                    files.move_to_end(name)
+                self.hits += 1
+                return self._memory[name]
+            self.misses += 1
+
+        for gzipped in (True, False):
+            try:
+                with open(self._path(name, gzipped), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            with self._lock:
+                # The file may have been written by another worker process.
+                if name not in self._files:
+                    self._files[name] = [len(data), now]
+                    self._disk_bytes += len(data)
+                self._files[name][1] = now
+                self._files.move_to_end(name)
+                self._remember(name, data, gzipped)
+            return data, gzipped
+        return None
+
+    def _remember(self, name: str, data: bytes, gzipped: bool):
+        if len(data) > self.memory_bytes:
+            return
+        old = self._memory.pop(name, None)
+        if old is not None:
+            self._memory_used -= len(old[0])
+        self._memory[name] = (data, gzipped)
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def _forget(self, name: str):
+        entry = self._files.pop(name, None)
+        if entry is not None:
+            self._disk_bytes -= entry[0]
+        cached = self._memory.pop(name, None)
+        if cached is not None:
+            self._memory_used -= len(cached[0])
+
+    def _evict(self, now: float):
+        while self._files:
+            name, (size, last_used) = next(iter(self._files.items()))
+            if self._disk_bytes <= self.max_bytes and now - last_used <= self.max_age_seconds:
+                break
+            self._forget(name)
+            for gzipped in (True, False):
+                try:
+                    os.remove(self._path(name, gzipped))
+                except FileNotFoundError:
+                    pass
+            self.evicted += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            files = self._index()
+            return {
+                "files": len(files),
+                "disk_bytes": self._disk_bytes,
+                "memory_bytes": self._memory_used,
+                "memory_entries": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evicted": self.evicted,
+            }
+
+
+chart_store = ChartStore()
+
+
+def render_chart(x: list, y: list, plot_type: str = "bar", title: str = "Chart", xlabel: str = "X",
+                 ylabel: str = "Y") -> str:
+    x, y = reduce_points(list(x), list(y), plot_type)
+    return chart_store.put(encode_figure(build_figure(x, y, plot_type, title, xlabel, ylabel)))
+
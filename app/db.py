@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from .telemetry import row_count, tracer
+
+DB_FILE = os.getenv("DB_PATH", "demo.db")
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+logger = logging.getLogger(__name__)
+
+
+class VersionProbe:
+    # Cheap change detector for the database file. `schema_version` lives in the
+    # file header, `data_version` changes whenever *another* connection commits,
+    # and the local generation lets writers in this process force a new version.
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self._conn = None
+        self._inode = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        try:
+            inode = os.stat(self.db_file).st_ino
+        except FileNotFoundError:
+            inode = None
+        if self._conn is None or inode != self._inode:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._inode = inode
+        return self._conn
+
+    def current(self):
+        with self._lock:
+            conn = self._connect()
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            return (self._inode, schema_version, data_version, self._generation)
+
+    def bump(self):
+        with self._lock:
+            self._generation += 1
+
+
+db_version = VersionProbe(DB_FILE)
+
+
+def _inode(path: str):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+class ConnectionPool:
+    # One writer connection serialised by a lock plus up to `readers` query-only
+    # connections. The file is switched to WAL so readers never wait on the
+    # writer. If the file is replaced on disk (e.g. setup_database.py re-run),
+    # all connections are recycled.
+    def __init__(self, db_file: str, readers: int = DB_READERS):
+        self.db_file = db_file
+        self.readers = readers
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(readers)
+        self._writer = None
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._inode = None
+        self._epoch = 0
+
+    def _connect(self, read_only: bool):
+        # Readers open the file read-only, which unlike PRAGMA query_only
+        # cannot be switched off by a statement on the connection.
+        database = f"file:{self.db_file}?mode=ro" if read_only else f"file:{self.db_file}"
+        conn = sqlite3.connect(database, uri=True, check_same_thread=False, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        if read_only:
+            conn.execute("PRAGMA query_only=ON")
+        else:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _check_file(self):
+        inode = _inode(self.db_file)
+        with self._lock:
+            if inode == self._inode:
+                return
+            if self._inode is not None:
+                logger.info(f"{self.db_file} was replaced, recycling connections")
+            self._inode = inode
+            self._epoch += 1
+            while True:
+                try:
+                    _, conn = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                conn.close()
+
+    @contextmanager
+    def reader(self):
+        self._check_file()
+        if self._writer is None or self._writer[0] != self._epoch:
+            # Opening the writer is what switches the file to WAL.
+            with self.writer():
+                pass
+        self._slots.acquire()
+        try:
+            try:
+                epoch, conn = self._idle.get_nowait()
+            except queue.Empty:
+                epoch, conn = self._epoch, self._connect(read_only=True)
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                if epoch == self._epoch:
+                    self._idle.put((epoch, conn))
+                else:
+                    conn.close()
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def writer(self):
+        self._check_file()
+        with self._write_lock:
+            if self._writer is None or self._writer[0] != self._epoch:
+                if self._writer is not None:
+                    self._writer[1].close()
+                self._writer = (self._epoch, self._connect(read_only=False))
+            conn = self._writer[1]
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def close(self):
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer[1].close()
+                self._writer = None
+        while True:
+            try:
+                _, conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+
+
+pool = ConnectionPool(DB_FILE)
+
+
+def _traced(mode: str, checkout, fn, args, system: str = "sqlite"):
+    # One span per connection checkout; waiting for the connection counts.
+    operation = mode if fn.__name__ == "<lambda>" else fn.__name__
+    with tracer.start_as_current_span("db.query", attributes={
+        "db.system": system, "db.operation": operation, "app.db.mode": mode,
+    }) as span:
+        with checkout() as conn:
+            result = fn(conn, *args)
+        rows = row_count(result)
+        if rows is not None:
+            span.set_attribute("db.rows", rows)
+        return result
+
+
+def _read(fn, *args):
+    return _traced("read", pool.reader, fn, args)
+
+
+def _write(fn, *args):
+    return _traced("write", pool.writer, fn, args)
+
+
+async def run_read(fn, *args):
+    return await asyncio.to_thread(_read, fn, *args)
+
+
+async def run_write(fn, *args):
+    return await asyncio.to_thread(_write, fn, *args)
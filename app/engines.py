@@ -0,0 +1,269 @@
+import asyncio
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from opentelemetry import trace
+
+from .approx import approximate
+from .db import DB_FILE, _read, _traced, db_version
+from .export import Export
+from .results import shape
+from .rollups import rewrite_query
+from .sql_guard import SQL_TIMEOUT_SECONDS, QueryRejected, run_guarded, slow_queries
+
+logger = logging.getLogger(__name__)
+
+# Engine that runs the agent's SQL. "sqlite" queries DB_PATH directly;
+# "duckdb" runs the same queries on DuckDB's vectorized, multi-threaded
+# engine (pip install duckdb).
+QUERY_ENGINE = os.getenv("QUERY_ENGINE", "sqlite").lower()
+# Where DuckDB reads the tables from: "sqlite" attaches DB_PATH read-only
+# through DuckDB's sqlite extension; a directory reads the <table>.parquet
+# snapshots in it (written by POST /api/engine/snapshot).
+DUCKDB_SOURCE = os.getenv("DUCKDB_SOURCE", "sqlite")
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", "0"))  # 0 = one per core
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "")
+# DuckDB's own row group size, so scans of a snapshot split across threads.
+SNAPSHOT_ROW_GROUP = 122_880
+
+SQLITE_NOTES = """
+    - Dates are stored as TEXT ('YYYY-MM-DD'). Use strftime('%Y-%m', date_column) to group by month
+      and date(date_column, '-30 days') for date arithmetic.
+    - Dividing two integers truncates; multiply by 1.0 for ratios and percentages.
+    - There is no ILIKE; LIKE is already case-insensitive for ASCII text.
+"""
+
+DUCKDB_NOTES = """
+    - Dates are stored as text ('YYYY-MM-DD'); cast them first: date_trunc('month', CAST(date_column AS DATE))
+      or strftime(CAST(date_column AS DATE), '%Y-%m'). Note that strftime takes the date first, then the format.
+    - `/` always returns a decimal result; use `//` for integer division.
+    - ILIKE, GROUP BY ALL, QUALIFY and FILTER (WHERE ...) on aggregates are available.
+    - Only a single SELECT (or WITH ... SELECT) statement is accepted.
+"""
+
+
+class SqliteEngine:
+    name = "sqlite"
+    dialect = "SQLite"
+    notes = SQLITE_NOTES
+
+    def read(self, fn, *args):
+        return _read(fn, *args)
+
+    def execute(self, conn, query: str, approximate_ok: bool = False):
+        # Aggregates a rollup table can answer are read from it instead of
+        # scanning the fact table. Otherwise, when the caller accepts an
+        # estimate, the query runs on the table's sample (app.approx).
+        rewritten = rewrite_query(conn, query)
+        if not approximate_ok or rewritten != query:
+            return run_guarded(conn, shape, rewritten)
+        approximation, reason = approximate(conn, query)
+        if approximation is None:
+            result = run_guarded(conn, shape, query)
+            result.note = f"exact: {reason}"
+            return result
+        result = run_guarded(conn, shape, approximation.query)
+        result.note = approximation.note(conn, result)
+        return result
+
+    def stats(self) -> dict:
+        return {"engine": self.name, "dialect": self.dialect}
+
+
+class _DuckConnection:
+    # The part of the sqlite3.Connection interface the query helpers use.
+    # Every execute() gets its own cursor, since shape() closes the cursor of
+    # the preview before running the summary.
+    def __init__(self, database, lock: threading.Lock):
+        self._database = database
+        self._lock = lock
+        self._cursors = []
+
+    def execute(self, query: str, parameters=None):
+        with self._lock:
+            cursor = self._database.cursor()
+        self._cursors.append(cursor)
+        return cursor.execute(query, parameters)
+
+    def interrupt(self):
+        for cursor in self._cursors:
+            cursor.interrupt()
+
+    def close(self):
+        for cursor in self._cursors:
+            cursor.close()
+
+
+class DuckDbEngine:
+    # One in-memory DuckDB database over the source tables, reopened when the
+    # source changes. Agent SQL can only read: the source is attached
+    # read-only (or exposed as views over Parquet files), file access outside
+    # it and configuration changes are switched off, and only SELECT
+    # statements are run.
+    name = "duckdb"
+    dialect = "DuckDB"
+    notes = DUCKDB_NOTES
+
+    def __init__(self, db_file: str = DB_FILE, source: str = DUCKDB_SOURCE, threads: int = DUCKDB_THREADS,
+                 memory_limit: str = DUCKDB_MEMORY_LIMIT, timeout: float = SQL_TIMEOUT_SECONDS):
+        self.db_file = db_file
+        self.source = source
+        self.threads = threads
+        self.memory_limit = memory_limit
+        self.timeout = timeout
+        self._database = None
+        self._key = None
+        self._lock = threading.Lock()
+        _require_duckdb()
+
+    def _source_key(self):
+        if self.source == "sqlite":
+            return db_version.current()
+        return tuple((path, os.stat(path).st_mtime_ns) for path in self._snapshots())
+
+    def _snapshots(self) -> list:
+        return sorted(glob.glob(os.path.join(self.source, "*.parquet")))
+
+    def _open(self):
+        import duckdb
+
+        database = duckdb.connect(":memory:")
+        if self.threads:
+            database.execute(f"SET threads = {self.threads}")
+        if self.memory_limit:
+            database.execute(f"SET memory_limit = '{self.memory_limit}'")
+        if self.source == "sqlite":
+            path = os.path.abspath(self.db_file)
+            try:
+                database.load_extension("sqlite")
+            except duckdb.Error:
+                database.install_extension("sqlite")
+                database.load_extension("sqlite")
+            database.execute(f"SET allowed_paths = ['{path}', '{path}-wal', '{path}-shm']")
+            database.execute(f"ATTACH '{path}' AS source (TYPE sqlite, READ_ONLY)")
+            database.execute("USE source")
+        else:
+            snapshots = self._snapshots()
+            if not snapshots:
+                raise ValueError(f"No Parquet snapshots in {self.source}; create them with POST /api/engine/snapshot")
+            database.execute(f"SET allowed_directories = ['{os.path.abspath(self.source)}/']")
+            for path in snapshots:
+                table = os.path.basename(path)[:-len(".parquet")]
+                database.execute(f"CREATE VIEW \"{table}\" AS SELECT * FROM read_parquet('{os.path.abspath(path)}')")
+        database.execute("SET enable_external_access = false")
+        database.execute("SET lock_configuration = true")
+        return database
+
+    def _current(self):
+        key = self._source_key()
+        with self._lock:
+            if self._database is None or key != self._key:
+                # Queries still running on the previous database keep it
+                # alive through their cursors.
+                if self._database is not None:
+                    logger.info(f"DuckDB source {self.source} changed, reopening")
+                self._database = self._open()
+                self._key = key
+            return self._database
+
+    @contextmanager
+    def connection(self):
+        conn = _DuckConnection(self._current(), self._lock)
+        # The deadline covers everything run on the connection.
+        timer = threading.Timer(self.timeout, conn.interrupt)
+        timer.start()
+        try:
+            yield conn
+        finally:
+            timer.cancel()
+            conn.close()
+
+    def read(self, fn, *args):
+        return _traced("read", self.connection, fn, args, system="duckdb")
+
+    def execute(self, conn, query: str, approximate_ok: bool = False):
+        import duckdb
+
+        trace.get_current_span().set_attribute("db.statement", query)
+        try:
+            statements = duckdb.extract_statements(query)
+        except duckdb.Error as e:
+            raise QueryRejected(str(e)) from None
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise QueryRejected("Only read-only SELECT queries are allowed")
+        start = time.perf_counter()
+        try:
+            result = shape(conn, query)
+        except duckdb.InterruptException:
+            slow_queries.record(query, (time.perf_counter() - start) * 1000, [], status="timeout")
+            raise QueryRejected(f"Query exceeded the {self.timeout:g}s time budget; aggregate or filter more") from None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms >= slow_queries.threshold_ms:
+            slow_queries.record(query, elapsed_ms, [])
+        if approximate_ok:
+            result.note = "exact: DuckDB scans the full table"
+        return result
+
+    def stats(self) -> dict:
+        import duckdb
+
+        stats = {"engine": self.name, "dialect": self.dialect, "source": self.source, "version": duckdb.__version__}
+        if self._database is not None:
+            with self._lock:
+                stats["threads"] = self._database.execute("SELECT current_setting('threads')").fetchone()[0]
+        return stats
+
+
+def _require_duckdb():
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        raise ValueError("QUERY_ENGINE=duckdb needs duckdb (pip install duckdb)")
+
+
+def snapshot_parquet(directory: str = DUCKDB_SOURCE, db_file: str = DB_FILE) -> list:
+    # Writes every table of the SQLite file to <directory>/<table>.parquet
+    # (through a temporary file, so readers never see half a snapshot) and
+    # removes snapshots of tables that no longer exist.
+    if directory == "sqlite":
+        raise ValueError("Set DUCKDB_SOURCE to a directory to use Parquet snapshots")
+    os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+        )]
+    finally:
+        conn.close()
+
+    written = []
+    for table in tables:
+        start = time.perf_counter()
+        path = os.path.join(directory, f"{table}.parquet")
+        export = Export("parquet", table_name=table, db_file=db_file, batch_size=SNAPSHOT_ROW_GROUP)
+        with open(path + ".tmp", "wb") as f:
+            for chunk in export.stream():
+                f.write(chunk)
+        os.replace(path + ".tmp", path)
+        written.append({"table": table, "rows": export.rows, "seconds": round(time.perf_counter() - start, 2)})
+        logger.info(f"Snapshot of {table}: {export.rows} rows to {path}")
+    for path in glob.glob(os.path.join(directory, "*.parquet")):
+        if os.path.basename(path)[:-len(".parquet")] not in tables:
+            os.remove(path)
+    return written
+
+
+if QUERY_ENGINE not in ("sqlite", "duckdb"):
+    raise ValueError(f"Unknown QUERY_ENGINE {QUERY_ENGINE!r}, expected 'sqlite' or 'duckdb'")
+
+query_engine = DuckDbEngine() if QUERY_ENGINE == "duckdb" else SqliteEngine()
+
+
+async def run_query(fn, *args):
+    # Like db.run_read, on the configured query engine.
+    return await asyncio.to_thread(query_engine.read, fn, *args)
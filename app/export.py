@@ -0,0 +1,261 @@
+import csv
+import io
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from .db import DB_BUSY_TIMEOUT_MS, DB_FILE
+from .tables import parse_filters, table_columns
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "2"))
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Python types of SQLite values, by storage class.
+_CLASSES = {int: "integer", float: "real", str: "text", bytes: "blob"}
+
+# Exports can run for minutes, so they use their own read-only connections
+# rather than the request pool, and only a few may run at once.
+_slots = threading.BoundedSemaphore(EXPORT_CONCURRENCY)
+
+
+def table_query(conn, table_name: str, filters: list = None):
+    columns = table_columns(conn, table_name)
+    where, params = parse_filters(filters, columns)
+    where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+    return f"SELECT * FROM {table_name}{where_sql}", params
+
+
+def storage_classes(conn, sql: str, params: list, count: int) -> list:
+    # The SQLite storage classes found in each result column, in one pass
+    # inside SQLite. A column can mix them (and ingest types new tables from
+    # their first batch), so no single batch can fix an Arrow schema.
+    names = ", ".join(f"c{i}" for i in range(count))
+    found = ", ".join(f"group_concat(DISTINCT typeof(c{i}))" for i in range(count))
+    row = conn.execute(f"WITH q({names}) AS ({sql}\n) SELECT {found} FROM q", params).fetchone()
+    return [set(value.split(",")) - {"null"} if value else set() for value in row]
+
+
+def declared_class(declared: str):
+    # The storage class a declared column type stores by default (SQLite's
+    # affinity rules), or None when it does not imply one.
+    declared = (declared or "").upper()
+    if "INT" in declared:
+        return "integer"
+    if any(word in declared for word in ("CHAR", "CLOB", "TEXT")):
+        return "text"
+    if any(word in declared for word in ("REAL", "FLOA", "DOUB")):
+        return "real"
+    return None
+
+
+def check_select(sql: str) -> str:
+    sql = sql.replace("```sql", "").replace("```", "").strip().rstrip(";").strip()
+    if not sql.upper().startswith(("SELECT", "WITH")):
+        raise ValueError("Only SELECT queries can be exported")
+    return sql
+
+
+class Export:
+    # An open cursor plus the connection and slot it holds. Everything is
+    # released when the stream finishes, fails or the client goes away.
+    def __init__(self, fmt: str, table_name: str = None, filters: list = None, sql: str = None,
+                 db_file: str = DB_FILE, batch_size: int = EXPORT_BATCH_SIZE):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}. Use one of {', '.join(FORMATS)}")
+        if fmt in ("arrow", "parquet"):
+            _require_pyarrow()
+        self.fmt = fmt
+        self.batch_size = batch_size
+        self.rows = 0
+        self._conn = None
+        if not _slots.acquire(blocking=False):
+            raise ValueError("Too many exports in progress, try again shortly")
+        self._slot = True
+        try:
+            self._conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, check_same_thread=False,
+                                         timeout=DB_BUSY_TIMEOUT_MS / 1000)
+            self._conn.execute("PRAGMA query_only=ON")
+            declared = []
+            if table_name is not None:
+                sql, params = table_query(self._conn, table_name, filters)
+                declared = [row[2] for row in self._conn.execute(f"PRAGMA table_info({table_name})")]
+            else:
+                sql, params = check_select(sql), []
+            # One read transaction: the type scan and the export see the same rows.
+            self._conn.execute("BEGIN")
+            self.cursor = self._conn.execute(sql, params)
+            self.columns = [description[0] for description in self.cursor.description]
+            self._first = self.cursor.fetchmany(batch_size)
+            self.schema = None
+            if fmt in ("arrow", "parquet"):
+                if len(self._first) < batch_size:
+                    # The whole result is in hand: no second pass needed.
+                    classes = [{_CLASSES[type(row[i])] for row in self._first if row[i] is not None}
+                               for i in range(len(self.columns))]
+                else:
+                    classes = storage_classes(self._conn, sql, params, len(self.columns))
+                if declared:
+                    classes = [c | {declared_class(d)} - {None} for c, d in zip(classes, declared)]
+                self.schema = _arrow_schema(self.columns, classes)
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def media_type(self) -> str:
+        return FORMATS[self.fmt][0]
+
+    def filename(self, name: str) -> str:
+        return f"{name}.{FORMATS[self.fmt][1]}"
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+        if self._slot:
+            self._slot = False
+            _slots.release()
+
+    def _batches(self):
+        # Starts with the batch fetched in __init__.
+        batch, self._first = self._first, None
+        while batch:
+            self.rows += len(batch)
+            yield batch
+            batch = self.cursor.fetchmany(self.batch_size)
+
+    def stream(self):
+        # Sync generator: Starlette runs each step in its thread pool, so the
+        # event loop never waits on SQLite and only one batch is in memory.
+        try:
+            writer = {"csv": _csv, "ndjson": _ndjson, "arrow": _arrow, "parquet": _parquet}[self.fmt]
+            yield from writer(self.columns if self.schema is None else self.schema, self._batches())
+        finally:
+            logger.info(f"Export finished: {self.rows} rows as {self.fmt}")
+            self.close()
+
+
+def _csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _ndjson(columns, batches):
+    for batch in batches:
+        lines = [json.dumps(dict(zip(columns, row)), default=str) for row in batch]
+        yield ("\n".join(lines) + "\n").encode()
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ValueError("Arrow and Parquet exports need pyarrow (pip install pyarrow)")
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file that hands back what was written since the last drain.
+    # tell() keeps counting so Parquet footer offsets stay correct.
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_type(classes: set):
+    # Integers widen to float64 next to reals; any other mix is written as
+    # text, so no value is ever narrowed.
+    import pyarrow as pa
+
+    if not classes:
+        return pa.string()
+    if classes <= {"integer"}:
+        return pa.int64()
+    if classes <= {"integer", "real"}:
+        return pa.float64()
+    if classes == {"blob"}:
+        return pa.binary()
+    return pa.string()
+
+
+def _arrow_schema(columns: list, classes: list):
+    import pyarrow as pa
+
+    return pa.schema([(name, _arrow_type(found)) for name, found in zip(columns, classes)])
+
+
+def _text(value) -> str:
+    return value.hex() if isinstance(value, bytes) else str(value)
+
+
+def _record_batch(schema, batch):
+    import pyarrow as pa
+
+    arrays = []
+    for i, field in enumerate(schema):
+        values = [row[i] for row in batch]
+        if pa.types.is_string(field.type):
+            values = [None if v is None else _text(v) for v in values]
+        elif pa.types.is_floating(field.type):
+            values = [None if v is None else float(v) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _columnar(schema, batches, open_writer):
+    # The schema covers every row (see storage_classes), so each batch is
+    # written as is.
+    sink = _ChunkSink()
+    writer = open_writer(sink, schema)
+    for batch in batches:
+        writer.write_batch(_record_batch(schema, batch))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def _arrow(schema, batches):
+    import pyarrow as pa
+
+    return _columnar(schema, batches, lambda sink, schema: pa.ipc.new_stream(sink, schema))
+
+
+def _parquet(schema, batches):
+    import pyarrow.parquet as pq
+
+    # One row group per fetched batch.
+    return _columnar(schema, batches, lambda sink, schema: pq.ParquetWriter(sink, schema, compression="zstd"))
@@ -0,0 +1,227 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+WORKLOAD_SIZE = int(os.getenv("INDEX_ADVISOR_WORKLOAD_SIZE", "500"))
+MAX_INDEX_COLUMNS = 6
+# Rows sampled per table to estimate column selectivity.
+SAMPLE_ROWS = 100_000
+MEASURE_CHUNK_ROWS = 10_000
+
+_CLAUSE_RE = re.compile(r"\b(WHERE|GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT)\b", re.IGNORECASE)
+
+
+def normalize_sql(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().rstrip(";"))
+
+
+class WorkloadLog:
+    # Distinct agent queries with how often they ran, their observed time and
+    # the tables they scanned in full.
+    def __init__(self, max_entries: int = WORKLOAD_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, query: str, elapsed_ms: float, plan: list):
+        key = normalize_sql(query)
+        scans = sorted({detail[5:].split(" ")[0] for _, _, detail in plan
+                        if detail.startswith("SCAN ") and "INDEX" not in detail and detail != "SCAN CONSTANT ROW"})
+        with self._lock:
+            entry = self._entries.pop(key, None) or {"query": key, "count": 0, "total_ms": 0.0}
+            entry["count"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["scans"] = scans
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def entries(self) -> list:
+        with self._lock:
+            return [dict(entry) for entry in self._entries.values()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+workload = WorkloadLog()
+
+
+def _clauses(query: str) -> dict:
+    # Split the outermost statement into its clauses. This is a heuristic, not
+    # a parser; candidates are verified against the planner afterwards.
+    parts = {"SELECT": ""}
+    current, last = "SELECT", 0
+    for match in _CLAUSE_RE.finditer(query):
+        parts[current] = parts.get(current, "") + " " + query[last:match.start()]
+        current, last = re.sub(r"\s+", " ", match.group(1).upper()), match.end()
+    parts[current] = parts.get(current, "") + " " + query[last:]
+    return parts
+
+
+def _mentions(text: str, columns: list) -> list:
+    return [c for c in columns if re.search(rf"(?<![\w']){re.escape(c)}\b", text, re.IGNORECASE)]
+
+
+def candidate_columns(query: str, columns: list) -> list:
+    # Equality filters first, then grouping/ordering, then one range filter,
+    # then the remaining referenced columns so the index covers the query.
+    clauses = _clauses(query)
+    where = clauses.get("WHERE", "")
+    equality = [c for c in columns
+                if re.search(rf"(?<![\w']){re.escape(c)}\s*(=|\bIN\b|\bIS\b)", where, re.IGNORECASE)]
+    grouping = _mentions(clauses.get("GROUP BY", "") + " " + clauses.get("ORDER BY", ""), columns)
+    ranges = [c for c in _mentions(where, columns) if c not in equality]
+    referenced = _mentions(query, columns)
+
+    if not (equality or grouping or ranges) and (not referenced or len(referenced) * 2 > len(columns)):
+        # Nothing to search or group on: a covering index would only make the
+        # scan narrower, which pays off only when few columns are read.
+        return []
+    ordered = []
+    for column in equality + grouping + ranges[:1] + referenced:
+        if column not in ordered:
+            ordered.append(column)
+    if len(ordered) > MAX_INDEX_COLUMNS:
+        keys = [c for c in ordered if c in equality or c in grouping or c in ranges[:1]]
+        ordered = keys[:MAX_INDEX_COLUMNS]
+    return ordered
+
+
+def index_name(table: str, columns: list) -> str:
+    digest = hashlib.sha1(",".join(columns).encode()).hexdigest()[:6]
+    return f"idx_advisor_{table}_{'_'.join(columns)[:40]}_{digest}"
+
+
+def _what_if(schema: list, query: str, table: str, name: str, columns: list) -> bool:
+    # Replay the schema plus the candidate in an empty in-memory database and
+    # check that the planner picks the candidate for this query.
+    scratch = sqlite3.connect(":memory:")
+    try:
+        for sql in schema:
+            scratch.execute(sql)
+        scratch.execute(f'CREATE INDEX "{name}" ON "{table}" ({", ".join(columns)})')
+        plan = [row[3] for row in scratch.execute(f"EXPLAIN QUERY PLAN {query}")]
+    except sqlite3.Error as e:
+        logger.debug(f"What-if failed for {name}: {e}")
+        return False
+    finally:
+        scratch.close()
+    return any(name in detail for detail in plan)
+
+
+def _distinct_ratio(conn, table: str, column: str, cache: dict) -> float:
+    key = (table, column)
+    if key not in cache:
+        total, distinct = conn.execute(
+            f'SELECT COUNT(*), COUNT(DISTINCT "{column}") FROM (SELECT "{column}" FROM "{table}" LIMIT {SAMPLE_ROWS})'
+        ).fetchone()
+        cache[key] = (distinct or 1) / (total or 1)
+    return cache[key]
+
+
+def estimate_speedup(conn, query: str, table: str, columns: list, table_columns: list, cache: dict) -> float:
+    # Rows read before (a full scan) over rows read through the index: each
+    # equality column divides by its distinct count, and a covering scan reads
+    # narrower rows.
+    rows = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+    if not rows:
+        return 1.0
+    where = _clauses(query).get("WHERE", "")
+    selectivity = 1.0
+    for column in columns:
+        if re.search(rf"(?<![\w']){re.escape(column)}\s*(=|\bIN\b)", where, re.IGNORECASE):
+            selectivity /= max(1.0, _distinct_ratio(conn, table, column, cache) * min(rows, SAMPLE_ROWS))
+        else:
+            break
+    covering = set(_mentions(query, table_columns)) <= set(columns)
+    width = (len(columns) + 1) / (len(table_columns) + 1) if covering else 1.0
+    return round(1.0 / max(selectivity * width, 1.0 / rows), 1)
+
+
+def recommend(conn, entries: list = None) -> list:
+    entries = workload.entries() if entries is None else entries
+    # Tables, then their indexes. Views and triggers (rollups, samples) can
+    # reference tables created after them and never change a query plan.
+    schema = [row[0] for row in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+        "AND type IN ('table', 'index') ORDER BY type = 'index'"
+    )]
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+
+    candidates, cache = {}, {}
+    for entry in entries:
+        for scanned in entry["scans"]:
+            table = scanned if scanned in tables else next(
+                (t for t in tables if re.search(rf"\b{re.escape(t)}\s+(?:AS\s+)?{re.escape(scanned)}\b",
+                                                entry["query"], re.IGNORECASE)), None)
+            if table is None:
+                continue
+            table_columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+            columns = candidate_columns(entry["query"], table_columns)
+            if not columns:
+                continue
+            name = index_name(table, columns)
+            if name in existing or not _what_if(schema, entry["query"], table, name, columns):
+                continue
+            candidate = candidates.setdefault(name, {
+                "name": name,
+                "table": table,
+                "columns": columns,
+                "sql": f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({", ".join(columns)})',
+                "queries": [],
+            })
+            candidate["queries"].append({
+                "query": entry["query"],
+                "count": entry["count"],
+                "observed_ms": round(entry["total_ms"] / entry["count"], 1),
+                "estimated_speedup": estimate_speedup(conn, entry["query"], table, columns, table_columns, cache),
+            })
+
+    # An index whose columns are a prefix of another candidate's is redundant.
+    for name, candidate in list(candidates.items()):
+        for other in candidates.values():
+            if other is not candidate and other["table"] == candidate["table"] \
+                    and other["columns"][:len(candidate["columns"])] == candidate["columns"]:
+                candidates.pop(name)
+                break
+
+    result = list(candidates.values())
+    for candidate in result:
+        candidate["benefit_ms"] = round(sum(q["count"] * q["observed_ms"] * (1 - 1 / q["estimated_speedup"])
+                                            for q in candidate["queries"]), 1)
+    return sorted(result, key=lambda c: c["benefit_ms"], reverse=True)
+
+
+def create_indexes(conn, recommendations: list):
+    # Writer side of apply(): build the indexes and refresh planner statistics.
+    for candidate in recommendations:
+        logger.info(f"Creating index: {candidate['sql']}")
+        conn.execute(candidate["sql"])
+    if recommendations:
+        conn.execute("ANALYZE")
+
+
+def measure(conn, query: str):
+    # Milliseconds for one run under the agent time budget, None on timeout.
+    # Rows are read in chunks and discarded, so a large result is never held.
+    from .sql_guard import QueryRejected, guard
+
+    start = time.perf_counter()
+    try:
+        with guard(conn):
+            cursor = conn.execute(query)
+            while cursor.fetchmany(MEASURE_CHUNK_ROWS):
+                pass
+    except QueryRejected:
+        return None
+    return round((time.perf_counter() - start) * 1000, 1)
@@ -0,0 +1,386 @@
+import codecs
+import csv
+import datetime
+import json
+import logging
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .db import pool
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "10000"))
+MAX_INGEST_JOBS = 100
+
+FORMATS = ("csv", "json", "ndjson", "parquet")
+CONTENT_TYPES = {
+    "text/csv": "csv",
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/vnd.apache.parquet": "parquet",
+}
+
+# Pushed by the endpoint when the client disconnects mid-upload.
+_ABORT = object()
+
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?$")
+
+
+def detect_format(fmt: str, content_type: str) -> str:
+    if fmt:
+        fmt = fmt.lower()
+    else:
+        fmt = CONTENT_TYPES.get((content_type or "").split(";")[0].strip().lower())
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown ingest format, use format= one of {', '.join(FORMATS)}")
+    return fmt
+
+
+# --- Parsers: each turns an iterator of byte chunks into (columns, rows) batches ---
+
+def _text_lines(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        parts = (pending + decoder.decode(chunk)).split("\n")
+        pending = parts.pop()
+        for part in parts:
+            yield part + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _csv_batches(chunks, batch_size):
+    reader = csv.reader(_text_lines(chunks))
+    columns = next(reader, None)
+    if not columns:
+        raise ValueError("CSV upload is empty")
+    columns = [c.strip() for c in columns]
+    width = len(columns)
+    batch = []
+    for line, row in enumerate(reader, start=2):
+        if not row:
+            continue
+        if len(row) != width:
+            raise ValueError(f"CSV line {line} has {len(row)} fields, expected {width}")
+        # Empty CSV fields are NULLs; SQLite's column affinity turns the other
+        # strings into INTEGER/REAL values on insert.
+        batch.append(tuple(value if value != "" else None for value in row))
+        if len(batch) >= batch_size:
+            yield columns, batch
+            batch = []
+    if batch:
+        yield columns, batch
+
+
+def _json_objects(chunks):
+    # Incremental parser for a top-level JSON array of objects.
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer, started, finished = "", False, False
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("JSON upload must be an array of objects")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                finished = True
+                pos += 1
+                break
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # incomplete object, wait for more data
+            yield obj
+        buffer = buffer[pos:]
+        if finished:
+            break
+    if not finished:
+        raise ValueError("JSON upload ended before the closing ]")
+
+
+def _ndjson_objects(chunks):
+    for number, line in enumerate(_text_lines(chunks), start=1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"NDJSON line {number}: {e}")
+
+
+def _object_batches(objects, batch_size):
+    # Columns come from the keys of the first batch.
+    columns, batch = None, []
+    for obj in objects:
+        if not isinstance(obj, dict):
+            raise ValueError("Each JSON record must be an object")
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            columns = columns or _union_keys(batch)
+            yield columns, _object_rows(columns, batch)
+            batch = []
+    if batch:
+        columns = columns or _union_keys(batch)
+        yield columns, _object_rows(columns, batch)
+
+
+def _union_keys(objects):
+    return list(OrderedDict.fromkeys(key for obj in objects for key in obj))
+
+
+def _object_rows(columns, objects):
+    known = set(columns)
+    rows = []
+    for obj in objects:
+        extra = obj.keys() - known
+        if extra:
+            raise ValueError(f"Unexpected column(s): {', '.join(sorted(extra))}")
+        rows.append(tuple(_sqlite_value(obj.get(c)) for c in columns))
+    return rows
+
+
+def _sqlite_value(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def _parquet_batches(chunks, batch_size):
+    # Parquet keeps its metadata in the footer, so the upload is spooled to a
+    # temporary file first and then read back one record batch at a time.
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet ingest needs pyarrow (pip install pyarrow)")
+
+    with tempfile.TemporaryFile() as spool:
+        for chunk in chunks:
+            spool.write(chunk)
+        spool.seek(0)
+        parquet = pq.ParquetFile(spool)
+        columns = parquet.schema_arrow.names
+        for record_batch in parquet.iter_batches(batch_size=batch_size):
+            data = record_batch.to_pydict()
+            rows = [tuple(_sqlite_value(v) for v in row) for row in zip(*(data[c] for c in columns))]
+            yield columns, rows
+
+
+def parse(fmt: str, chunks, batch_size: int = INGEST_BATCH_SIZE):
+    if fmt == "csv":
+        return _csv_batches(chunks, batch_size)
+    if fmt == "json":
+        return _object_batches(_json_objects(chunks), batch_size)
+    if fmt == "ndjson":
+        return _object_batches(_ndjson_objects(chunks), batch_size)
+    return _parquet_batches(chunks, batch_size)
+
+
+# --- Type inference ---
+
+def _value_type(value):
+    if isinstance(value, bool) or isinstance(value, int):
+        return "INTEGER"
+    if isinstance(value, float):
+        return "REAL"
+    if isinstance(value, (bytes, bytearray)):
+        return "BLOB"
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            int(text)
+            return "INTEGER"
+        except ValueError:
+            pass
+        try:
+            float(text)
+            return "REAL"
+        except ValueError:
+            pass
+        if DATE_RE.match(text):
+            return "DATE"
+    return "TEXT"
+
+
+def infer_types(columns, rows) -> list:
+    # One of create_table's ALLOWED_TYPES per column, from the first batch.
+    types = []
+    for i in range(len(columns)):
+        seen = {_value_type(row[i]) for row in rows if row[i] is not None}
+        if not seen:
+            inferred = "TEXT"
+        elif len(seen) == 1:
+            inferred = seen.pop()
+        elif seen == {"INTEGER", "REAL"}:
+            inferred = "REAL"
+        else:
+            inferred = "TEXT"
+        types.append(inferred)
+    return types
+
+
+# --- Jobs ---
+
+class IngestJob:
+    def __init__(self, table_name: str, fmt: str, create: bool = True, batch_size: int = INGEST_BATCH_SIZE):
+        self.id = uuid.uuid4().hex
+        self.table_name = table_name
+        self.fmt = fmt
+        self.create = create
+        self.batch_size = batch_size
+        self.status = "running"
+        self.error = None
+        self.rows = 0
+        self.bytes = 0
+        self.batches = 0
+        self.created_table = False
+        self.columns = None
+        self.started = time.time()
+        self.finished = None
+        self._chunks = queue.Queue(maxsize=16)
+        self._closed = threading.Event()
+
+    # Producer side: called from the event loop via asyncio.to_thread.
+    def feed(self, chunk: bytes):
+        if not self._closed.is_set():
+            self._chunks.put(chunk)
+
+    def end(self):
+        self.feed(None)
+
+    def abort(self):
+        self.feed(_ABORT)
+
+    @property
+    def accepting(self) -> bool:
+        return not self._closed.is_set()
+
+    def _iter_chunks(self):
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                return
+            if chunk is _ABORT:
+                raise ValueError("Upload was interrupted")
+            self.bytes += len(chunk)
+            yield chunk
+
+    def run(self):
+        try:
+            for columns, rows in parse(self.fmt, self._iter_chunks(), self.batch_size):
+                if self.columns is None:
+                    self._prepare_table(columns, rows)
+                self._insert(rows)
+            self.status = "done"
+        except Exception as e:
+            logger.error(f"Ingest {self.id} into {self.table_name} failed after {self.rows} rows: {e}")
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.finished = time.time()
+            # Unblock a producer waiting on a full queue.
+            self._closed.set()
+            while True:
+                try:
+                    self._chunks.get_nowait()
+                except queue.Empty:
+                    break
+        logger.info(f"Ingest {self.id}: {self.rows} rows into {self.table_name} ({self.rows_per_sec:.0f} rows/s)")
+        return self
+
+    def _prepare_table(self, columns, rows):
+        for column in columns:
+            if not column.isidentifier():
+                raise ValueError(f"Invalid column name: {column}")
+
+        with pool.writer() as conn:
+            existing = [row[1] for row in conn.execute(f"PRAGMA table_info({self.table_name})").fetchall()]
+            if existing:
+                unknown = [c for c in columns if c not in existing]
+                if unknown:
+                    raise ValueError(f"Unknown column(s) for {self.table_name}: {', '.join(unknown)}")
+            elif not self.create:
+                raise ValueError(f"no such table: {self.table_name}")
+            else:
+                types = infer_types(columns, rows)
+                definitions = ", ".join(f"{c} {t}" for c, t in zip(columns, types))
+                conn.execute(f"CREATE TABLE {self.table_name} ({definitions})")
+                self.created_table = True
+
+        self.columns = columns
+        placeholders = ", ".join(["?"] * len(columns))
+        self._insert_sql = f"INSERT INTO {self.table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+
+    def _insert(self, rows):
+        # One transaction per batch: a single fsync per batch, and other writers
+        # can get in between batches.
+        with pool.writer() as conn:
+            conn.executemany(self._insert_sql, rows)
+        self.rows += len(rows)
+        self.batches += 1
+
+    @property
+    def rows_per_sec(self) -> float:
+        elapsed = (self.finished or time.time()) - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "table": self.table_name,
+            "format": self.fmt,
+            "status": self.status,
+            "error": self.error,
+            "rows": self.rows,
+            "batches": self.batches,
+            "bytes_received": self.bytes,
+            "created_table": self.created_table,
+            "elapsed_seconds": round((self.finished or time.time()) - self.started, 3),
+            "rows_per_sec": round(self.rows_per_sec, 1),
+        }
+
+
+class JobRegistry:
+    def __init__(self, max_jobs: int = MAX_INGEST_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, job: IngestJob):
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs.
+            for job_id in list(self._jobs):
+                if len(self._jobs) <= self.max_jobs:
+                    break
+                if self._jobs[job_id].status != "running":
+                    del self._jobs[job_id]
+
+    def get(self, job_id: str):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def all(self) -> list:
+        with self._lock:
+            return list(self._jobs.values())
+
+
+ingest_jobs = JobRegistry()
@@ -1,21 +1,47 @@
+import asyncio
+import gzip
+import json
 import logging
 from contextlib import asynccontextmanager
 import os
-import uuid
+import time
 
-from fastapi import FastAPI
+_import_start = time.perf_counter()
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, Query, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from google.adk.runners import InMemoryRunner
-from google.adk.events.event import Event
-from google.genai.types import Content, Part
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from opentelemetry.trace import StatusCode, get_current_span
 
-from . import agent_setup
-import sqlite3
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+
+# Before the app modules: their settings are read from the environment when
+# they are imported. The agents (and the ADK stack) are loaded in lifespan.
+load_dotenv()
 
-from .agents.agent import root_agent
+from .admission import Overloaded, agent_admission
+from .agents.sub_agents.sql_agent.schema_cache import schema_cache
+from .batch import BATCH_CONCURRENCY, BATCH_RETRIES, parse_questions, run_batch
+from .cache import response_cache, sql_trace
+from .charts import chart_store
+from .db import db_version, pool, run_read, run_write
+from .engines import DUCKDB_SOURCE, query_engine, snapshot_parquet
+from .export import Export
+from .index_advisor import create_indexes, measure, recommend, workload
+from .ingest import IngestJob, detect_format, ingest_jobs
+from .approx import APPROX_PREFIX, APPROX_SAMPLE_ROWS, compute_sketches, create_sample, drop_sample, drop_samples_for, store_sketches
+from .approx import definitions as sample_definitions
+from .rollups import ROLLUP_PREFIX, create_rollup, definitions, drop_rollup, drop_rollups_for
+from .sessions import SessionManager
+from .sql_guard import slow_queries
+from .state import STATE_BACKEND
+from .startup import CHART_PREWARM, prewarm_charts, record, stage, timings
+from .tables import ALLOWED_TYPES, fetch_page
+from .streaming import AnswerStreamExtractor, EventTextCollector, event_text, sse
+from .telemetry import Gauge, metrics, setup_tracing, shutdown_tracing, tracer
+from .tokens import ContextBudgetExceeded, token_counter
 
 root_logger = logging.getLogger()
 root_logger.setLevel(logging.INFO)
@@ -29,14 +55,51 @@ root_logger.addHandler(file_handler)
 
 logger = logging.getLogger(__name__)
 
+setup_tracing()
+metrics.add(Gauge("agent_runs_active", "Agent runs holding an admission slot.", lambda: agent_admission.slots.active))
+metrics.add(Gauge("agent_runs_queued", "Agent runs waiting for an admission slot.", lambda: agent_admission.slots.waiting))
+metrics.add(Gauge("llm_calls_in_flight", "Model calls holding a concurrency slot.", lambda: agent_admission.limiter.slots.active))
+metrics.add(Gauge("app_startup_seconds", "Duration of each startup stage.", lambda: timings, label="stage"))
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Application starting up")
+    with stage("agents"):
+        from . import agent_runtime
+
+        runner, direct_runner = agent_runtime.build_runners()
+    app.state.agents = agent_runtime
+    app.state.runner = runner
+    app.state.direct_runner = direct_runner
+    app.state.sessions = SessionManager(runner.session_service, app_name="agents", user_id="user",
+                                        shared=STATE_BACKEND != "memory")
+    prewarm_charts()
     yield
     logger.info("Application shutting down")
+    pool.close()
+    shutdown_tracing()
 
 app = FastAPI(title="G-ADK Agents", lifespan=lifespan)
 
+# Charts are served from the chart store; this route has to be registered
+# before the /static mount to take precedence over it.
+@app.get("/static/charts/{filename}")
+async def get_chart(filename: str, request: Request):
+    chart = await asyncio.to_thread(chart_store.get, filename)
+    if chart is None:
+        return Response(status_code=404)
+    payload, gzipped = chart
+    # Chart names are content hashes, so a given URL never changes.
+    headers = {"ETag": f'"{filename.removesuffix(".json")}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    if gzipped:
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            headers["Content-Encoding"] = "gzip"
+        else:
+            payload = gzip.decompress(payload)
+    return Response(payload, media_type="application/json", headers={**headers, "Vary": "Accept-Encoding"})
+
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 @app.get("/")
@@ -47,64 +110,116 @@ async def root():
 async def data_manager():
     return FileResponse("app/static/data_manager.html")
 
-def get_db_connection():
-    conn = sqlite3.connect('demo.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+def internal_table(name: str) -> bool:
+    # Rollups, samples and their catalogs are kept current by triggers on the
+    # source tables; writing to them directly breaks those writes.
+    return name.startswith((ROLLUP_PREFIX, APPROX_PREFIX))
 
 @app.get("/api/tables")
 async def list_tables():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-    tables = [row['name'] for row in cursor.fetchall()]
-    conn.close()
+    def query(conn):
+        cursor = conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        return [row['name'] for row in cursor.fetchall() if not internal_table(row['name'])]
+
+    tables = await run_read(query)
     return {"tables": tables}
 
 @app.get("/api/table/{table_name}")
-async def get_table_data(table_name: str):
+async def get_table_data(
+    table_name: str,
+    limit: int = 100,
+    after: Optional[str] = None,
+    sort: Optional[str] = None,
+    order: str = "asc",
+    filter: List[str] = Query(default=[]),
+    count: str = "estimate",
+):
     if not table_name.isidentifier():
         return {"error": "Invalid table name"}
-        
-    conn = get_db_connection()
-    cursor = conn.cursor()
+
     try:
-        cursor.execute(f"SELECT rowid, * FROM {table_name}")
-        rows = cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        data = [dict(row) for row in rows]
-        conn.close()
-        return {"columns": columns, "data": data}
+        return await run_read(fetch_page, table_name, limit, after, sort, order, filter, count)
     except Exception as e:
-        conn.close()
         return {"error": str(e)}
 
+def export_response(export: Export, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        export.stream(),
+        media_type=export.media_type,
+        headers={"Content-Disposition": f'attachment; filename="{export.filename(name)}"'},
+    )
+
+@app.get("/api/table/{table_name}/export")
+async def export_table(table_name: str, format: str = "csv", filter: List[str] = Query(default=[])):
+    if not table_name.isidentifier():
+        return {"error": "Invalid table name"}
+
+    try:
+        export = await asyncio.to_thread(Export, format, table_name=table_name, filters=filter)
+    except Exception as e:
+        return {"error": str(e)}
+    return export_response(export, table_name)
+
+class ExportQueryRequest(BaseModel):
+    sql: Optional[str] = None
+    question: Optional[str] = None
+    format: str = "csv"
+
+@app.post("/api/export/query")
+async def export_query(request: ExportQueryRequest):
+    # Either raw SQL, or a question the agent already answered: its last query
+    # is re-run and streamed in full.
+    sql = request.sql
+    if not sql and request.question:
+        queries = response_cache.generated_sql(request.question)
+        if not queries:
+            return {"error": "No cached agent query for this question, ask the agent first"}
+        sql = queries[-1]
+    if not sql:
+        return {"error": "Provide either sql or question"}
+
+    try:
+        export = await asyncio.to_thread(Export, request.format, sql=sql)
+    except Exception as e:
+        return {"error": str(e)}
+    return export_response(export, "query")
+
 @app.delete("/api/table/{table_name}")
 async def drop_table(table_name: str):
     if not table_name.isidentifier():
         return {"error": "Invalid table name"}
-    conn = get_db_connection()
     try:
-        conn.execute(f"DROP TABLE {table_name}")
-        conn.commit()
-        conn.close()
+        def drop(conn):
+            # Rollups and samples of the table go with it.
+            sampled = next((d["source"] for d in sample_definitions(conn) if d["sample"] == table_name), None)
+            if any(r["name"] == table_name for r in definitions(conn)):
+                drop_rollup(conn, table_name)
+            elif sampled:
+                drop_sample(conn, sampled)
+            elif internal_table(table_name):
+                raise ValueError(f"{table_name} is an internal table")
+            else:
+                drop_rollups_for(conn, table_name)
+                drop_samples_for(conn, table_name)
+                conn.execute(f"DROP TABLE {table_name}")
+
+        await run_write(drop)
+        schema_cache.invalidate()
         return {"message": f"Table {table_name} deleted"}
     except Exception as e:
-        conn.close()
         return {"error": str(e)}
 
 @app.delete("/api/table/{table_name}/row/{rowid}")
 async def delete_row(table_name: str, rowid: int):
     if not table_name.isidentifier():
         return {"error": "Invalid table name"}
-    conn = get_db_connection()
+    if internal_table(table_name):
+        return {"error": f"{table_name} is an internal table"}
     try:
-        conn.execute(f"DELETE FROM {table_name} WHERE rowid = ?", (rowid,))
-        conn.commit()
-        conn.close()
+        await run_write(lambda conn: conn.execute(f"DELETE FROM {table_name} WHERE rowid = ?", (rowid,)))
+        schema_cache.invalidate()
         return {"message": "Row deleted"}
     except Exception as e:
-        conn.close()
         return {"error": str(e)}
 
 class InsertRowRequest(BaseModel):
@@ -114,9 +229,9 @@ class InsertRowRequest(BaseModel):
 async def insert_row(table_name: str, request: InsertRowRequest):
     if not table_name.isidentifier():
         return {"error": "Invalid table name"}
+    if internal_table(table_name):
+        return {"error": f"{table_name} is an internal table"}
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
     try:
         columns = list(request.data.keys())
         values = list(request.data.values())
@@ -124,14 +239,53 @@ async def insert_row(table_name: str, request: InsertRowRequest):
         cols_str = ", ".join(columns)
         
         query = f"INSERT INTO {table_name} ({cols_str}) VALUES ({placeholders})"
-        cursor.execute(query, values)
-        conn.commit()
-        conn.close()
+        await run_write(lambda conn: conn.execute(query, values))
+        schema_cache.invalidate()
         return {"message": "Row inserted successfully"}
     except Exception as e:
-        conn.close()
         return {"error": str(e)}
 
+@app.post("/api/table/{table_name}/ingest")
+async def ingest_table(table_name: str, request: Request, format: Optional[str] = None, create: bool = True):
+    # The body is read straight from the request stream (CSV, JSON array,
+    # NDJSON or Parquet) and parsed/loaded in a worker thread as it arrives.
+    if not table_name.isidentifier():
+        return {"error": "Invalid table name"}
+    if internal_table(table_name):
+        return {"error": f"{table_name} is an internal table"}
+    try:
+        fmt = detect_format(format, request.headers.get("content-type"))
+    except ValueError as e:
+        return {"error": str(e)}
+
+    job = IngestJob(table_name, fmt, create=create)
+    ingest_jobs.add(job)
+    worker = asyncio.create_task(asyncio.to_thread(job.run))
+    try:
+        async for chunk in request.stream():
+            if not job.accepting:
+                break
+            if chunk:
+                await asyncio.to_thread(job.feed, chunk)
+        await asyncio.to_thread(job.end)
+    except Exception:
+        await asyncio.to_thread(job.abort)
+    await worker
+    if job.rows or job.created_table:
+        schema_cache.invalidate()
+    return job.to_dict()
+
+@app.get("/api/ingest")
+async def list_ingest_jobs():
+    return {"jobs": [job.to_dict() for job in ingest_jobs.all()]}
+
+@app.get("/api/ingest/{job_id}")
+async def get_ingest_job(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return {"error": "Unknown ingest job"}
+    return job.to_dict()
+
 class ColumnDef(BaseModel):
     name: str
     type: str
@@ -146,9 +300,8 @@ class CreateTableRequest(BaseModel):
 async def create_table(request: CreateTableRequest):
     if not request.name.isidentifier():
         return {"error": "Invalid table name"}
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    if internal_table(request.name):
+        return {"error": f"{request.name} is an internal table"}
     
     try:
         cols_sql = []
@@ -158,8 +311,7 @@ async def create_table(request: CreateTableRequest):
                  raise ValueError(f"Invalid column name: {cname}")
 
             ctype = col.type.upper()
-            allowed_types = ["TEXT", "INTEGER", "REAL", "DATE", "BLOB"]
-            if ctype not in allowed_types:
+            if ctype not in ALLOWED_TYPES:
                 ctype = "TEXT"
             
             definition = f"{cname} {ctype}"
@@ -173,69 +325,412 @@ async def create_table(request: CreateTableRequest):
             cols_sql.append(definition)
         
         query = f"CREATE TABLE {request.name} ({', '.join(cols_sql)})"
-        cursor.execute(query)
-        conn.commit()
-        conn.close()
+        await run_write(lambda conn: conn.execute(query))
+        schema_cache.invalidate()
         return {"message": f"Table '{request.name}' created successfully"}
     except Exception as e:
-        conn.close()
         return {"error": str(e)}
 
+def friendly_error(e: Exception) -> str:
+    error_msg = str(e)
+
+    # Rate limit handling
+    if "RateLimitError" in error_msg or "429" in error_msg:
+         logger.warning(f"Rate limit: {e}")
+         import re
+         match = re.search(r"try again in (\d+(\.\d+)?)s", error_msg)
+         wait_time = match.group(1) if match else "20"
+         return f"⚠️ **System Busy**: Rate limit reached. Please try again in **{wait_time} seconds**."
+
+    # Tool validation / BadRequest handling (e.g., exec_python missing)
+    if "Tool call validation failed" in error_msg or "exec_python" in error_msg:
+         logger.warning(f"Tool validation error (likely hallucinations): {e}")
+         return "⚠️ **System Busy**: The AI is momentarily overwhelmed. Please wait 10-15 seconds and try asking again."
+
+    logger.error(f"Error processing query: {e}")
+    import traceback
+    traceback.print_exc()
+
+    # Generic user-friendly error
+    return "⚠️ **System Busy**: An internal error occurred. Please wait a moment and try again."
+
+def overloaded_response(e: Overloaded, session_id: Optional[str] = None) -> JSONResponse:
+    logger.warning(f"Rejecting agent query: {e} (retry after {e.retry_after}s)")
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(e.retry_after)},
+        content={"response": busy_message(e), "session_id": session_id, "retry_after": e.retry_after},
+    )
+
+def busy_message(e: Overloaded) -> str:
+    return f"⚠️ **System Busy**: {e} Please try again in **{e.retry_after} seconds**."
+
+def too_large_message(e: ContextBudgetExceeded) -> str:
+    return f"⚠️ **Question Too Large**: {e}. Please ask a narrower question or start a new session."
+
+def cacheable(session_id: Optional[str], no_cache: bool) -> bool:
+    # Follow-up questions depend on the conversation, so only the first turn of
+    # a session is answered from (or stored in) the response cache.
+    if not response_cache.enabled or session_id:
+        return False
+    if no_cache:
+        response_cache.bypassed += 1
+        return False
+    return True
+
+def runner_for(prompt: str):
+    if app.state.agents.use_direct_route(prompt):
+        logger.info("Routing query directly to the SQL agent")
+        get_current_span().set_attribute("app.route", "direct")
+        return app.state.direct_runner
+    get_current_span().set_attribute("app.route", "root")
+    return app.state.runner
+
+def request_span(prompt: str, session_id: Optional[str], streaming: bool):
+    # Parent of ADK's invocation/call_llm/execute_tool spans for this request.
+    attributes = {"app.streaming": streaming, "app.prompt_chars": len(prompt), "app.route": "none"}
+    if session_id:
+        attributes["session.id"] = session_id
+    return tracer.start_as_current_span("agent.query", attributes=attributes)
+
+def mark_failed(span, e: Exception):
+    span.record_exception(e)
+    span.set_status(StatusCode.ERROR, str(e))
+
+@app.get("/api/rollups")
+async def list_rollups():
+    def query(conn):
+        rollups = definitions(conn)
+        for rollup in rollups:
+            rollup.pop("columns")
+            rollup["groups"] = conn.execute(f'SELECT COUNT(*) FROM "{rollup["name"]}"').fetchone()[0]
+        return rollups
+
+    return {"rollups": await run_read(query)}
+
+class RollupRequest(BaseModel):
+    table: str
+    dimensions: List[str]
+    measures: List[str] = []
+    name: Optional[str] = None
+
+@app.post("/api/rollups")
+async def build_rollup(request: RollupRequest):
+    if not request.table.isidentifier():
+        return {"error": "Invalid table name"}
+    try:
+        rollup = await run_write(create_rollup, request.table, request.dimensions, request.measures, request.name)
+        schema_cache.invalidate()
+        return rollup
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.delete("/api/rollups/{name}")
+async def delete_rollup(name: str):
+    try:
+        await run_write(drop_rollup, name)
+        schema_cache.invalidate()
+        return {"message": f"Rollup {name} deleted"}
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/api/approx")
+async def list_samples():
+    def query(conn):
+        samples = sample_definitions(conn)
+        for sample in samples:
+            sample.pop("columns")
+            sample["sampled"] = conn.execute(f'SELECT COUNT(*) FROM "{sample["sample"]}"').fetchone()[0]
+        return samples
+
+    return {"samples": await run_read(query)}
+
+class SampleRequest(BaseModel):
+    table: str
+    sample_rows: int = APPROX_SAMPLE_ROWS
+
+@app.post("/api/approx")
+async def build_sample(request: SampleRequest):
+    # (Re)builds the table's sample, then its sketches: the scan for the
+    # sketches runs on a reader so writes are only blocked to store them.
+    if not request.table.isidentifier():
+        return {"error": "Invalid table name"}
+    try:
+        sample = await run_write(create_sample, request.table, request.sample_rows)
+        start = time.perf_counter()
+        sketches = await run_read(compute_sketches, request.table)
+        await run_write(store_sketches, request.table, sketches)
+        sample["sketch_seconds"] = round(time.perf_counter() - start, 2)
+        schema_cache.invalidate()
+        return sample
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.delete("/api/approx/{table}")
+async def delete_sample(table: str):
+    try:
+        await run_write(drop_sample, table)
+        schema_cache.invalidate()
+        return {"message": f"Sample of {table} deleted"}
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/api/index-advisor")
+async def index_advisor():
+    recommendations = await run_read(recommend)
+    return {"workload_queries": len(workload.entries()), "recommendations": recommendations}
+
+class ApplyIndexesRequest(BaseModel):
+    names: List[str] = []
+
+@app.post("/api/index-advisor/apply")
+async def apply_indexes(request: ApplyIndexesRequest):
+    # Opt-in: builds the recommended indexes (all, or the named ones) and
+    # reports the estimated speedup next to one measured run before and after.
+    try:
+        recommendations = await run_read(recommend)
+        chosen = [r for r in recommendations if not request.names or r["name"] in request.names]
+        queries = [q for r in chosen for q in r["queries"]]
+        for q in queries:
+            q["before_ms"] = await run_read(measure, q["query"])
+        await run_write(create_indexes, chosen)
+        schema_cache.invalidate()
+        for q in queries:
+            q["after_ms"] = await run_read(measure, q["query"])
+            if q["before_ms"] and q["after_ms"]:
+                q["measured_speedup"] = round(q["before_ms"] / max(q["after_ms"], 0.1), 1)
+        return {"created": chosen}
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/api/engine")
+async def engine_stats():
+    return query_engine.stats()
+
+@app.post("/api/engine/snapshot")
+async def engine_snapshot():
+    # Parquet copies of every table in DUCKDB_SOURCE for QUERY_ENGINE=duckdb.
+    # They are not updated on writes; call this again after loading data.
+    try:
+        tables = await asyncio.to_thread(snapshot_parquet)
+        # Cached answers are revalidated against the new snapshot.
+        schema_cache.invalidate()
+        return {"directory": DUCKDB_SOURCE, "tables": tables}
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/api/sql/slow")
+async def slow_sql():
+    return {"threshold_ms": slow_queries.threshold_ms, "queries": slow_queries.entries()}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/startup")
+async def startup_stats():
+    return {"stages": timings, "chart_prewarm": CHART_PREWARM}
+
+@app.get("/api/admission")
+async def admission_stats():
+    return agent_admission.stats()
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    return {
+        "state_backend": STATE_BACKEND,
+        "worker_pid": os.getpid(),
+        "response_cache": response_cache.stats(),
+        "schema_cache": {"hits": schema_cache.hits, "misses": schema_cache.misses},
+        "chart_store": chart_store.stats(),
+        "token_counts": token_counter.stats(),
+    }
+
 @app.post("/agent/query")
-async def query_agent(prompt: str):
+async def query_agent(prompt: str, session_id: Optional[str] = None, no_cache: bool = False):
     logger.info(f"Received query: {prompt}")
+    with request_span(prompt, session_id, streaming=False) as span:
+        return await answer_query(span, prompt, session_id, no_cache)
+
+async def answer_query(span, prompt: str, session_id: Optional[str], no_cache: bool):
+    runner = app.state.runner
+    sessions = app.state.sessions
+    use_cache = cacheable(session_id, no_cache)
     try:
-        local_runner = InMemoryRunner(agent=root_agent, app_name="agents")
-        session = await local_runner.session_service.create_session(user_id="user", app_name="agents")
-        session_id = session.id
-        logger.info(f"Session created: {session_id}")
-        
-        content = Content(parts=[Part(text=prompt)], role="user")
-        response_obj = local_runner.run_async(user_id="user", session_id=session_id, new_message=content)
-        
+        session_id = await sessions.acquire(session_id)
+    except Exception as e:
+        logger.error(f"Could not open session: {e}")
+        mark_failed(span, e)
+        return {"response": "⚠️ **System Busy**: An internal error occurred. Please wait a moment and try again."}
+
+    try:
+        version = db_version.current()
+        if use_cache:
+            cached = await asyncio.to_thread(response_cache.lookup, prompt, version)
+            if cached is not None:
+                logger.info("Response cache hit")
+                span.set_attribute("app.outcome", "cached")
+                await app.state.agents.record_cached_turn(runner, sessions, session_id, prompt, cached)
+                return {"response": cached, "session_id": session_id, "cached": True}
+
+        trace = []
+        sql_trace.set(trace)
+        content = app.state.agents.user_message(prompt)
         full_response = ""
-        if hasattr(response_obj, '__aiter__'):
-            async for chunk in response_obj:
-                if hasattr(chunk, 'content') and chunk.content and chunk.content.parts:
-                    for part in chunk.content.parts:
-                        if part.text:
-                            full_response += part.text
-                elif hasattr(chunk, 'text') and chunk.text:
-                        full_response += chunk.text
-                elif hasattr(chunk, 'delta') and chunk.delta:
-                        full_response += chunk.delta
-        else:
-            response = await response_obj
-            full_response = str(response)
+        # Only runs that need the model are admitted; cache hits never queue.
+        async with agent_admission.admit():
+            response_obj = runner_for(prompt).run_async(user_id=sessions.user_id, session_id=session_id, new_message=content)
+            if hasattr(response_obj, '__aiter__'):
+                async for chunk in response_obj:
+                    full_response += event_text(chunk)
+            else:
+                response = await response_obj
+                full_response = str(response)
         
-        logger.info(f"\n[RAW_AGENT_OUTPUT_START]\n{full_response}\n[RAW_AGENT_OUTPUT_END]\n")
+        logger.debug(f"\n[RAW_AGENT_OUTPUT_START]\n{full_response}\n[RAW_AGENT_OUTPUT_END]\n")
         cleaned_output = clean_response(full_response)
-        logger.info(f"\n[CLEANED_OUTPUT_START]\n{cleaned_output}\n[CLEANED_OUTPUT_END]\n")
+        logger.debug(f"\n[CLEANED_OUTPUT_START]\n{cleaned_output}\n[CLEANED_OUTPUT_END]\n")
+        span.set_attribute("app.response_chars", len(cleaned_output))
+        if use_cache and cleaned_output:
+            await asyncio.to_thread(response_cache.store, prompt, version, cleaned_output, trace)
         
-        return {"response": cleaned_output}
+        return {"response": cleaned_output, "session_id": session_id}
 
+    except Overloaded as e:
+        span.set_attribute("app.outcome", "rejected")
+        return overloaded_response(e, session_id)
+    except ContextBudgetExceeded as e:
+        logger.warning(f"Rejecting agent query: {e}")
+        span.set_attribute("app.outcome", "too_large")
+        return JSONResponse(status_code=413, content={"response": too_large_message(e), "session_id": session_id})
     except Exception as e:
-        error_msg = str(e)
-        
-        # Rate limit handling
-        if "RateLimitError" in error_msg or "429" in error_msg:
-             logger.warning(f"Rate limit: {e}")
-             import re
-             match = re.search(r"try again in (\d+(\.\d+)?)s", error_msg)
-             wait_time = match.group(1) if match else "20"
-             return {"response": f"⚠️ **System Busy**: Rate limit reached. Please try again in **{wait_time} seconds**."}
-        
-        # Tool validation / BadRequest handling (e.g., exec_python missing)
-        if "Tool call validation failed" in error_msg or "exec_python" in error_msg:
-             logger.warning(f"Tool validation error (likely hallucinations): {e}")
-             return {"response": "⚠️ **System Busy**: The AI is momentarily overwhelmed. Please wait 10-15 seconds and try asking again."}
-
-        logger.error(f"Error processing query: {e}")
-        import traceback
-        traceback.print_exc()
-        
-        # Generic user-friendly error
-        return {"response": "⚠️ **System Busy**: An internal error occurred. Please wait a moment and try again."}
+        mark_failed(span, e)
+        return {"response": friendly_error(e), "session_id": session_id}
+    finally:
+        await sessions.release(session_id)
+
+@app.post("/agent/query/stream")
+async def query_agent_stream(prompt: str, session_id: Optional[str] = None, no_cache: bool = False):
+    logger.info(f"Received streaming query: {prompt}")
+    runner = app.state.runner
+    sessions = app.state.sessions
+    use_cache = cacheable(session_id, no_cache)
+    try:
+        # Reject up front while a 503 can still be sent; waiting for a slot
+        # happens inside the stream.
+        agent_admission.check()
+    except Overloaded as e:
+        return overloaded_response(e, session_id)
+
+    async def events():
+        with request_span(prompt, session_id, streaming=True) as span:
+            async for chunk in stream_answer(span):
+                yield chunk
+
+    async def stream_answer(span):
+        sid = session_id
+        try:
+            sid = await sessions.acquire(sid)
+        except Exception as e:
+            logger.error(f"Could not open session: {e}")
+            mark_failed(span, e)
+            yield sse({"type": "done", "response": "⚠️ **System Busy**: An internal error occurred. Please wait a moment and try again."})
+            return
+
+        collector = EventTextCollector()
+        extractor = AnswerStreamExtractor()
+        try:
+            yield sse({"type": "session", "session_id": sid})
+            version = db_version.current()
+            if use_cache:
+                cached = await asyncio.to_thread(response_cache.lookup, prompt, version)
+                if cached is not None:
+                    logger.info("Response cache hit")
+                    span.set_attribute("app.outcome", "cached")
+                    await app.state.agents.record_cached_turn(runner, sessions, sid, prompt, cached)
+                    yield sse({"type": "done", "response": cached, "session_id": sid, "cached": True})
+                    return
+
+            trace = []
+            sql_trace.set(trace)
+            content = app.state.agents.user_message(prompt)
+            async with agent_admission.admit():
+                async for event in runner_for(prompt).run_async(
+                    user_id=sessions.user_id,
+                    session_id=sid,
+                    new_message=content,
+                    run_config=app.state.agents.streaming_config(),
+                ):
+                    for call in event.get_function_calls():
+                        yield sse({"type": "tool", "name": call.name, "status": "start"})
+                    for response in event.get_function_responses():
+                        yield sse({"type": "tool", "name": response.name, "status": "end"})
+                    for kind, text in extractor.feed(collector.feed(event)):
+                        yield sse({"type": kind, "text": text})
+
+            full_response = collector.text
+            logger.debug(f"\n[RAW_AGENT_OUTPUT_START]\n{full_response}\n[RAW_AGENT_OUTPUT_END]\n")
+            cleaned_output = clean_response(full_response)
+            span.set_attribute("app.response_chars", len(cleaned_output))
+            if use_cache and cleaned_output:
+                await asyncio.to_thread(response_cache.store, prompt, version, cleaned_output, trace)
+            yield sse({"type": "done", "response": cleaned_output, "session_id": sid})
+        except Overloaded as e:
+            logger.warning(f"Agent query gave up waiting: {e}")
+            span.set_attribute("app.outcome", "rejected")
+            yield sse({"type": "done", "response": busy_message(e), "session_id": sid, "retry_after": e.retry_after})
+        except ContextBudgetExceeded as e:
+            logger.warning(f"Rejecting agent query: {e}")
+            span.set_attribute("app.outcome", "too_large")
+            yield sse({"type": "done", "response": too_large_message(e), "session_id": sid})
+        except Exception as e:
+            mark_failed(span, e)
+            yield sse({"type": "done", "response": friendly_error(e), "session_id": sid})
+        finally:
+            await sessions.release(sid)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/agent/batch")
+async def query_agent_batch(request: Request, concurrency: int = BATCH_CONCURRENCY, no_cache: bool = False):
+    # The body is a JSONL list of questions (see batch.parse_questions). Each
+    # result is streamed back as one NDJSON line as soon as it is answered.
+    try:
+        questions = parse_questions((await request.body()).decode("utf-8"))
+    except (ValueError, UnicodeDecodeError) as e:
+        return {"error": str(e)}
+    logger.info(f"Received batch of {len(questions)} questions")
+    # Load the catalog once up front instead of in the first few questions.
+    await asyncio.to_thread(schema_cache.tables)
+    concurrency = max(1, min(concurrency, agent_admission.slots.size))
+
+    async def lines():
+        async for result in run_batch(questions, lambda prompt: answer_batch_question(prompt, no_cache), concurrency):
+            yield json.dumps(result, default=str) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+async def answer_batch_question(prompt: str, no_cache: bool) -> dict:
+    # Every question is the first turn of its own session, so answers are
+    # shared with the response cache. Questions turned away by admission
+    # control wait for its estimate and are retried.
+    for attempt in range(BATCH_RETRIES + 1):
+        with request_span(prompt, None, streaming=False) as span:
+            span.set_attribute("app.batch", True)
+            result = await answer_query(span, prompt, None, no_cache)
+        if not isinstance(result, JSONResponse):
+            if result["response"].startswith("⚠️"):
+                result["error"] = "failed"
+            return result
+        if result.status_code != 503:
+            return {**json.loads(result.body), "error": "too_large"}
+        if attempt < BATCH_RETRIES:
+            await asyncio.sleep(float(result.headers["retry-after"]))
+    return {**json.loads(result.body), "error": "rejected"}
 
 def clean_response(text: str) -> str:
     lower_text = text.lower()
@@ -260,3 +755,5 @@ def clean_response(text: str) -> str:
             cleaned_lines.append(line)
             
     return '\n'.join(cleaned_lines).strip()
+
+record("import", time.perf_counter() - _import_start)
@@ -0,0 +1,172 @@
+import csv
+import hashlib
+import io
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from .sql_guard import guard
+from .state import shared_state
+
+logger = logging.getLogger(__name__)
+
+RESULT_TOKEN_BUDGET = int(os.getenv("RESULT_TOKEN_BUDGET", "1000"))
+RESULT_PREVIEW_ROWS = int(os.getenv("RESULT_PREVIEW_ROWS", "200"))
+MAX_RESULT_HANDLES = 256
+# How long a handle stays readable from other workers' processes.
+RESULT_HANDLE_TTL_SECONDS = 3600
+
+
+def _estimate_tokens(text: str) -> int:
+    # Same chars/4 estimate the schema pruning uses.
+    return len(text) // 4 + 1
+
+
+def _format(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return format(value, ".15g")
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    return str(value)
+
+
+class ShapedResult:
+    # First rows of a query plus, when they are not the whole result, the
+    # total row count and per-column numeric summaries computed in SQL.
+    def __init__(self, query: str, columns: list, rows: list, total: int, stats: dict):
+        self.query = query
+        self.columns = columns
+        self.rows = rows
+        self.total = total
+        self.stats = stats
+        # How the result was computed, when the model needs to know (e.g. it
+        # is an estimate from a sample).
+        self.note = None
+
+    def fingerprint(self) -> str:
+        # What the model was shown; the response cache compares it on revalidation.
+        summary = (self.columns, [tuple(row) for row in self.rows], self.total, sorted(self.stats.items()))
+        return hashlib.sha256(repr(summary).encode()).hexdigest()
+
+    def render(self, result_id: str = None, token_budget: int = RESULT_TOKEN_BUDGET) -> str:
+        header = [f"rows: {self.total}"]
+        if result_id:
+            header.append(f"result_id: {result_id}")
+        if self.note:
+            header.append(self.note)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(self.columns)
+        budget = token_budget - _estimate_tokens("\n".join(header)) - 40 * len(self.stats)
+        shown = 0
+        for row in self.rows:
+            mark = buffer.tell()
+            writer.writerow([_format(v) for v in row])
+            if shown and _estimate_tokens(buffer.getvalue()) > budget:
+                buffer.seek(mark)
+                buffer.truncate()
+                break
+            shown += 1
+
+        if shown < self.total:
+            header[0] += f" (showing first {shown})"
+        lines = header + [buffer.getvalue().rstrip("\n")]
+        if shown < self.total and self.stats:
+            lines.append(f"summary over all {self.total} rows:")
+            for column, (low, high, mean, total) in self.stats.items():
+                lines.append(f"  {column}: min={_format(low)} max={_format(high)} avg={_format(mean)} sum={_format(total)}")
+        return "\n".join(lines)
+
+
+def _numeric_columns(columns: list, rows: list) -> list:
+    numeric = []
+    for i, column in enumerate(columns):
+        values = [row[i] for row in rows if row[i] is not None]
+        if values and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            numeric.append(column)
+    return numeric
+
+
+def shape(conn, query: str, preview_rows: int = RESULT_PREVIEW_ROWS) -> ShapedResult:
+    cursor = conn.execute(query)
+    columns = [description[0] for description in cursor.description]
+    rows = [tuple(row) for row in cursor.fetchmany(preview_rows + 1)]
+    if len(rows) <= preview_rows:
+        return ShapedResult(query, columns, rows, len(rows), {})
+    cursor.close()
+    rows = rows[:preview_rows]
+
+    # More rows than fit: let SQLite count and summarise the rest rather than
+    # pulling them into Python.
+    numeric = [c for c in _numeric_columns(columns, rows) if columns.count(c) == 1]
+    aggregates = ["COUNT(*)"] + [f'MIN("{c}"), MAX("{c}"), AVG("{c}"), SUM("{c}")' for c in numeric]
+    try:
+        summary = conn.execute(f"SELECT {', '.join(aggregates)} FROM ({query})").fetchone()
+    except Exception as e:
+        logger.warning(f"Result summary failed, counting only: {e}")
+        summary = conn.execute(f"SELECT COUNT(*) FROM ({query})").fetchone()
+        numeric = []
+    stats = {c: tuple(summary[1 + 4 * i:5 + 4 * i]) for i, c in enumerate(numeric)}
+    return ShapedResult(query, columns, rows, summary[0], stats)
+
+
+class ResultHandles:
+    # Maps short ids to the queries behind recent results so tools such as
+    # generate_plot can read the full data instead of receiving it from the
+    # model. Rows are kept only for complete (preview-sized) results; larger
+    # ones are re-read from the database. With a shared state store, handles
+    # are also written there, so a follow-up served by another worker can
+    # still plot an earlier result.
+    def __init__(self, max_entries: int = MAX_RESULT_HANDLES, shared=shared_state):
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, result: ShapedResult) -> str:
+        result_id = "r_" + hashlib.sha256(result.query.encode()).hexdigest()[:10]
+        rows = result.rows if len(result.rows) >= result.total else None
+        entry = {"query": result.query, "columns": list(result.columns), "rows": rows}
+        self._remember(result_id, entry)
+        if self.shared is not None:
+            self.shared.put("result", result_id, entry, RESULT_HANDLE_TTL_SECONDS)
+        return result_id
+
+    def _remember(self, result_id: str, entry: dict):
+        with self._lock:
+            self._entries[result_id] = entry
+            self._entries.move_to_end(result_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, result_id: str):
+        result_id = result_id.strip()
+        with self._lock:
+            entry = self._entries.get(result_id)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get("result", result_id)
+            if entry is not None:
+                self._remember(result_id, entry)
+        return entry
+
+
+result_handles = ResultHandles()
+
+
+def read_columns(conn, result_id: str, x_column: str, y_column: str, limit: int):
+    entry = result_handles.get(result_id)
+    if entry is None:
+        raise ValueError(f"Unknown result_id: {result_id}")
+    for column in (x_column, y_column):
+        if column not in entry["columns"]:
+            raise ValueError(f"Unknown column {column!r}, available: {', '.join(entry['columns'])}")
+    if entry["rows"] is not None:
+        x, y = entry["columns"].index(x_column), entry["columns"].index(y_column)
+        return [row[x] for row in entry["rows"]], [row[y] for row in entry["rows"]]
+    with guard(conn):
+        rows = conn.execute(f'SELECT "{x_column}", "{y_column}" FROM ({entry["query"]}) LIMIT ?', (limit,)).fetchall()
+    return [row[0] for row in rows], [row[1] for row in rows]
@@ -0,0 +1,377 @@
+import json
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_REWRITE = os.getenv("ROLLUP_REWRITE", "true").lower() in ("1", "true", "yes")
+ROLLUP_PREFIX = "rollup_"
+CATALOG_TABLE = "rollup_catalog"
+
+AGGREGATES = {"SUM", "TOTAL", "AVG", "COUNT", "MIN", "MAX"}
+# Constructs whose meaning changes when rows are pre-grouped, or that read
+# other tables; queries using them always run against the source table.
+_UNSUPPORTED = {"SELECT", "WITH", "JOIN", "UNION", "INTERSECT", "EXCEPT", "OVER", "FILTER", "WINDOW", "ROWID",
+                "_ROWID_", "OID"}
+_CLAUSE_END = {"WHERE", "GROUP", "HAVING", "ORDER", "LIMIT"}
+# Row-level functions that give the same result on a dimension's value
+# whether it comes from a source row or a rollup row. Any other function
+# (GROUP_CONCAT, random(), ...) keeps the query on the source table.
+SCALAR_FUNCTIONS = {"ABS", "ROUND", "LOWER", "UPPER", "LENGTH", "SUBSTR", "SUBSTRING", "TRIM", "LTRIM", "RTRIM",
+                    "REPLACE", "INSTR", "COALESCE", "IFNULL", "NULLIF", "IIF", "CAST", "DATE", "TIME", "DATETIME",
+                    "JULIANDAY", "STRFTIME", "PRINTF", "FORMAT"}
+# Keywords that can be followed by "(" without being a function call.
+_PAREN_KEYWORDS = {"IN", "AND", "OR", "NOT", "WHERE", "HAVING", "BY", "WHEN", "THEN", "ELSE", "CASE", "IS",
+                   "BETWEEN", "LIKE", "GLOB", "AS", "DISTINCT", "LIMIT", "OFFSET", "ASC", "DESC"}
+
+_TOKEN_RE = re.compile(
+    r"""(?P<ws>\s+|--[^\n]*|/\*.*?\*/)"""
+    r"""|(?P<str>'(?:[^']|'')*')"""
+    r"""|(?P<qid>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])"""
+    r"""|(?P<num>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)"""
+    r"""|(?P<id>\w+)"""
+    r"""|(?P<op><>|!=|<=|>=|==|\|\||.)""",
+    re.DOTALL,
+)
+
+
+# --- Definitions and incremental maintenance ---
+
+def _quote(names) -> str:
+    return ", ".join(f'"{n}"' for n in names)
+
+
+def _match(names, row: str) -> str:
+    return " AND ".join(f'"{n}" IS {row}."{n}"' for n in names)
+
+
+def _add(name: str, dimensions: list, measures: list) -> str:
+    sets = ["row_count = row_count + 1"]
+    for m in measures:
+        sets.append(f'"sum_{m}" = CASE WHEN NEW."{m}" IS NULL THEN "sum_{m}" ELSE COALESCE("sum_{m}", 0) + NEW."{m}" END')
+        sets.append(f'"cnt_{m}" = "cnt_{m}" + (NEW."{m}" IS NOT NULL)')
+    zeros = ", ".join(["0"] + ["NULL, 0"] * len(measures))
+    new = ", ".join(f'NEW."{d}"' for d in dimensions)
+    return (
+        f'INSERT INTO "{name}" SELECT {new}, {zeros} '
+        f'WHERE NOT EXISTS (SELECT 1 FROM "{name}" WHERE {_match(dimensions, "NEW")}); '
+        f'UPDATE "{name}" SET {", ".join(sets)} WHERE {_match(dimensions, "NEW")};'
+    )
+
+
+def _subtract(name: str, dimensions: list, measures: list) -> str:
+    # SET expressions see the row before the update, so cnt_m = 1 means this
+    # was the group's last non-NULL value and SUM() goes back to NULL.
+    sets = ["row_count = row_count - 1"]
+    for m in measures:
+        sets.append(f'"sum_{m}" = CASE WHEN OLD."{m}" IS NULL THEN "sum_{m}" WHEN "cnt_{m}" = 1 THEN NULL '
+                    f'ELSE "sum_{m}" - OLD."{m}" END')
+        sets.append(f'"cnt_{m}" = "cnt_{m}" - (OLD."{m}" IS NOT NULL)')
+    return (
+        f'UPDATE "{name}" SET {", ".join(sets)} WHERE {_match(dimensions, "OLD")}; '
+        f'DELETE FROM "{name}" WHERE {_match(dimensions, "OLD")} AND row_count = 0;'
+    )
+
+
+def _triggers(name: str, source: str, dimensions: list, measures: list) -> list:
+    # Triggers keep the rollup in the same transaction as the change, whether
+    # it comes from the Data Manager, a bulk ingest or any other writer.
+    add, subtract = _add(name, dimensions, measures), _subtract(name, dimensions, measures)
+    return [
+        f'CREATE TRIGGER "{name}_insert" AFTER INSERT ON "{source}" BEGIN {add} END',
+        f'CREATE TRIGGER "{name}_delete" AFTER DELETE ON "{source}" BEGIN {subtract} END',
+        f'CREATE TRIGGER "{name}_update" AFTER UPDATE OF {_quote(dimensions + measures)} ON "{source}" '
+        f'BEGIN {subtract} {add} END',
+    ]
+
+
+def _ensure_catalog(conn):
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} "
+        "(name TEXT PRIMARY KEY, source TEXT NOT NULL, dimensions TEXT NOT NULL, measures TEXT NOT NULL, created REAL)"
+    )
+
+
+def definitions(conn) -> list:
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (CATALOG_TABLE,)).fetchone()
+    if not exists:
+        return []
+    rollups = []
+    for name, source, dimensions, measures in conn.execute(
+        f"SELECT name, source, dimensions, measures FROM {CATALOG_TABLE} ORDER BY name"
+    ).fetchall():
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{source}")')]
+        rollups.append({"name": name, "source": source, "dimensions": json.loads(dimensions),
+                        "measures": json.loads(measures), "columns": columns})
+    return rollups
+
+
+def create_rollup(conn, source: str, dimensions: list, measures: list, name: str = None) -> dict:
+    # Builds rollup_<name> with one row per distinct combination of the
+    # dimension columns: row_count plus, for each measure, its SUM and the
+    # number of non-NULL values (so COUNT and AVG can be derived).
+    columns = {row[1]: row[2] for row in conn.execute(f'PRAGMA table_info("{source}")')}
+    if not columns:
+        raise ValueError(f"no such table: {source}")
+    if not dimensions:
+        raise ValueError("A rollup needs at least one dimension column")
+    for column in dimensions + measures:
+        if column not in columns:
+            raise ValueError(f"Unknown column {column!r} in {source}")
+    if set(dimensions) & set(measures):
+        raise ValueError("A column cannot be both a dimension and a measure")
+
+    name = name or f"{source}_by_{'_'.join(dimensions)}"
+    if not name.startswith(ROLLUP_PREFIX):
+        name = ROLLUP_PREFIX + name
+    if not name.isidentifier() or name == CATALOG_TABLE:
+        raise ValueError(f"Invalid rollup name: {name}")
+
+    definitions_sql = [f'"{d}" {columns[d]}' for d in dimensions] + ["row_count INTEGER NOT NULL"]
+    aggregates = ["COUNT(*)"]
+    for m in measures:
+        definitions_sql += [f'"sum_{m}" {columns[m]}', f'"cnt_{m}" INTEGER NOT NULL']
+        aggregates += [f'SUM("{m}")', f'COUNT("{m}")']
+
+    # One transaction, so a failed build leaves neither table nor triggers.
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    _ensure_catalog(conn)
+    start = time.perf_counter()
+    conn.execute(f'CREATE TABLE "{name}" ({", ".join(definitions_sql)})')
+    conn.execute(
+        f'INSERT INTO "{name}" SELECT {_quote(dimensions)}, {", ".join(aggregates)} '
+        f'FROM "{source}" GROUP BY {_quote(dimensions)}'
+    )
+    conn.execute(f'CREATE INDEX "{name}_groups" ON "{name}" ({_quote(dimensions)})')
+    for trigger in _triggers(name, source, dimensions, measures):
+        conn.execute(trigger)
+    conn.execute(
+        f"INSERT INTO {CATALOG_TABLE} (name, source, dimensions, measures, created) VALUES (?, ?, ?, ?, ?)",
+        (name, source, json.dumps(dimensions), json.dumps(measures), time.time()),
+    )
+    groups = conn.execute(f'SELECT COUNT(*) FROM "{name}"').fetchone()[0]
+    logger.info(f"Built rollup {name} over {source}: {groups} groups in {time.perf_counter() - start:.1f}s")
+    return {"name": name, "source": source, "dimensions": dimensions, "measures": measures, "groups": groups}
+
+
+def drop_rollup(conn, name: str):
+    if not any(d["name"] == name for d in definitions(conn)):
+        raise ValueError(f"Unknown rollup: {name}")
+    for suffix in ("insert", "delete", "update"):
+        conn.execute(f'DROP TRIGGER IF EXISTS "{name}_{suffix}"')
+    conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+    conn.execute(f"DELETE FROM {CATALOG_TABLE} WHERE name = ?", (name,))
+
+
+def drop_rollups_for(conn, source: str):
+    for definition in definitions(conn):
+        if definition["source"] == source:
+            drop_rollup(conn, definition["name"])
+
+
+# --- Query rewriting ---
+
+def _tokenize(query: str) -> list:
+    tokens = []
+    for match in _TOKEN_RE.finditer(query):
+        kind, text = match.lastgroup, match.group()
+        if kind == "qid":
+            kind, value = "id", text[1:-1]
+        else:
+            value = text
+        tokens.append((kind, text, value))
+    return tokens
+
+
+def rewrite(query: str, rollups: list):
+    # Returns (query, rollup name) when the query is a single-table aggregate
+    # over a rolled-up table that only filters and groups by dimension
+    # columns and aggregates measures with SUM/TOTAL/AVG/COUNT, else None.
+    # Other functions must be in SCALAR_FUNCTIONS.
+    tokens = _tokenize(query)
+    significant = [i for i, token in enumerate(tokens) if token[0] != "ws"]
+    words = [tokens[i][2].upper() if tokens[i][0] == "id" else tokens[i][1] for i in significant]
+    if not words or words[0] != "SELECT" or words.count("SELECT") > 1 or (set(words[1:]) & _UNSUPPORTED):
+        return None
+
+    # FROM <table> [[AS] alias], followed by the end or a clause keyword.
+    if "FROM" not in words:
+        return None
+    at = words.index("FROM") + 1
+    if at >= len(words) or tokens[significant[at]][0] != "id":
+        return None
+    table_at = significant[at]
+    source = tokens[table_at][2]
+    candidates = [r for r in rollups if r["source"].lower() == source.lower()]
+    if not candidates:
+        return None
+    rest = words[at + 1:]
+    alias = None
+    if rest and rest[0] == "AS":
+        rest = rest[1:]
+        alias = rest[0] if rest else None
+        rest = rest[1:]
+    elif rest and rest[0] not in _CLAUSE_END and tokens[significant[at + 1]][0] == "id":
+        alias, rest = rest[0], rest[1:]
+    if rest and rest[0] not in _CLAUSE_END:
+        return None
+
+    replacements = {}  # token index -> (end index, rollup expression template)
+    used_dimensions, used_measures = set(), set()
+    grouped = "GROUP" in words or (len(words) > 1 and words[1] == "DISTINCT")
+    i = 0
+    while i < len(significant):
+        word = words[i]
+        if word in AGGREGATES and i + 1 < len(significant) and words[i + 1] == "(":
+            depth, j = 0, i + 1
+            while j < len(significant):
+                depth += {"(": 1, ")": -1}.get(words[j], 0)
+                if depth == 0:
+                    break
+                j += 1
+            inner = tokens[significant[i + 1] + 1:significant[j]]
+            call = _aggregate(word, inner)
+            if call is None:
+                return None
+            kind, column, text = call
+            (used_measures if kind == "measure" else used_dimensions).add(column)
+            replacements[significant[i]] = (significant[j], text)
+            grouped = True
+            i = j + 1
+            continue
+        i += 1
+    if not grouped:
+        return None
+
+    # Every other column reference must be a dimension. Names that are not
+    # columns of the source table are keywords, functions or aliases, except
+    # the rollup's own bookkeeping columns. A bare `*` would select those.
+    source_columns = {c.lower() for c in candidates[0]["columns"]}
+    replaced = set()
+    for start, (end, _) in replacements.items():
+        replaced.update(range(start, end + 1))
+    from_at = words.index("FROM")
+    for position, index in enumerate(significant):
+        kind, _, value = tokens[index]
+        previous = words[position - 1] if position else ""
+        if position < from_at and words[position] == "*" and index not in replaced \
+                and previous in ("SELECT", "DISTINCT", ",", "."):
+            return None
+        if kind != "id" or index in replaced or index == table_at:
+            continue
+        following = words[position + 1] if position + 1 < len(words) else ""
+        if following == "(":
+            if words[position] not in SCALAR_FUNCTIONS | _PAREN_KEYWORDS:
+                return None
+            continue
+        if following == "." or previous == "AS":
+            continue
+        if value.lower() in source_columns:
+            used_dimensions.add(value)
+        elif value.lower() == "row_count" or re.match(r"(sum|cnt)_", value, re.IGNORECASE):
+            return None
+
+    rollup = _choose(candidates, used_dimensions, used_measures)
+    if rollup is None:
+        return None
+
+    aliases = _select_aliases(tokens, significant, words, replacements)
+    out, skip_until = [], -1
+    for index, (kind, text, _) in enumerate(tokens):
+        if index <= skip_until:
+            continue
+        if index == table_at:
+            out.append(f'"{rollup["name"]}"' + ("" if alias else f' AS "{source}"'))
+        elif index in replacements:
+            end, template = replacements[index]
+            out.append(template)
+            skip_until = index = end
+        else:
+            out.append(text)
+        if index in aliases:
+            out.append(aliases[index])
+    return "".join(out), rollup["name"]
+
+
+def _select_aliases(tokens: list, significant: list, words: list, replacements: dict) -> dict:
+    # Rewritten select items keep the column name SQLite would have given the
+    # original expression, e.g. "SUM(amount)". Returns {last token index: " AS ..."}.
+    aliases = {}
+    start = 2 if len(words) > 1 and words[1] == "DISTINCT" else 1
+    end = words.index("FROM")
+    depth, item = 0, []
+    for position in range(start, end + 1):
+        word = words[position] if position < end else ","
+        depth += {"(": 1, ")": -1}.get(word, 0)
+        if word != "," or depth:
+            item.append(position)
+            continue
+        if item and any(significant[p] in replacements for p in item):
+            item_words = [words[p] for p in item]
+            named = "AS" in item_words or (
+                len(item) > 1 and tokens[significant[item[-1]]][0] == "id"
+                and item_words[-1] != "END" and item_words[-2] not in (".", "(")
+                and (item_words[-2] == ")" or tokens[significant[item[-2]]][0] == "id")
+            )
+            if not named:
+                first, last = significant[item[0]], significant[item[-1]]
+                original = "".join(t[1] for t in tokens[first:last + 1]).replace('"', '""')
+                aliases[last] = f' AS "{original}"'
+        item = []
+    return aliases
+
+
+def _aggregate(function: str, inner: list):
+    # (kind, column, rollup expression) for one aggregate call, or None if it
+    # cannot be answered from grouped rows.
+    parts = [t for t in inner if t[0] != "ws"]
+    if [t[1] for t in parts] == ["*"]:
+        return ("measure", None, "COALESCE(SUM(row_count), 0)") if function == "COUNT" else None
+    distinct = bool(parts) and parts[0][0] == "id" and parts[0][2].upper() == "DISTINCT"
+    if distinct:
+        parts = parts[1:]
+    qualifier = ""
+    if len(parts) == 3 and parts[1][1] == ".":
+        qualifier, parts = parts[0][1] + ".", parts[2:]
+    if len(parts) != 1 or parts[0][0] != "id":
+        return None
+    column = parts[0][2]
+    if distinct or function in ("MIN", "MAX"):
+        # Only exact over dimensions, which keep their original values.
+        text = "".join(t[1] for t in inner)
+        return "dimension", column, f"{function}({text})"
+    m = f'{qualifier}"sum_{column}"'
+    c = f'{qualifier}"cnt_{column}"'
+    templates = {
+        "SUM": f"SUM({m})",
+        "TOTAL": f"TOTAL({m})",
+        "COUNT": f"COALESCE(SUM({c}), 0)",
+        "AVG": f"(TOTAL({m}) / SUM({c}))",
+    }
+    return "measure", column, templates[function]
+
+
+def _choose(candidates: list, dimensions: set, measures: set):
+    # The rollup with the fewest dimensions (so the fewest rows) that covers
+    # the query. Column names are matched case-insensitively, like SQLite.
+    dimensions = {d.lower() for d in dimensions}
+    measures = {m.lower() for m in measures if m is not None}
+    covering = [
+        r for r in candidates
+        if dimensions <= {d.lower() for d in r["dimensions"]} and measures <= {m.lower() for m in r["measures"]}
+    ]
+    return min(covering, key=lambda r: len(r["dimensions"]), default=None)
+
+
+def rewrite_query(conn, query: str) -> str:
+    if not ROLLUP_REWRITE:
+        return query
+    rollups = definitions(conn)
+    rewritten = rewrite(query, rollups) if rollups else None
+    if rewritten is None:
+        return query
+    logger.info(f"Answering from rollup {rewritten[1]}: {rewritten[0]}")
+    return rewritten[0]
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+# How often a worker deletes shared sessions that have been idle for the TTL.
+SESSION_SWEEP_SECONDS = 60
+
+
+class SessionManager:
+    # Tracks the sessions of a long-lived runner and bounds them with an idle
+    # TTL plus LRU eviction. Sessions with a run in flight are never evicted.
+    #
+    # With a `shared` service, other worker processes use the same sessions.
+    # A session id this process has not seen is looked up in the service, and
+    # eviction only forgets sessions locally; a periodic sweep deletes the
+    # ones that no worker has updated within the TTL.
+    def __init__(self, session_service, app_name: str, user_id: str = "user",
+                 ttl_seconds: int = SESSION_TTL_SECONDS, max_sessions: int = MAX_SESSIONS, shared: bool = False):
+        self._service = session_service
+        self.app_name = app_name
+        self.user_id = user_id
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.shared = shared
+        self._last_used = OrderedDict()
+        self._active = {}
+        self._lock = asyncio.Lock()
+        self._swept = time.monotonic()
+
+    def __len__(self):
+        return len(self._last_used)
+
+    async def acquire(self, session_id: str = None) -> str:
+        async with self._lock:
+            now = time.monotonic()
+            known = bool(session_id) and session_id in self._last_used
+            await self._evict(now, reserve=0 if known else 1)
+            if known and session_id in self._last_used:
+                self._last_used.move_to_end(session_id)
+            elif session_id and self.shared and await self._live_elsewhere(session_id):
+                logger.info(f"Session {session_id} picked up from the shared store")
+            else:
+                if session_id:
+                    logger.info(f"Session {session_id} expired or unknown, starting a new one")
+                session = await self._service.create_session(app_name=self.app_name, user_id=self.user_id)
+                session_id = session.id
+                logger.info(f"Session created: {session_id}")
+            self._last_used[session_id] = now
+            self._active[session_id] = self._active.get(session_id, 0) + 1
+            return session_id
+
+    async def release(self, session_id: str):
+        async with self._lock:
+            count = self._active.get(session_id, 0) - 1
+            if count > 0:
+                self._active[session_id] = count
+            else:
+                self._active.pop(session_id, None)
+            if session_id in self._last_used:
+                self._last_used[session_id] = time.monotonic()
+                self._last_used.move_to_end(session_id)
+
+    async def _evict(self, now: float, reserve: int = 0):
+        expired = [
+            sid for sid, last_used in self._last_used.items()
+            if now - last_used > self.ttl_seconds and sid not in self._active
+        ]
+        overflow = len(self._last_used) - len(expired) - self.max_sessions + reserve
+        if overflow > 0:
+            for sid in self._last_used:
+                if overflow <= 0:
+                    break
+                if sid not in self._active and sid not in expired:
+                    expired.append(sid)
+                    overflow -= 1
+        for sid in expired:
+            del self._last_used[sid]
+            if not self.shared:
+                await self._service.delete_session(app_name=self.app_name, user_id=self.user_id, session_id=sid)
+        if expired:
+            logger.info(f"Evicted {len(expired)} session(s), {len(self._last_used)} live")
+        if self.shared and now - self._swept > SESSION_SWEEP_SECONDS:
+            self._swept = now
+            await self._sweep()
+
+    async def _live_elsewhere(self, session_id: str) -> bool:
+        session = await self._service.get_session(app_name=self.app_name, user_id=self.user_id, session_id=session_id)
+        return session is not None and time.time() - session.last_update_time <= self.ttl_seconds
+
+    async def _sweep(self):
+        response = await self._service.list_sessions(app_name=self.app_name, user_id=self.user_id)
+        cutoff = time.time() - self.ttl_seconds
+        stale = [s.id for s in response.sessions if s.last_update_time < cutoff and s.id not in self._active]
+        for sid in stale:
+            self._last_used.pop(sid, None)
+            await self._service.delete_session(app_name=self.app_name, user_id=self.user_id, session_id=sid)
+        if stale:
+            logger.info(f"Deleted {len(stale)} idle shared session(s)")
@@ -0,0 +1,192 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from opentelemetry import trace
+
+from .index_advisor import workload
+
+logger = logging.getLogger(__name__)
+
+SQL_TIMEOUT_SECONDS = float(os.getenv("SQL_TIMEOUT_SECONDS", "10"))
+SQL_MAX_SCAN_ROWS = int(os.getenv("SQL_MAX_SCAN_ROWS", "10000000"))
+SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "1000"))
+
+# Agent SQL may only read: no PRAGMA, ATTACH, VACUUM INTO or writes of any kind.
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+# VM instructions between deadline checks.
+_PROGRESS_STEPS = 10_000
+
+
+class QueryRejected(ValueError):
+    pass
+
+
+def _authorize(action, *args):
+    return sqlite3.SQLITE_OK if action in _ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+
+@contextmanager
+def guard(conn, timeout: float = SQL_TIMEOUT_SECONDS):
+    # Read-only authorizer plus a deadline enforced by the progress handler;
+    # both are removed again because pooled connections are shared. Other
+    # engines' connections are read-only and time-limited already (see
+    # engines.py).
+    if not isinstance(conn, sqlite3.Connection):
+        yield
+        return
+    deadline = time.monotonic() + timeout
+    conn.set_authorizer(_authorize)
+    conn.set_progress_handler(lambda: int(time.monotonic() > deadline), _PROGRESS_STEPS)
+    try:
+        yield
+    except sqlite3.DatabaseError as e:
+        if "interrupted" in str(e):
+            raise QueryRejected(f"Query exceeded the {timeout:g}s time budget; aggregate or filter more") from None
+        if "authoriz" in str(e):
+            raise QueryRejected("Only read-only SELECT queries are allowed") from None
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+        conn.set_authorizer(None)
+
+
+def query_plan(conn, query: str) -> list:
+    return [(row[0], row[1], row[3]) for row in conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()]
+
+
+def format_plan(plan: list) -> str:
+    depth = {0: -1}
+    lines = []
+    for node, parent, detail in plan:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node] + detail)
+    return "\n".join(lines)
+
+
+def _scan_target(detail: str):
+    if not detail.startswith("SCAN ") or detail == "SCAN CONSTANT ROW":
+        return None
+    return detail[5:].split(" ")[0]
+
+
+def _table_rows(conn, query: str, name: str, cache: dict) -> int:
+    # Rough size of a scanned table. Plans name aliases, so an alias is mapped
+    # back to "<table> [AS] <alias>" in the query; CTEs and subqueries count as
+    # the largest table involved.
+    if name not in cache:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        table = name if name in tables else None
+        if table is None:
+            match = re.search(rf"\b(\w+)\s+(?:AS\s+)?{re.escape(name)}\b", query, re.IGNORECASE)
+            if match and match.group(1) in tables:
+                table = match.group(1)
+        if table is None:
+            referenced = [t for t in tables if re.search(rf"\b{re.escape(t)}\b", query, re.IGNORECASE)]
+            cache[name] = max((_table_rows(conn, query, t, cache) for t in referenced), default=0)
+        else:
+            cache[name] = conn.execute(f'SELECT MAX(rowid) FROM "{table}"').fetchone()[0] or 0
+    return cache[name]
+
+
+def check_plan(conn, query: str, plan: list, max_rows: int = SQL_MAX_SCAN_ROWS):
+    # Reject nested full scans whose row product is large: two or more SCAN
+    # loops in the same join, or a full SCAN inside a correlated subquery that
+    # runs once per outer row. Joins SQLite can drive by an index show up as
+    # SEARCH and are fine.
+    children = {}
+    for node, parent, detail in plan:
+        children.setdefault(parent, []).append((node, detail))
+
+    def scans_under(parent):
+        found = []
+        for node, detail in children.get(parent, []):
+            target = _scan_target(detail)
+            if target:
+                found.append(target)
+            elif not detail.startswith(("CORRELATED", "MATERIALIZE", "CO-ROUTINE", "SCALAR SUBQUERY", "LIST SUBQUERY")):
+                found.extend(scans_under(node))
+        return found
+
+    def all_scans(parent):
+        found = []
+        for node, detail in children.get(parent, []):
+            target = _scan_target(detail)
+            found.extend([target] if target else all_scans(node))
+        return found
+
+    # A materialized subquery or CTE has at most as many rows as the largest
+    # table it reads; one that reads no table (e.g. a VALUES list) is tiny.
+    sizes = {}
+    for node, _, detail in plan:
+        if detail.startswith(("MATERIALIZE ", "CO-ROUTINE ")):
+            name = detail.split(" ", 1)[1]
+            inner = [t for t in all_scans(node) if t != name]
+            sizes[name] = max((_table_rows(conn, query, t, sizes) for t in inner), default=1)
+
+    for parent, nodes in children.items():
+        loops = [t for t in (_scan_target(detail) for _, detail in nodes) if t]
+        for node, detail in nodes:
+            if detail.startswith("CORRELATED"):
+                loops.extend(scans_under(node))
+        if len(loops) < 2:
+            continue
+        product = 1
+        for name in loops:
+            product *= max(1, _table_rows(conn, query, name, sizes))
+        if product > max_rows:
+            raise QueryRejected(
+                f"Query rejected: it scans {', '.join(loops)} in full for every row of each other "
+                f"(~{product:,} row combinations). Add a join condition on matching columns or filter first."
+            )
+
+
+class SlowQueryLog:
+    def __init__(self, max_entries: int = 100, threshold_ms: int = SLOW_QUERY_MS):
+        self.threshold_ms = threshold_ms
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def record(self, query: str, elapsed_ms: float, plan: list, status: str = "ok"):
+        plan_text = format_plan(plan)
+        logger.warning(f"Slow query ({elapsed_ms:.0f} ms, {status}): {query}\n{plan_text}")
+        with self._lock:
+            self._entries.append({
+                "query": query,
+                "ms": round(elapsed_ms, 1),
+                "status": status,
+                "plan": plan_text,
+                "at": time.time(),
+            })
+
+    def entries(self) -> list:
+        with self._lock:
+            return list(reversed(self._entries))
+
+
+slow_queries = SlowQueryLog()
+
+
+def run_guarded(conn, fn, query: str, *args):
+    # Plan check, time budget and slow-query logging around fn(conn, query, ...).
+    trace.get_current_span().set_attribute("db.statement", query)
+    with guard(conn):
+        plan = query_plan(conn, query)
+        check_plan(conn, query, plan)
+        start = time.perf_counter()
+        try:
+            result = fn(conn, query, *args)
+        except sqlite3.OperationalError as e:
+            if "interrupted" in str(e):
+                slow_queries.record(query, (time.perf_counter() - start) * 1000, plan, status="timeout")
+            raise
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    workload.record(query, elapsed_ms, plan)
+    if elapsed_ms >= slow_queries.threshold_ms:
+        slow_queries.record(query, elapsed_ms, plan)
+    return result
@@ -0,0 +1,47 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# The first chart imports plotly and pandas and loads plotly's templates
+# (about a second). "background" does that in a thread once the app is up,
+# "on" does it before the app accepts requests, "off" leaves it to the first
+# chart.
+CHART_PREWARM = os.getenv("CHART_PREWARM", "background").lower()
+
+# Stage name -> seconds, in the order the stages ran.
+timings = {}
+
+
+def record(name: str, seconds: float):
+    timings[name] = round(seconds, 3)
+    logger.info(f"Startup stage {name} took {seconds:.2f}s")
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def _prewarm_charts():
+    from .charts import prewarm
+
+    try:
+        with stage("charts"):
+            prewarm()
+    except Exception as e:
+        logger.warning(f"Chart prewarm failed: {e}")
+
+
+def prewarm_charts():
+    if CHART_PREWARM == "background":
+        threading.Thread(target=_prewarm_charts, name="chart-prewarm", daemon=True).start()
+    elif CHART_PREWARM != "off":
+        _prewarm_charts()
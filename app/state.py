@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# "memory" keeps sessions and caches in the process (one worker). "sqlite"
+# keeps sessions, cached answers and result handles in STATE_DB_PATH, so any
+# number of worker processes on the host share them.
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", "state.db")
+STATE_BUSY_TIMEOUT_MS = int(os.getenv("STATE_BUSY_TIMEOUT_MS", "5000"))
+# Expired entries are deleted every this many writes.
+PURGE_EVERY = 500
+
+
+class SqliteStore:
+    # JSON values by (namespace, key) with an optional expiry, in a SQLite file
+    # opened by every worker. One connection per thread, autocommit, WAL.
+    def __init__(self, path: str = STATE_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS kv_state (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                   timeout=STATE_BUSY_TIMEOUT_MS / 1000)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, namespace: str, key: str):
+        row = self._conn().execute(
+            "SELECT value FROM kv_state WHERE namespace = ? AND key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, namespace: str, key: str, value, ttl_seconds: float = None):
+        expires_at = time.time() + ttl_seconds if ttl_seconds else None
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO kv_state VALUES (?, ?, ?, ?)",
+                     (namespace, key, json.dumps(value, default=str), expires_at))
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            conn.execute("DELETE FROM kv_state WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, namespace: str, key: str):
+        self._conn().execute("DELETE FROM kv_state WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def clear(self, namespace: str):
+        self._conn().execute("DELETE FROM kv_state WHERE namespace = ?", (namespace,))
+
+    def count(self, namespace: str) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM kv_state WHERE namespace = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (namespace, time.time()),
+        ).fetchone()[0]
+
+
+if STATE_BACKEND not in ("memory", "sqlite"):
+    raise ValueError(f"Unknown STATE_BACKEND {STATE_BACKEND!r}, expected 'memory' or 'sqlite'")
+
+# None with the memory backend; the caches then stay process-local.
+shared_state = SqliteStore() if STATE_BACKEND == "sqlite" else None
+
+
+def session_service():
+    # ADK session storage for the configured backend.
+    if STATE_BACKEND == "sqlite":
+        from google.adk.sessions.sqlite_session_service import SqliteSessionService
+
+        return SqliteSessionService(STATE_DB_PATH)
+    from google.adk.sessions import InMemorySessionService
+
+    return InMemorySessionService()
@@ -3,6 +3,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const userInput = document.getElementById('user-input');
     const chatHistory = document.getElementById('chat-history');
     const sendBtn = document.getElementById('send-btn');
+    let sessionId = sessionStorage.getItem('agentSessionId');
 
     userInput.focus();
 
@@ -17,28 +18,60 @@ document.addEventListener('DOMContentLoaded', () => {
         sendBtn.disabled = true;
 
         const loadingId = addLoadingIndicator();
+        let streamDiv = null;
+        let partial = '';
 
         try {
-            const response = await fetch(`/agent/query?prompt=${encodeURIComponent(message)}`, {
+            let url = `/agent/query/stream?prompt=${encodeURIComponent(message)}`;
+            if (sessionId) url += `&session_id=${encodeURIComponent(sessionId)}`;
+
+            const response = await fetch(url, {
                 method: 'POST'
             });
 
+            if (response.status === 503) {
+                // Admission control turned the request away; the body says when to retry.
+                const busy = await response.json();
+                removeMessage(loadingId);
+                addMessage(formatResponse(busy.response), 'system', true);
+                return;
+            }
             if (!response.ok) {
                 throw new Error('Network response was not ok');
             }
 
-            const data = await response.json();
+            await readEventStream(response, (evt) => {
+                if (evt.session_id) {
+                    sessionId = evt.session_id;
+                    sessionStorage.setItem('agentSessionId', sessionId);
+                }
 
-            removeMessage(loadingId);
+                if (evt.type === 'tool') {
+                    setLoadingStatus(loadingId, evt.status === 'start' ? TOOL_LABELS[evt.name] : null);
+                } else if (evt.type === 'reset') {
+                    partial = '';
+                } else if (evt.type === 'text') {
+                    partial += evt.text;
+                    if (!streamDiv) {
+                        removeMessage(loadingId);
+                        streamDiv = addMessage('', 'system', true);
+                    }
+                    // Charts are only rendered once the final answer is in.
+                    streamDiv.querySelector('.content').innerHTML = formatResponse(partial);
+                    scrollToBottom();
+                } else if (evt.type === 'done') {
+                    removeMessage(loadingId);
+                    if (streamDiv) streamDiv.remove();
+                    streamDiv = null;
+                    addMessage(formatResponse(evt.response), 'system', true);
+                }
+            });
 
-            if (data.error) {
-                addMessage(`Error: ${data.error}`, 'system');
-            } else {
-                addMessage(formatResponse(data.response), 'system', true);
-            }
+            removeMessage(loadingId);
 
         } catch (error) {
             removeMessage(loadingId);
+            if (streamDiv) streamDiv.remove();
             addMessage(`Sorry, something went wrong: ${error.message}`, 'system');
         } finally {
             userInput.disabled = false;
@@ -47,6 +80,46 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    const TOOL_LABELS = {
+        call_sql_agent: 'Querying your data...',
+        generate_plot: 'Drawing the chart...',
+    };
+
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                const data = frame.split('\n')
+                    .filter(line => line.startsWith('data:'))
+                    .map(line => line.slice(5).trim())
+                    .join('\n');
+                if (data) onEvent(JSON.parse(data));
+            }
+        }
+    }
+
+    function setLoadingStatus(id, label) {
+        const el = document.getElementById(id);
+        if (!el) return;
+        let status = el.querySelector('.typing-status');
+        if (!status) {
+            status = document.createElement('div');
+            status.className = 'typing-status';
+            el.querySelector('.content').appendChild(status);
+        }
+        status.textContent = label || '';
+    }
+
     document.querySelectorAll('.suggestion-chip').forEach(chip => {
         chip.addEventListener('click', () => {
             const text = chip.dataset.prompt || chip.textContent;
@@ -0,0 +1,90 @@
+import json
+
+START_TAG = "<answer>"
+END_TAG = "</answer>"
+
+
+def sse(payload: dict) -> str:
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def event_text(event) -> str:
+    if getattr(event, "content", None) and event.content.parts:
+        return "".join(part.text for part in event.content.parts if part.text)
+    if getattr(event, "text", None):
+        return event.text
+    if getattr(event, "delta", None):
+        return event.delta
+    return ""
+
+
+class EventTextCollector:
+    # In SSE streaming mode ADK emits the text as partial events and then
+    # repeats all of it in one aggregated final event; only the deltas count.
+    def __init__(self):
+        self.text = ""
+        self._streamed = False
+
+    def feed(self, event) -> str:
+        text = event_text(event)
+        if getattr(event, "partial", False):
+            self._streamed = True
+        elif self._streamed:
+            self._streamed = False
+            return ""
+        self.text += text
+        return text
+
+
+class AnswerStreamExtractor:
+    # Incremental counterpart of main.clean_response: yields the inside of the
+    # latest <answer> block as it arrives. A later <answer> replaces the earlier
+    # one, which is signalled to the caller with a ("reset", "") item.
+    def __init__(self):
+        self._text = ""
+        self._lower = ""
+        self._scanned = 0
+        self._start = None
+        self._emitted = 0
+        self._closed = False
+
+    def feed(self, delta: str) -> list:
+        if not delta:
+            return []
+        self._text += delta
+        self._lower += delta.lower()
+        out = []
+
+        # Resume scanning slightly before the old end so tags split across
+        # chunks are still found.
+        search_from = max(0, self._scanned - len(START_TAG))
+        start = self._lower.rfind(START_TAG, search_from)
+        if start != -1 and start != self._start:
+            if self._start is not None:
+                out.append(("reset", ""))
+            self._start = start
+            self._emitted = start + len(START_TAG)
+            self._closed = False
+
+        if self._start is not None and not self._closed:
+            end = self._lower.find(END_TAG, self._emitted)
+            if end != -1:
+                self._closed = True
+                visible = end
+            else:
+                visible = len(self._text)
+                # Hold back a trailing fragment that may be the start of </answer>.
+                for size in range(min(len(END_TAG) - 1, visible - self._emitted), 0, -1):
+                    if END_TAG.startswith(self._lower[visible - size:]):
+                        visible -= size
+                        break
+            if visible > self._emitted:
+                out.append(("text", self._text[self._emitted:visible]))
+                self._emitted = visible
+
+        self._scanned = len(self._text)
+        return out
+
+    @property
+    def text(self) -> str:
+        return self._text
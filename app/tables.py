@@ -0,0 +1,143 @@
+import base64
+import json
+
+MAX_PAGE_SIZE = 1000
+COUNT_CAP = 100_000
+
+ALLOWED_TYPES = ["TEXT", "INTEGER", "REAL", "DATE", "BLOB"]
+
+FILTER_OPS = {
+    "eq": "{col} = ?",
+    "ne": "{col} != ?",
+    "lt": "{col} < ?",
+    "le": "{col} <= ?",
+    "gt": "{col} > ?",
+    "ge": "{col} >= ?",
+    "contains": "{col} LIKE '%' || ? || '%'",
+    "startswith": "{col} LIKE ? || '%'",
+    "isnull": "{col} IS NULL",
+    "notnull": "{col} IS NOT NULL",
+}
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) not in (1, 2):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def table_columns(conn, table_name: str) -> list:
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table_name})").fetchall()]
+    if not columns:
+        raise ValueError(f"no such table: {table_name}")
+    return columns
+
+
+def parse_filters(filters: list, columns: list):
+    # Each filter is "column:op[:value]"; values are always bound parameters.
+    clauses, params = [], []
+    for item in filters or []:
+        parts = item.split(":", 2)
+        if len(parts) < 2:
+            raise ValueError(f"Invalid filter: {item}")
+        column, op = parts[0], parts[1].lower()
+        if column not in columns:
+            raise ValueError(f"Unknown column: {column}")
+        if op not in FILTER_OPS:
+            raise ValueError(f"Unknown filter operator: {op}")
+        clauses.append(FILTER_OPS[op].format(col=f'"{column}"'))
+        if op not in ("isnull", "notnull"):
+            if len(parts) < 3:
+                raise ValueError(f"Filter {item} needs a value")
+            params.append(parts[2])
+    return clauses, params
+
+
+def _keyset_clause(sort: str, descending: bool, cursor: list):
+    # Keyset predicate for ORDER BY <sort>, rowid (both in the same direction).
+    # SQLite sorts NULLs first, so they lead an ascending scan and trail a
+    # descending one.
+    if sort is None:
+        return ("rowid < ?" if descending else "rowid > ?"), [cursor[-1]]
+
+    col = f'"{sort}"'
+    value, rowid = cursor
+    if value is None:
+        if descending:
+            return f"({col} IS NULL AND rowid < ?)", [rowid]
+        return f"(({col} IS NULL AND rowid > ?) OR {col} IS NOT NULL)", [rowid]
+    if descending:
+        return f"({col} < ? OR ({col} = ? AND rowid < ?) OR {col} IS NULL)", [value, value, rowid]
+    return f"({col} > ? OR ({col} = ? AND rowid > ?))", [value, value, rowid]
+
+
+def fetch_page(conn, table_name: str, limit: int = 100, after: str = None, sort: str = None,
+               order: str = "asc", filters: list = None, count: str = "estimate") -> dict:
+    columns = table_columns(conn, table_name)
+    if sort is not None and sort not in columns and sort != "rowid":
+        raise ValueError(f"Unknown sort column: {sort}")
+    if sort == "rowid":
+        sort = None
+    descending = order.lower() == "desc"
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    where, params = parse_filters(filters, columns)
+    count_where, count_params = list(where), list(params)
+    if after:
+        clause, clause_params = _keyset_clause(sort, descending, decode_cursor(after))
+        where.append(clause)
+        params.extend(clause_params)
+
+    direction = "DESC" if descending else "ASC"
+    order_by = f'"{sort}" {direction}, rowid {direction}' if sort else f"rowid {direction}"
+    where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+    cursor = conn.execute(
+        f"SELECT rowid AS rowid, * FROM {table_name}{where_sql} ORDER BY {order_by} LIMIT ?",
+        params + [limit + 1],
+    )
+    result_columns = [description[0] for description in cursor.description]
+    rows = [dict(zip(result_columns, row)) for row in cursor.fetchall()]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last[sort], last["rowid"]] if sort else [last["rowid"]])
+
+    total, exact = None, False
+    count_sql = f" WHERE {' AND '.join(count_where)}" if count_where else ""
+    if count == "exact":
+        total = conn.execute(f"SELECT COUNT(*) FROM {table_name}{count_sql}", count_params).fetchone()[0]
+        exact = True
+    elif count == "estimate":
+        if count_where:
+            # Count at most COUNT_CAP + 1 matches so a filtered count never
+            # turns into a full scan of a huge table.
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {table_name}{count_sql} LIMIT {COUNT_CAP + 1})",
+                count_params,
+            ).fetchone()[0]
+            exact = total <= COUNT_CAP
+        else:
+            # MAX(rowid) is a single b-tree lookup; it over-counts by the
+            # number of deleted rows.
+            total = conn.execute(f"SELECT MAX(rowid) FROM {table_name}").fetchone()[0] or 0
+            if total <= COUNT_CAP:
+                total = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+                exact = True
+
+    return {
+        "columns": result_columns,
+        "data": rows,
+        "next_cursor": next_cursor,
+        "total": total,
+        "total_exact": exact,
+    }
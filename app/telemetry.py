@@ -0,0 +1,199 @@
+import bisect
+import logging
+import os
+import threading
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.trace import StatusCode
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "g-adk-agents")
+# "otlp" (also implied by OTEL_EXPORTER_OTLP_ENDPOINT), "console" or "none".
+# Spans are always recorded, since the /metrics histograms are built from them.
+TRACES_EXPORTER = os.getenv(
+    "OTEL_TRACES_EXPORTER", "otlp" if os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT") else "none"
+).lower()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+tracer = trace.get_tracer("app")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    pairs = [f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+             for n, v in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.setdefault(label_values, [0] * len(self.buckets) + [0.0, 0])
+            bucket = bisect.bisect_left(self.buckets, value)
+            if bucket < len(self.buckets):
+                series[bucket] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), values + ('+Inf',))} {series[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, values)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.labels, values)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, values)} {total:g}")
+        return lines
+
+
+class Gauge:
+    # Read from `fn` at scrape time. With `label`, fn returns
+    # {label value: value}.
+    def __init__(self, name: str, help_text: str, fn, label: str = None):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.label = label
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if self.label is None:
+            lines.append(f"{self.name} {self.fn():g}")
+        else:
+            for value, reading in list(self.fn().items()):
+                lines.append(f"{self.name}{_labels((self.label,), (value,))} {reading:g}")
+        return lines
+
+
+class Metrics:
+    def __init__(self):
+        self._metrics = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.warning(f"Could not render metric {metric.name}: {e}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+request_seconds = metrics.add(Histogram(
+    "agent_request_seconds", "End-to-end agent query latency.", ("route", "outcome")))
+llm_seconds = metrics.add(Histogram(
+    "llm_call_seconds", "Model call latency, excluding time waiting for admission.", ("agent",)))
+llm_queue_seconds = metrics.add(Histogram(
+    "llm_queue_seconds", "Time model calls waited for a concurrency slot or rate-limit budget.", ("agent",)))
+llm_tokens = metrics.add(Counter(
+    "llm_tokens_total", "Tokens reported by the model.", ("agent", "kind")))
+tool_seconds = metrics.add(Histogram(
+    "tool_call_seconds", "Agent tool latency (call_sql_agent includes its sub-agent's model calls).", ("tool", "outcome")))
+db_seconds = metrics.add(Histogram(
+    "db_query_seconds", "Database work per pooled connection checkout.", ("operation", "mode", "outcome")))
+db_rows = metrics.add(Counter(
+    "db_rows_total", "Rows returned or changed by database work.", ("operation", "mode")))
+
+
+class MetricsProcessor(SpanProcessor):
+    # Turns finished spans into the histograms above, so each hot path is
+    # instrumented once. Tool spans come from ADK ("execute_tool <name>").
+    def on_end(self, span):
+        seconds = (span.end_time - span.start_time) / 1e9
+        attributes = span.attributes or {}
+        outcome = "error" if span.status.status_code == StatusCode.ERROR else attributes.get("app.outcome", "ok")
+        if span.name == "agent.query":
+            request_seconds.observe(seconds, attributes.get("app.route", ""), outcome)
+        elif span.name == "llm.generate":
+            # The span starts before admission so traces show the wait.
+            agent = attributes.get("gen_ai.agent.name", "")
+            queued = attributes.get("app.llm.queue_seconds", seconds)
+            llm_queue_seconds.observe(queued, agent)
+            if outcome == "ok":
+                llm_seconds.observe(seconds - queued, agent)
+            for kind in ("input", "cached_input", "output"):
+                tokens = attributes.get(f"gen_ai.usage.{kind}_tokens")
+                if tokens:
+                    llm_tokens.inc(tokens, agent, kind)
+        elif span.name.startswith("execute_tool "):
+            tool_seconds.observe(seconds, span.name[len("execute_tool "):], outcome)
+        elif span.name == "db.query":
+            operation, mode = attributes.get("db.operation", ""), attributes.get("app.db.mode", "")
+            db_seconds.observe(seconds, operation, mode, outcome)
+            if attributes.get("db.rows"):
+                db_rows.inc(attributes["db.rows"], operation, mode)
+
+
+def setup_tracing():
+    # Installs the SDK tracer provider once; ADK's own spans (invocation,
+    # call_llm, execute_tool) go through it too.
+    if isinstance(trace.get_tracer_provider(), TracerProvider):
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    provider.add_span_processor(MetricsProcessor())
+    if TRACES_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    elif TRACES_EXPORTER == "console":
+        provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+    trace.set_tracer_provider(provider)
+    logger.info(f"Tracing enabled (exporter: {TRACES_EXPORTER})")
+
+
+def shutdown_tracing():
+    provider = trace.get_tracer_provider()
+    if isinstance(provider, TracerProvider):
+        provider.shutdown()
+
+
+def row_count(result):
+    # Best-effort row count for whatever a database helper returned.
+    if hasattr(result, "total"):
+        return result.total
+    if isinstance(result, dict) and isinstance(result.get("rows"), list):
+        return len(result["rows"])
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    rowcount = getattr(result, "rowcount", -1)
+    return rowcount if isinstance(rowcount, int) and rowcount >= 0 else None
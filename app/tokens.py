@@ -0,0 +1,188 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from .admission import LLM_OUTPUT_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Context window of the served model (gpt-oss-120b).
+LLM_CONTEXT_WINDOW = int(os.getenv("LLM_CONTEXT_WINDOW", "131072"))
+# Most prompt tokens a single model call may send: the window less the
+# completion allowance unless set lower to cap cost. Older turns of the
+# conversation are dropped, then the current turn's oldest tool outputs are
+# truncated, to stay under it.
+LLM_CONTEXT_BUDGET = int(os.getenv("LLM_CONTEXT_BUDGET", str(LLM_CONTEXT_WINDOW - LLM_OUTPUT_TOKENS)))
+TOKEN_CACHE_SIZE = 4096
+# Role markers and separators the chat template adds around each message.
+MESSAGE_OVERHEAD = 4
+TRUNCATION_NOTE = "\n[... truncated to fit the context budget]"
+
+
+class ContextBudgetExceeded(Exception):
+    # The current turn does not fit even with every tool output truncated;
+    # endpoints answer 413 with this message.
+    pass
+
+
+class TokenCounter:
+    # Token counts of prompt blocks, cached by content hash. The static
+    # instructions, tool declarations and history are identical on every
+    # call of a conversation, so only new turns are tokenized. Uses the
+    # tokenizer litellm ships (cl100k_base), else ~4 characters per token.
+    def __init__(self, capacity: int = TOKEN_CACHE_SIZE):
+        self.capacity = capacity
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self._encoding = None
+        self.hits = 0
+        self.misses = 0
+
+    def _encode_length(self, text: str) -> int:
+        if self._encoding is None:
+            try:
+                import litellm
+
+                self._encoding = litellm.encoding
+            except Exception as e:
+                logger.warning(f"No tokenizer available ({e}), estimating 4 characters per token")
+                self._encoding = False
+        if self._encoding:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text) // 4
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = hashlib.blake2b(text.encode(), digest_size=16).digest()
+        with self._lock:
+            if key in self._counts:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return self._counts[key]
+        tokens = self._encode_length(text)
+        with self._lock:
+            self.misses += 1
+            self._counts[key] = tokens
+            while len(self._counts) > self.capacity:
+                self._counts.popitem(last=False)
+        return tokens
+
+    def stats(self) -> dict:
+        return {"entries": len(self._counts), "hits": self.hits, "misses": self.misses}
+
+
+token_counter = TokenCounter()
+
+
+def _part_text(part) -> str:
+    if part.text:
+        return part.text
+    if part.function_call:
+        return part.function_call.name + json.dumps(part.function_call.args or {}, default=str)
+    if part.function_response:
+        return part.function_response.name + json.dumps(part.function_response.response or {}, default=str)
+    return ""
+
+
+def content_tokens(content) -> int:
+    return MESSAGE_OVERHEAD + sum(token_counter.count(_part_text(part)) for part in content.parts or [])
+
+
+def tool_tokens(llm_request) -> int:
+    # The declarations are fixed per agent; counted once per tool set.
+    tools = getattr(llm_request.config, "tools", None) or []
+    declarations = [tool.model_dump(exclude_none=True, mode="json") for tool in tools if hasattr(tool, "model_dump")]
+    return token_counter.count(json.dumps(declarations, sort_keys=True)) if declarations else 0
+
+
+def prompt_tokens(llm_request) -> int:
+    system = getattr(llm_request.config, "system_instruction", None) or ""
+    return (token_counter.count(str(system)) + tool_tokens(llm_request)
+            + sum(content_tokens(content) for content in llm_request.contents))
+
+
+def _is_question(content) -> bool:
+    parts = content.parts or []
+    return content.role == "user" and any(p.text for p in parts) and not any(p.function_response for p in parts)
+
+
+def _turn_starts(contents: list) -> list:
+    # Indexes where a user turn begins (consecutive user texts are one turn).
+    return [i for i, content in enumerate(contents)
+            if _is_question(content) and not (i and _is_question(contents[i - 1]))]
+
+
+def _truncate_tool_outputs(contents: list, over: int) -> int:
+    # Shortens the tool outputs in `contents`, oldest first, until
+    # `over` tokens are saved. Contents are replaced, not edited, since they
+    # can be shared with the session's events. Returns how many were cut.
+    truncated = 0
+    for i in range(len(contents)):
+        parts = list(contents[i].parts or [])
+        changed = False
+        for j, part in enumerate(parts):
+            if over <= 0:
+                break
+            if not part.function_response:
+                continue
+            response = part.function_response.response or {}
+            text = response["result"] if isinstance(response.get("result"), str) \
+                else json.dumps(response, default=str)
+            size = token_counter.count(_part_text(part))
+            keep = max(0, size - over - token_counter.count(TRUNCATION_NOTE))
+            response = {"result": text[:len(text) * keep // max(size, 1)] + TRUNCATION_NOTE}
+            parts[j] = part.model_copy(update={
+                "function_response": part.function_response.model_copy(update={"response": response}),
+            })
+            over -= size - token_counter.count(_part_text(parts[j]))
+            changed = True
+            truncated += 1
+        if changed:
+            contents[i] = contents[i].model_copy(update={"parts": parts})
+        if over <= 0:
+            break
+    return truncated
+
+
+def fit_context(llm_request, budget: int = LLM_CONTEXT_BUDGET) -> dict:
+    # Drops the oldest whole turns of the conversation until the prompt fits
+    # `budget` tokens. The overflow is rounded up to half-budget steps, so the
+    # cut stays put while the history grows and the trimmed prompt keeps a
+    # stable, provider-cacheable prefix. If the current turn alone is over,
+    # its oldest tool outputs are truncated. Raises ContextBudgetExceeded
+    # only when the instructions and messages without them do not fit.
+    tokens = prompt_tokens(llm_request)
+    trimmed = truncated = 0
+    if budget and tokens > budget:
+        contents = list(llm_request.contents)
+        sizes = [content_tokens(content) for content in contents]
+        step = max(budget // 2, 1)
+        target = tokens - budget + step - 1
+        target -= target % step
+        cut = 0
+        for start in _turn_starts(contents)[1:]:
+            if sum(sizes[:cut]) >= target:
+                break
+            tokens -= sum(sizes[cut:start])
+            trimmed += 1
+            cut = start
+        contents = contents[cut:]
+        # Where a cut falls is estimated; later passes cover any shortfall.
+        for _ in range(3):
+            if tokens <= budget:
+                break
+            truncated += _truncate_tool_outputs(contents, tokens - budget)
+            llm_request.contents = contents
+            tokens = prompt_tokens(llm_request)
+        llm_request.contents = contents
+        if tokens > budget:
+            raise ContextBudgetExceeded(
+                f"This question needs {tokens} prompt tokens, more than the {budget}-token context budget"
+            )
+        logger.info(f"Fit the {budget}-token context budget: dropped {trimmed} turn(s), "
+                    f"truncated {truncated} tool output(s)")
+    return {"tokens": tokens, "trimmed_turns": trimmed, "truncated_outputs": truncated}
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from bench_agent import DEFAULT_QUESTIONS, percentile
+from fake_llm_server import FakeProvider, serve_in_thread
+from setup_database import create_database
+
+
+async def run(args, provider: FakeProvider):
+    from app import main
+    from app.admission import agent_admission
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def ask(i: int):
+                question = DEFAULT_QUESTIONS[i % len(DEFAULT_QUESTIONS)]
+                start = time.perf_counter()
+                response = await client.post("/agent/query", params={"prompt": question, "no_cache": True})
+                elapsed = time.perf_counter() - start
+                ok = response.status_code == 200 and "<answer>" in response.json().get("response", "")
+                status = "ok" if ok else str(response.status_code)
+                return status, elapsed, response.headers.get("retry-after")
+
+            start = time.perf_counter()
+            results = await asyncio.gather(*(ask(i) for i in range(args.burst)))
+            wall = time.perf_counter() - start
+
+    statuses = Counter(status for status, _, _ in results)
+    answered = [elapsed for status, elapsed, _ in results if status == "ok"]
+    retry_after = sorted(int(r) for _, _, r in results if r)
+    upstream = provider.stats_dict()
+    mode = "off" if args.no_admission else f"LLM_RPM={os.environ['LLM_RPM']} LLM_TPM={os.environ['LLM_TPM']}"
+    print(f"--- ADMISSION BENCHMARK ({args.burst} simultaneous questions, provider limit "
+          f"{args.provider_rpm} RPM / {args.provider_tpm or 'no'} TPM, admission {mode}) ---")
+    print(f"wall time            {wall:8.1f} s")
+    print(f"answered             {statuses['ok']:8d}   p50 {percentile(answered, 50):.1f} s, "
+          f"p95 {percentile(answered, 95):.1f} s")
+    print(f"503 + Retry-After    {statuses['503']:8d}   " +
+          (f"retry after {retry_after[0]}-{retry_after[-1]} s" if retry_after else ""))
+    other = {k: v for k, v in statuses.items() if k not in ("ok", "503")}
+    print(f"other failures       {sum(other.values()):8d}   {dict(other) if other else ''}")
+    print(f"upstream calls       {upstream['requests']:8d}   429s: {upstream['rate_limited']}, "
+          f"max in flight: {upstream['max_in_flight']}")
+    print(f"admission            {agent_admission.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Burst of agent queries against a rate-limited local fake provider")
+    parser.add_argument("--burst", type=int, default=40, help="questions sent at the same time")
+    parser.add_argument("--provider-rpm", type=int, default=60, help="the fake provider's requests per minute")
+    parser.add_argument("--provider-tpm", type=int, default=0, help="the fake provider's tokens per minute")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per completion")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--no-admission", action="store_true",
+                        help="disable the limiter and retry 429s 10 times, as before admission control")
+    args = parser.parse_args()
+
+    provider = FakeProvider(args.provider_rpm, args.provider_tpm, args.latency)
+    server = serve_in_thread(provider, args.port)
+    os.environ["LLM_API_BASE"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+    if args.no_admission:
+        os.environ.update(LLM_RPM="0", LLM_TPM="0", LLM_MAX_CONCURRENCY="100000",
+                          AGENT_MAX_CONCURRENCY="100000", LLM_NUM_RETRIES="10")
+    else:
+        os.environ.setdefault("LLM_RPM", str(args.provider_rpm))
+        os.environ.setdefault("LLM_TPM", str(args.provider_tpm))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "app", "static"), exist_ok=True)
+        create_database(os.path.join(tmp, "demo.db"), 1000, 0)
+        os.chdir(tmp)
+        try:
+            asyncio.run(run(args, provider))
+        finally:
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from fake_llm import ScriptedLlm
+from setup_database import create_database
+
+DEFAULT_QUESTIONS = [
+    "What is the total revenue?",
+    "Total sales by region",
+    "Which product sells the most?",
+    "Revenue by category",
+    "Monthly revenue trend",
+    "Show a pie chart of sales by product",
+    "Bar chart of revenue by region",
+]
+
+LEAF_TOOLS = {"get_schema", "execute_sql", "generate_plot"}
+
+
+class Timings:
+    def __init__(self):
+        self.tool_seconds = defaultdict(float)
+        self.tool_calls = defaultdict(int)
+        self.runner_seconds = 0.0
+        self._starts = {}
+
+    def before_tool(self, tool, args, tool_context):
+        self._starts[tool_context.function_call_id] = time.perf_counter()
+
+    def after_tool(self, tool, args, tool_context, tool_response):
+        start = self._starts.pop(tool_context.function_call_id, None)
+        if start is not None and tool.name in LEAF_TOOLS:
+            self.tool_seconds[tool.name] += time.perf_counter() - start
+            self.tool_calls[tool.name] += 1
+
+
+class TimedRunner:
+    # Wraps the app's runner so the time spent inside the agent tree can be
+    # separated from the FastAPI request handling around it.
+    def __init__(self, runner, timings: Timings):
+        self._runner = runner
+        self._timings = timings
+
+    def __getattr__(self, name):
+        return getattr(self._runner, name)
+
+    async def run_async(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            async for event in self._runner.run_async(*args, **kwargs):
+                yield event
+        finally:
+            self._timings.runner_seconds += time.perf_counter() - start
+
+
+def load_questions(path: str) -> list:
+    if not path:
+        return DEFAULT_QUESTIONS
+    questions = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                item = json.loads(line)
+                questions.append(item.get("prompt") or item.get("question") or item.get("title"))
+    return [q for q in questions if q]
+
+
+def percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def run_level(client, questions: list, total: int, concurrency: int, no_cache: bool):
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(questions[i % len(questions)])
+
+    async def worker():
+        nonlocal errors
+        while True:
+            try:
+                question = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            response = await client.post("/agent/query", params={"prompt": question, "no_cache": no_cache})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200 or "<answer>" not in response.json().get("response", ""):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def run(args):
+    from app import main
+    from app.agent_setup import AdmittedLlm
+    from app.agents.agent import direct_agent, root_agent
+    from app.agents.sub_agents.sql_agent.tools import sql_agent
+
+    fake = ScriptedLlm(latency=args.llm_latency, jitter=args.llm_jitter, seed=args.seed)
+    timings = Timings()
+    # Wrapped like the real model, so context fitting and the LLM limiter
+    # are part of the measured path.
+    llm = AdmittedLlm(model=fake.model, llm=fake)
+    for agent in (root_agent, sql_agent, direct_agent):
+        agent.model = llm
+        agent.before_tool_callback = timings.before_tool
+        agent.after_tool_callback = timings.after_tool
+
+    questions = load_questions(args.questions)
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    async with main.lifespan(main.app):
+        main.app.state.runner = TimedRunner(main.app.state.runner, timings)
+        main.app.state.direct_runner = TimedRunner(main.app.state.direct_runner, timings)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # Warm-up: first schema load, first chart (plotly import) etc.
+            for question in questions:
+                await client.post("/agent/query", params={"prompt": question, "no_cache": True})
+
+            print(f"--- AGENT BENCHMARK ({args.rows} rows, {len(questions)} questions, "
+                  f"stub LLM {args.llm_latency * 1000:.0f}±{args.llm_jitter * 1000:.0f} ms) ---")
+            print(f"{'conc':>5} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'req/s':>8} {'err':>5}   "
+                  f"{'llm':>6} {'tools':>6} {'adk':>6} {'http':>6}  (ms per request)")
+            for concurrency in levels:
+                fake.llm_seconds = 0.0
+                timings.tool_seconds.clear()
+                timings.runner_seconds = 0.0
+                latencies, errors, wall = await run_level(
+                    client, questions, args.requests, concurrency, not args.cache
+                )
+                n = len(latencies)
+                llm_ms = fake.llm_seconds / n * 1000
+                tools_ms = sum(timings.tool_seconds.values()) / n * 1000
+                runner_ms = timings.runner_seconds / n * 1000
+                total_ms = sum(latencies) / n * 1000
+                print(f"{concurrency:>5} {n:>6} {percentile(latencies, 50) * 1000:>9.1f} "
+                      f"{percentile(latencies, 95) * 1000:>9.1f} {n / wall:>8.2f} {errors:>5}   "
+                      f"{llm_ms:>6.1f} {tools_ms:>6.1f} {max(0.0, runner_ms - llm_ms - tools_ms):>6.1f} "
+                      f"{max(0.0, total_ms - runner_ms):>6.1f}")
+
+            print()
+            print("Tool time per call (last level):")
+            for name in sorted(timings.tool_seconds):
+                calls = timings.tool_calls[name] or 1
+                print(f"  {name:<14} {timings.tool_seconds[name] / calls * 1000:>8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark with a scripted stub LLM")
+    parser.add_argument("--rows", type=int, default=1000, help="rows in the generated sales table (1k to 10M)")
+    parser.add_argument("--db", help="reuse/create the database at this path instead of a temporary one")
+    parser.add_argument("--questions", help="JSONL file of prompts ({\"prompt\": ...} per line)")
+    parser.add_argument("--requests", type=int, default=50, help="requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per stub LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cache", action="store_true", help="leave the response cache on")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.abspath(args.db) if args.db else os.path.join(tmp, "demo.db")
+        if not os.path.exists(db_path):
+            create_database(db_path, args.rows, args.seed)
+        # The app reads DB_PATH when it is imported; charts are written under
+        # app/static in the working directory, kept out of the checkout.
+        os.environ["DB_PATH"] = db_path
+        # The stub has no provider quota; keep the limiter's concurrency cap
+        # but not the default RPM/TPM, which would dominate every latency.
+        os.environ.setdefault("LLM_RPM", "1000000")
+        os.environ.setdefault("LLM_TPM", "1000000000")
+        os.makedirs(os.path.join(tmp, "app", "static"), exist_ok=True)
+        os.chdir(tmp)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
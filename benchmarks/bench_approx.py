@@ -0,0 +1,99 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from setup_database import create_database
+
+# Exploratory aggregates, answered exactly and from the sample.
+QUERIES = [
+    ("total", "SELECT SUM(amount) AS revenue, COUNT(*) AS orders FROM sales"),
+    ("by region", "SELECT region, SUM(amount) AS revenue, COUNT(*) AS orders FROM sales GROUP BY region ORDER BY region"),
+    ("by product", "SELECT product, SUM(amount) AS revenue, AVG(quantity) AS avg_qty FROM sales "
+                   "GROUP BY product ORDER BY product"),
+    ("by month", "SELECT strftime('%Y-%m', date) AS month, COUNT(*) AS orders FROM sales GROUP BY month ORDER BY month"),
+]
+COUNT_COLUMNS = {"orders"}
+QUANTILE_COLUMNS = ["amount", "quantity"]
+
+
+def timed(fn, repeats: int):
+    runs, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    return result, statistics.median(runs) * 1000
+
+
+def max_error(exact, approximate, counts: bool) -> float:
+    # Largest relative error over the count (or the other numeric) columns.
+    worst = 0.0
+    for row, estimate in zip(exact.rows, approximate.rows):
+        for column, value, guess in zip(exact.columns, row, estimate):
+            if (column in COUNT_COLUMNS) == counts and isinstance(value, (int, float)) and value:
+                worst = max(worst, abs(guess - value) / abs(value))
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact vs sample/sketch answers on a large table")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--sample", type=int, default=20_000, help="sample rows")
+    parser.add_argument("--db", help="reuse/create the database at this path instead of a temporary one")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.abspath(args.db) if args.db else os.path.join(tmp, "demo.db")
+        if not os.path.exists(db_path):
+            create_database(db_path, args.rows, args.seed)
+        # The app reads DB_PATH when it is imported.
+        os.environ["DB_PATH"] = db_path
+        from app.approx import HyperLogLog, TDigest, compute_sketches, create_sample, store_sketches
+        from app.db import _read, _write
+        from app.engines import SqliteEngine
+
+        start = time.perf_counter()
+        _write(create_sample, "sales", args.sample)
+        sample_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        sketches = _read(compute_sketches, "sales")
+        _write(store_sketches, "sales", sketches)
+        sketch_seconds = time.perf_counter() - start
+
+        engine = SqliteEngine()
+        rows = _read(lambda conn: conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0])
+        print(f"--- APPROXIMATE ANSWERS ({rows:,} rows, sample {args.sample:,}, median of {args.repeats}; "
+              f"sample built in {sample_seconds:.1f} s, sketches in {sketch_seconds:.1f} s) ---")
+        print(f"{'query':<14}{'exact ms':>10}{'approx ms':>11}{'speedup':>9}{'count err':>11}{'sum/avg err':>13}  count bound")
+        for name, query in QUERIES:
+            exact, exact_ms = timed(lambda: engine.read(engine.execute, query), args.repeats)
+            approx, approx_ms = timed(lambda: engine.read(engine.execute, query, True), args.repeats)
+            bound = approx.note.split("within ")[-1].split(" (95%)")[0] if "within" in approx.note else "-"
+            print(f"{name:<14}{exact_ms:>10.1f}{approx_ms:>11.1f}{exact_ms / approx_ms:>8.1f}x"
+                  f"{max_error(exact, approx, True):>10.1%}{max_error(exact, approx, False):>12.1%}  {bound}")
+
+        print(f"\n{'column':<10}{'stat':<10}{'exact':>12}{'sketch':>12}{'exact ms':>10}")
+        for column in ("product", "date", "amount", "quantity"):
+            distinct, ms = timed(lambda: _read(
+                lambda conn: conn.execute(f'SELECT COUNT(DISTINCT "{column}") FROM sales').fetchone()[0]), 1)
+            estimate = HyperLogLog.from_payload(sketches[column]["hll"]).estimate()
+            print(f"{column:<10}{'distinct':<10}{distinct:>12,}{estimate:>12,.0f}{ms:>10.0f}")
+        for column in QUANTILE_COLUMNS:
+            digest = TDigest.from_payload(sketches[column]["digest"])
+            for q in (0.5, 0.95, 0.99):
+                exact, ms = timed(lambda: _read(lambda conn: conn.execute(
+                    f'SELECT "{column}" FROM sales ORDER BY "{column}" LIMIT 1 OFFSET ?', (int(q * (rows - 1)),)
+                ).fetchone()[0]), 1)
+                print(f"{column:<10}{f'p{q * 100:g}':<10}{exact:>12,}{digest.quantile(q)[0]:>12,.1f}{ms:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
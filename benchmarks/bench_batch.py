@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from bench_agent import DEFAULT_QUESTIONS, load_questions
+from fake_llm import ScriptedLlm
+from setup_database import create_database
+
+
+def kpi_pack(questions: list, size: int, duplicates: float) -> list:
+    # `size` questions; every 1/`duplicates`-th one repeats an earlier question
+    # with different case and punctuation, the way KPI packs tend to overlap.
+    every = round(1 / duplicates) if duplicates else 0
+    pack = []
+    for i in range(size):
+        if every and i and i % every == 0:
+            prompt = pack[i // 2]["prompt"].upper() + " ?"
+        else:
+            prompt = f"{questions[i % len(questions)]} (kpi {i})"
+        pack.append({"id": f"kpi-{i}", "prompt": prompt})
+    return pack
+
+
+async def sequential(client, pack: list):
+    latencies = []
+    start = time.perf_counter()
+    for item in pack:
+        began = time.perf_counter()
+        await client.post("/agent/query", params={"prompt": item["prompt"], "no_cache": True})
+        latencies.append(time.perf_counter() - began)
+    return time.perf_counter() - start, max(latencies)
+
+
+async def batch(client, pack: list, concurrency: int):
+    body = "\n".join(json.dumps(item) for item in pack)
+    start = time.perf_counter()
+    response = await client.post("/agent/batch", content=body, params={"concurrency": concurrency, "no_cache": True})
+    wall = time.perf_counter() - start
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    slowest = max(line["seconds"] for line in lines if not line.get("summary"))
+    return wall, slowest, lines[-1]
+
+
+async def run(args):
+    from app import main
+    from app.agents.agent import direct_agent, root_agent
+    from app.agents.sub_agents.sql_agent.tools import sql_agent
+
+    fake = ScriptedLlm(latency=args.llm_latency, jitter=args.llm_jitter, seed=args.seed)
+    for agent in (root_agent, sql_agent, direct_agent):
+        agent.model = fake
+
+    pack = kpi_pack(load_questions(args.questions), args.size, args.duplicates)
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for question in DEFAULT_QUESTIONS:  # warm-up
+                await client.post("/agent/query", params={"prompt": question, "no_cache": True})
+
+            calls = fake.calls
+            seq_wall, seq_slowest = await sequential(client, pack)
+            seq_calls = fake.calls - calls
+            print(f"--- KPI PACK ({len(pack)} questions, stub LLM {args.llm_latency * 1000:.0f}"
+                  f"±{args.llm_jitter * 1000:.0f} ms) ---")
+            print(f"{'mode':<16} {'wall s':>8} {'slowest s':>10} {'LLM calls':>10}")
+            print(f"{'sequential':<16} {seq_wall:>8.2f} {seq_slowest:>10.2f} {seq_calls:>10}")
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                calls = fake.calls
+                wall, slowest, summary = await batch(client, pack, concurrency)
+                print(f"{f'batch x{concurrency}':<16} {wall:>8.2f} {slowest:>10.2f} "
+                      f"{fake.calls - calls:>10}   ({summary['unique']} unique, {summary['failed']} failed)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A KPI pack through /agent/batch vs one /agent/query at a time")
+    parser.add_argument("--size", type=int, default=50, help="questions in the pack")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="share of repeated questions")
+    parser.add_argument("--questions", help="JSONL file of prompts ({\"prompt\": ...} per line)")
+    parser.add_argument("--concurrency", default="4,16")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per stub LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "app", "static"))
+        create_database(os.path.join(tmp, "demo.db"), args.rows, args.seed)
+        os.chdir(tmp)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
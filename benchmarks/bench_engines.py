@@ -0,0 +1,85 @@
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from setup_database import create_database
+
+# (name, SQLite query, DuckDB query): the aggregate shapes the agent produces.
+QUERIES = [
+    ("total", "SELECT SUM(amount) AS revenue, COUNT(*) AS orders FROM sales", None),
+    ("by region", "SELECT region, SUM(amount) AS revenue FROM sales GROUP BY region ORDER BY revenue DESC", None),
+    ("by product", "SELECT product, SUM(amount) AS revenue, AVG(quantity) AS avg_qty FROM sales "
+                   "GROUP BY product ORDER BY revenue DESC", None),
+    ("by month",
+     "SELECT strftime('%Y-%m', date) AS month, SUM(amount) AS revenue FROM sales GROUP BY month ORDER BY month",
+     "SELECT strftime(CAST(date AS DATE), '%Y-%m') AS month, SUM(amount) AS revenue FROM sales "
+     "GROUP BY month ORDER BY month"),
+    ("region x category", "SELECT region, category, COUNT(*) AS orders, SUM(amount) AS revenue FROM sales "
+                          "GROUP BY region, category ORDER BY region, category", None),
+]
+
+
+def time_engine(engine, dialect: str, repeats: int) -> dict:
+    timings = {}
+    for name, sqlite_sql, duckdb_sql in QUERIES:
+        query = duckdb_sql if dialect == "DuckDB" and duckdb_sql else sqlite_sql
+        engine.read(engine.execute, query)  # warm-up (page cache, DuckDB open)
+        runs = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            engine.read(engine.execute, query)
+            runs.append(time.perf_counter() - start)
+        timings[name] = statistics.median(runs) * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agent-style aggregates on SQLite vs DuckDB")
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--db", help="reuse/create the database at this path instead of a temporary one")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--threads", type=int, default=0, help="DuckDB threads (0 = one per core)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.abspath(args.db) if args.db else os.path.join(tmp, "demo.db")
+        if not os.path.exists(db_path):
+            create_database(db_path, args.rows, args.seed)
+        # The engines read DB_PATH when they are imported.
+        os.environ["DB_PATH"] = db_path
+        from app.engines import DuckDbEngine, SqliteEngine, snapshot_parquet
+
+        start = time.perf_counter()
+        snapshot = os.path.join(tmp, "snapshot")
+        snapshot_parquet(snapshot, db_path)
+        snapshot_seconds = time.perf_counter() - start
+
+        engines = [("sqlite", SqliteEngine(), "SQLite"),
+                   ("duckdb parquet", DuckDbEngine(db_path, snapshot, args.threads), "DuckDB")]
+        try:
+            attached = DuckDbEngine(db_path, "sqlite", args.threads)
+            attached.read(lambda conn: conn.execute("SELECT 1").fetchone())
+            engines.append(("duckdb sqlite", attached, "DuckDB"))
+        except Exception as e:
+            print(f"(skipping DuckDB over the SQLite file: {e.__class__.__name__}: {str(e).splitlines()[0]})")
+
+        results = [(label, time_engine(engine, dialect, args.repeats)) for label, engine, dialect in engines]
+        rows = SqliteEngine().read(lambda conn: conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0])
+
+    print(f"--- QUERY ENGINES ({rows:,} rows, {os.cpu_count()} CPUs, median of {args.repeats}, "
+          f"Parquet snapshot {snapshot_seconds:.1f} s) ---")
+    print(f"{'query':<20}" + "".join(f"{label:>16}" for label, _ in results) + f"{'speedup':>10}")
+    for name, _, _ in QUERIES:
+        times = [timings[name] for _, timings in results]
+        print(f"{name:<20}" + "".join(f"{ms:>13.1f} ms" for ms in times) + f"{times[0] / min(times[1:]):>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
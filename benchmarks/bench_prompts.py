@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Before litellm is imported: no network fetch of the model cost map.
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+import httpx
+
+from bench_agent import load_questions
+from fake_llm_server import FakeProvider, serve_in_thread
+from setup_database import create_database
+
+
+async def conversations(client, questions: list, sessions: int, turns: int) -> int:
+    # `sessions` conversations of `turns` questions each, one at a time.
+    asked = 0
+    for s in range(sessions):
+        session_id = None
+        for t in range(turns):
+            prompt = questions[(s + t) % len(questions)]
+            response = (await client.post("/agent/query", params={
+                "prompt": prompt, "session_id": session_id, "no_cache": True,
+            } if session_id else {"prompt": prompt, "no_cache": True})).json()
+            session_id = response.get("session_id")
+            asked += 1
+    return asked
+
+
+async def run(args, provider: FakeProvider):
+    from app import main
+
+    questions = load_questions(args.questions)
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            print(f"--- PROMPT TOKENS PER QUESTION ({args.sessions} sessions x {args.turns} turns, "
+                  f"AGENT_ROUTING={os.getenv('AGENT_ROUTING', 'root')}, "
+                  f"LLM_CONTEXT_BUDGET={os.getenv('LLM_CONTEXT_BUDGET', 'default')}) ---")
+            print(f"{'pass':<10}{'LLM calls':>10}{'prompt':>10}{'cached':>10}{'uncached':>10}{'largest':>10}{'wall s':>8}")
+            for name in ("cold", "repeat"):
+                before = provider.stats_dict()
+                provider.largest_prompt = 0
+                start = time.perf_counter()
+                asked = await conversations(client, questions, args.sessions, args.turns)
+                wall = time.perf_counter() - start
+                after = provider.stats_dict()
+                calls = after["requests"] - before["requests"]
+                prompt = (after["prompt_tokens"] - before["prompt_tokens"]) / asked
+                cached = (after["cached_tokens"] - before["cached_tokens"]) / asked
+                print(f"{name:<10}{calls:>10}{prompt:>10.0f}{cached:>10.0f}{prompt - cached:>10.0f}"
+                      f"{provider.largest_prompt:>10}{wall:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt and provider-cached tokens per question, over the wire")
+    parser.add_argument("--sessions", type=int, default=5)
+    parser.add_argument("--turns", type=int, default=4, help="questions per session (the history grows)")
+    parser.add_argument("--questions", help="JSONL file of prompts ({\"prompt\": ...} per line)")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per fake provider call")
+    parser.add_argument("--port", type=int, default=8041)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    provider = FakeProvider(latency=args.latency)
+    serve_in_thread(provider, args.port)
+    # Read by app.agent_setup when it is imported.
+    os.environ["LLM_API_BASE"] = f"http://127.0.0.1:{args.port}/v1"
+    # Token counts, not admission pacing, are measured here.
+    os.environ.setdefault("LLM_RPM", "0")
+    os.environ.setdefault("LLM_TPM", "0")
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "app", "static"))
+        create_database(os.path.join(tmp, "demo.db"), args.rows, args.seed)
+        os.chdir(tmp)
+        asyncio.run(run(args, provider))
+
+
+if __name__ == "__main__":
+    main()
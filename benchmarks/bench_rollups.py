@@ -0,0 +1,88 @@
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from setup_database import create_database
+
+# Agent-style aggregates the daily rollup can answer; each must return the
+# same rows from the rollup as from sales.
+EQUIVALENT = [
+    "SELECT region, SUM(amount) FROM sales GROUP BY region ORDER BY region",
+    "SELECT product, SUM(amount) AS revenue, AVG(quantity) FROM sales GROUP BY product ORDER BY product",
+    "SELECT strftime('%Y-%m', date) AS month, COUNT(*) AS orders FROM sales GROUP BY month ORDER BY month",
+    "SELECT category, TOTAL(quantity), COUNT(amount) FROM sales WHERE region IN ('North', 'West') "
+    "GROUP BY category ORDER BY category",
+    "SELECT UPPER(region) AS r, ROUND(SUM(amount), 2) FROM sales GROUP BY r ORDER BY r",
+    "SELECT COUNT(DISTINCT product), MIN(date), MAX(date) FROM sales",
+]
+# Queries a rollup would answer wrongly; they must stay on sales.
+NOT_REWRITTEN = [
+    # The rollup's bookkeeping columns (row_count, sum_*, cnt_*) would be selected.
+    "SELECT * FROM sales GROUP BY region",
+    # GROUP_CONCAT over pre-grouped rows lists each group once, not each sale.
+    "SELECT region, GROUP_CONCAT(product) FROM sales GROUP BY region",
+    "SELECT region, SUM(amount * quantity) FROM sales GROUP BY region",
+]
+
+
+def same_rows(a: list, b: list) -> bool:
+    return len(a) == len(b) and all(
+        len(x) == len(y) and all(
+            math.isclose(u, v, rel_tol=1e-9) if isinstance(u, float) or isinstance(v, float) else u == v
+            for u, v in zip(x, y))
+        for x, y in zip(a, b))
+
+
+def timed(conn, query: str, repeats: int):
+    runs, rows = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = conn.execute(query).fetchall()
+        runs.append(time.perf_counter() - start)
+    return rows, statistics.median(runs) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rollup rewrites: equivalence with the source table and speedup")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "demo.db")
+        create_database(db_path, args.rows, args.seed, rollup=True)
+        # The app reads DB_PATH when it is imported.
+        os.environ["DB_PATH"] = db_path
+        from app.db import _read
+        from app.rollups import rewrite_query
+
+        failures = []
+        print(f"--- ROLLUP REWRITES ({args.rows:,} rows, median of {args.repeats}) ---")
+        print(f"{'query':<100}{'source ms':>10}{'rollup ms':>10}{'speedup':>9}")
+        for query in EQUIVALENT:
+            rewritten = _read(rewrite_query, query)
+            exact, exact_ms = _read(timed, query, args.repeats)
+            rolled, rolled_ms = _read(timed, rewritten, args.repeats)
+            if rewritten == query:
+                failures.append(f"not rewritten: {query}")
+            elif not same_rows(exact, rolled):
+                failures.append(f"different rows: {query}")
+            print(f"{query[:98]:<100}{exact_ms:>10.1f}{rolled_ms:>10.1f}{exact_ms / rolled_ms:>8.1f}x")
+        for query in NOT_REWRITTEN:
+            if _read(rewrite_query, query) != query:
+                failures.append(f"rewritten: {query}")
+        if failures:
+            sys.exit("FAIL:\n" + "\n".join(failures))
+        print(f"\n{len(EQUIVALENT)} rewrites match the source table; {len(NOT_REWRITTEN)} unsafe queries stay on it")
+
+
+if __name__ == "__main__":
+    main()
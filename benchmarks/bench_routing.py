@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from google.adk.runners import InMemoryRunner
+from google.adk.tools.agent_tool import AgentTool
+from google.genai.types import Content, Part
+
+from fake_llm import ScriptedLlm
+from setup_database import create_database
+from app.agents.agent import direct_agent, root_agent
+from app.agents.sub_agents.sql_agent.tools import sql_agent
+from app.streaming import event_text
+
+QUESTIONS = [
+    "What is the total revenue?",
+    "Total sales by region",
+    "Which product sells the most?",
+    "Revenue by category",
+    "Monthly revenue trend",
+]
+
+
+async def ask(runner, fake: ScriptedLlm, question: str):
+    session = await runner.session_service.create_session(app_name=runner.app_name, user_id="bench")
+    calls = fake.calls
+    start = time.perf_counter()
+    text = ""
+    async for event in runner.run_async(
+        user_id="bench", session_id=session.id, new_message=Content(parts=[Part(text=question)], role="user")
+    ):
+        text += event_text(event)
+    elapsed = time.perf_counter() - start
+    if "<answer>" not in text:
+        raise RuntimeError(f"No answer for {question!r}: {text!r}")
+    return elapsed, fake.calls - calls
+
+
+async def run(args):
+    fake = ScriptedLlm(latency=args.llm_latency)
+    for agent in (root_agent, sql_agent, direct_agent):
+        agent.model = fake
+
+    root_runner = InMemoryRunner(agent=root_agent, app_name="bench")
+    direct_runner = InMemoryRunner(agent=direct_agent, app_name="bench")
+
+    print(f"--- ROUTING ({args.repeat} runs per question, stub LLM latency {args.llm_latency * 1000:.0f} ms) ---")
+    print(f"{'question':<32} {'root ms':>9} {'direct ms':>10} {'saved ms':>9} {'LLM calls':>10}")
+    saved_all = []
+    for question in QUESTIONS:
+        root_times, direct_times = [], []
+        for _ in range(args.repeat):
+            t, root_calls = await ask(root_runner, fake, question)
+            root_times.append(t)
+            t, direct_calls = await ask(direct_runner, fake, question)
+            direct_times.append(t)
+        root_ms = statistics.median(root_times) * 1000
+        direct_ms = statistics.median(direct_times) * 1000
+        saved_all.append(root_ms - direct_ms)
+        print(f"{question:<32} {root_ms:>9.1f} {direct_ms:>10.1f} {root_ms - direct_ms:>9.1f} {root_calls:>4} -> {direct_calls:<3}")
+
+    print()
+    print(f"Median latency saved per question: {statistics.median(saved_all):.1f} ms")
+
+    per_call = timeit.timeit(lambda: AgentTool(agent=sql_agent), number=1000) / 1000
+    print(f"AgentTool construction avoided per call_sql_agent: {per_call * 1e6:.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Root-agent route vs direct SQL-agent route with a stub LLM")
+    parser.add_argument("--llm-latency", type=float, default=0.25, help="seconds per stub LLM call")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        create_database()
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import VersionProbe
+from app.agents.sub_agents.sql_agent.schema_cache import SchemaCache
+from app.agents.sub_agents.sql_agent.schema_index import estimate_tokens
+
+DOMAINS = [
+    "sales", "customer", "orders", "invoice", "payment", "inventory", "warehouse", "shipment",
+    "supplier", "employee", "payroll", "department", "campaign", "lead", "ticket", "subscription",
+    "product", "pricing", "refund", "budget", "asset", "contract", "vendor", "store",
+]
+SUFFIXES = [
+    "", "history", "archive", "daily", "monthly", "detail", "summary", "audit", "staging",
+    "snapshot", "event", "log", "metric", "dim", "fact", "map", "backup", "queue", "rollup",
+    "forecast", "target",
+]
+COLUMN_POOL = [
+    ("name", "TEXT"), ("status", "TEXT"), ("region", "TEXT"), ("country", "TEXT"),
+    ("city", "TEXT"), ("category", "TEXT"), ("channel", "TEXT"), ("currency", "TEXT"),
+    ("amount", "REAL"), ("quantity", "INTEGER"), ("price", "REAL"), ("discount", "REAL"),
+    ("created_at", "DATE"), ("updated_at", "DATE"), ("owner", "TEXT"), ("priority", "TEXT"),
+    ("score", "REAL"), ("email", "TEXT"), ("phone", "TEXT"), ("notes", "TEXT"),
+]
+VALUES = {
+    "status": ["open", "closed", "pending", "shipped"],
+    "region": ["North", "South", "East", "West"],
+    "country": ["Germany", "India", "Brazil", "Canada"],
+    "city": ["Berlin", "Pune", "Recife", "Toronto"],
+    "category": ["Electronics", "Furniture", "Accessories"],
+    "channel": ["web", "retail", "partner"],
+    "currency": ["EUR", "INR", "BRL", "CAD"],
+    "priority": ["low", "medium", "high"],
+}
+
+QUESTIONS = [
+    ("What is the total sales amount by region?", "sales"),
+    ("Show a pie chart of sales by product", "sales"),
+    ("How many open support tickets per priority?", "ticket"),
+    ("List employees and their department", "employee"),
+    ("Which supplier has the most late shipments?", "shipment"),
+    ("Monthly payroll cost trend", "payroll"),
+    ("Total client order amount per client name", "client_orders"),
+]
+
+
+def build_database(path: str, n_tables: int, rows_per_table: int, seed: int = 7):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE sales (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product TEXT NOT NULL,
+            category TEXT NOT NULL,
+            region TEXT NOT NULL,
+            amount INTEGER NOT NULL,
+            quantity INTEGER NOT NULL,
+            date DATE NOT NULL
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO sales (product, category, region, amount, quantity, date) VALUES (?, ?, ?, ?, ?, ?)",
+        [(rng.choice(["Laptop", "Mouse", "Desk Chair"]), rng.choice(VALUES["category"]),
+          rng.choice(VALUES["region"]), rng.randint(20, 5000), rng.randint(1, 5), "2023-01-01")
+         for _ in range(rows_per_table)],
+    )
+
+    # A foreign-key pair: a question about one should bring the other in once.
+    conn.execute("CREATE TABLE clients (id INTEGER PRIMARY KEY, client_name TEXT, segment TEXT)")
+    conn.execute("CREATE TABLE client_orders (id INTEGER PRIMARY KEY, client_id INTEGER REFERENCES clients(id), "
+                 "order_amount REAL, order_date DATE)")
+
+    names = [f"{d}_{s}" if s else d for s in SUFFIXES for d in DOMAINS]
+    names = [n for n in names if n != "sales"][: n_tables - 1]
+    for table in names:
+        columns = rng.sample(COLUMN_POOL, rng.randint(5, 12))
+        cols_sql = ", ".join(f"{c} {t}" for c, t in columns)
+        conn.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY AUTOINCREMENT, {cols_sql}) -- {table.replace('_', ' ')} records")
+        rows = []
+        for _ in range(rows_per_table):
+            row = []
+            for c, t in columns:
+                if c in VALUES:
+                    row.append(rng.choice(VALUES[c]))
+                elif t == "TEXT":
+                    row.append(f"{c}_{rng.randint(1, 999)}")
+                elif t == "DATE":
+                    row.append(f"2023-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+                else:
+                    row.append(round(rng.random() * 1000, 2))
+            rows.append(row)
+        placeholders = ", ".join("?" * len(columns))
+        conn.executemany(f"INSERT INTO {table} ({', '.join(c for c, _ in columns)}) VALUES ({placeholders})", rows)
+    conn.commit()
+    conn.close()
+
+
+def count_tokens(text: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema context size before/after relevance pruning")
+    parser.add_argument("--tables", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=20)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--budget", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        build_database(path, args.tables, args.rows)
+        cache = SchemaCache(VersionProbe(path), db_file=path)
+
+        start = time.perf_counter()
+        full = cache.render()
+        cold_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        cache.render()
+        warm_ms = (time.perf_counter() - start) * 1000
+
+        full_tokens = count_tokens(full)
+        print(f"--- SCHEMA PRUNING ({args.tables} tables, top_k={args.top_k}, budget={args.budget} tokens) ---")
+        print(f"Catalog load (cold): {cold_ms:.1f} ms, cached: {warm_ms:.3f} ms")
+        print(f"Full dump: {len(full)} chars, ~{estimate_tokens(full)} tokens (char/4)"
+              + (f", {full_tokens} tokens (cl100k)" if full_tokens is not None else ""))
+        print()
+        print(f"{'question':<48} {'chars':>8} {'~tokens':>8} {'reduction':>10} {'ms':>7}  tables  hit")
+        total_chars = 0
+        duplicates = []
+        for question, expected in QUESTIONS:
+            start = time.perf_counter()
+            pruned = cache.render_for(question, top_k=args.top_k, token_budget=args.budget)
+            ms = (time.perf_counter() - start) * 1000
+            total_chars += len(pruned)
+            hit = f"Table: {expected}" in pruned
+            reduction = 100 * (1 - len(pruned) / len(full))
+            print(f"{question[:48]:<48} {len(pruned):>8} {estimate_tokens(pruned):>8} {reduction:>9.1f}% {ms:>7.2f}  {pruned.count('Table: '):>6}  {'yes' if hit else 'NO'}")
+            rendered = [line.strip() for line in pruned.splitlines() if line.strip().startswith("Table: ")]
+            if len(rendered) != len(set(rendered)):
+                duplicates.append(question)
+        avg = total_chars / len(QUESTIONS)
+        print()
+        print(f"Average pruned context: {avg:.0f} chars, ~{avg / 4:.0f} tokens "
+              f"({100 * (1 - avg / len(full)):.1f}% smaller than the full dump)")
+        if duplicates:
+            sys.exit(f"FAIL: tables rendered twice for: {'; '.join(duplicates)}")
+
+
+if __name__ == "__main__":
+    main()
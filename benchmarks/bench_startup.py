@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that should only be loaded by the lifespan stages, not by importing
+# app.main.
+HEAVY = ["google.adk", "litellm", "google.genai", "plotly", "pandas"]
+
+# Runs in a fresh interpreter: import, lifespan startup, then the first chart.
+CHILD = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+from app import main
+from app.charts import render_chart
+from app.startup import timings
+
+async def run():
+    async with main.lifespan(main.app):
+        ready = time.perf_counter() - started
+        while main.CHART_PREWARM == "background" and "charts" not in timings:
+            await asyncio.sleep(0.01)
+        start = time.perf_counter()
+        render_chart(["a", "b", "c"], [1, 2, 3], "line")
+        first_chart = time.perf_counter() - start
+    print(json.dumps({"ready": ready, "first_chart": first_chart, "stages": timings}))
+
+asyncio.run(run())
+"""
+
+
+def parse_importtime(stderr: str):
+    # -> ({module: cumulative seconds}, {top-level package: self seconds}, modules in import order)
+    totals, by_package, modules = {}, defaultdict(float), []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        self_us, cumulative_us, name = int(parts[0]), int(parts[1]), parts[2].strip()
+        modules.append(name)
+        package = ".".join(name.split(".")[:2]) if name.startswith("google.") else name.split(".")[0]
+        by_package[package] += self_us / 1e6
+        totals[name] = cumulative_us / 1e6
+    return totals, by_package, modules
+
+
+def run_child(cwd: str, env: dict, *extra):
+    return subprocess.run([sys.executable, *extra], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start cost of the app: -X importtime and lifespan stages")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per measurement (median reported)")
+    parser.add_argument("--top", type=int, default=12, help="packages listed by import time")
+    parser.add_argument("--chart-prewarm", default="background", choices=["background", "on", "off"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "app", "static"))
+        env = {**os.environ, "PYTHONPATH": ROOT, "GROQ_API_KEY": os.getenv("GROQ_API_KEY", "bench"),
+               "CHART_PREWARM": args.chart_prewarm, "LITELLM_LOCAL_MODEL_COST_MAP": "True"}
+        sys.path.insert(0, ROOT)
+        from setup_database import create_database
+
+        create_database(os.path.join(tmp, "demo.db"), 1000, 0)
+
+        # app.agent_runtime is what the "agents" stage imports.
+        code = "import app.main; import app.agent_runtime"
+        imports = [parse_importtime(run_child(tmp, env, "-X", "importtime", "-c", code).stderr)
+                   for _ in range(args.runs)]
+        startups = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            result = json.loads(run_child(tmp, env, "-c", CHILD).stdout.strip().splitlines()[-1])
+            result["process"] = time.perf_counter() - start
+            startups.append(result)
+
+    median = statistics.median
+    print(f"--- STARTUP BENCHMARK (median of {args.runs} fresh interpreters, CHART_PREWARM={args.chart_prewarm}) ---")
+    print(f"import app.main (-X importtime)   {median(t['app.main'] for t, _, _ in imports) * 1000:8.0f} ms")
+    print(f"import app.agent_runtime          {median(t['app.agent_runtime'] for t, _, _ in imports) * 1000:8.0f} ms")
+    modules = imports[0][2]
+    by_main = modules[:modules.index("app.main") + 1]
+    loaded = [name for name in HEAVY if any(m == name or m.startswith(name + ".") for m in by_main)]
+    print(f"heavy modules loaded by import    {', '.join(loaded) if loaded else 'none'}")
+    for stage in startups[0]["stages"]:
+        print(f"stage {stage:<27} {median(s['stages'][stage] for s in startups) * 1000:8.0f} ms")
+    print(f"import + lifespan (ready)         {median(s['ready'] for s in startups) * 1000:8.0f} ms")
+    print(f"first chart after startup         {median(s['first_chart'] for s in startups) * 1000:8.0f} ms")
+    print(f"whole process                     {median(s['process'] for s in startups) * 1000:8.0f} ms")
+    print("\nSelf import time by package (app.main and app.agent_runtime):")
+    by_package = defaultdict(list)
+    for _, packages, _ in imports:
+        for package, seconds in packages.items():
+            by_package[package].append(seconds)
+    ranked = sorted(by_package.items(), key=lambda item: -median(item[1]))[:args.top]
+    for package, seconds in ranked:
+        print(f"  {package:<30} {median(seconds) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from bench_agent import DEFAULT_QUESTIONS, percentile
+from setup_database import create_database
+
+FOLLOW_UP = "And by category?"
+
+
+def start_server(args, tmp: str, workers: int, port: int, provider_port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "PYTHONPATH": ROOT,
+        "WEB_CONCURRENCY": str(workers),
+        "STATE_BACKEND": args.state,
+        "STATE_DB_PATH": os.path.join(tmp, f"state-{workers}.db"),
+        "DB_PATH": os.path.join(tmp, "demo.db"),
+        "CHART_DIR": os.path.join(tmp, "charts"),
+        "LLM_API_BASE": f"http://127.0.0.1:{provider_port}/v1",
+        "GROQ_API_KEY": os.getenv("GROQ_API_KEY", "bench"),
+        "LLM_RPM": "0",
+        "LLM_TPM": "0",
+        "CHART_PREWARM": "off",
+        "LITELLM_LOCAL_MODEL_COST_MAP": "True",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_provider(port: int, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats").raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    raise RuntimeError(f"fake provider did not start on port {port}")
+
+
+async def wait_ready(client: httpx.AsyncClient, workers: int, timeout: float = 180) -> set:
+    # Each worker answers only once its lifespan has finished; keep asking
+    # until every worker process has answered at least once.
+    pids, deadline = set(), time.monotonic() + timeout
+    while time.monotonic() < deadline and len(pids) < workers:
+        try:
+            pids.add((await client.get("/api/cache/stats")).json()["worker_pid"])
+        except httpx.HTTPError:
+            await asyncio.sleep(0.5)
+    return pids
+
+
+async def load(client: httpx.AsyncClient, concurrency: int, requests: int):
+    latencies, errors, next_index = [], 0, 0
+
+    async def worker():
+        nonlocal errors, next_index
+        while next_index < requests:
+            i, next_index = next_index, next_index + 1
+            question = DEFAULT_QUESTIONS[i % len(DEFAULT_QUESTIONS)]
+            start = time.perf_counter()
+            response = await client.post("/agent/query", params={"prompt": question, "no_cache": True})
+            if response.status_code == 200 and "<answer>" in response.json().get("response", ""):
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+async def continuity(client: httpx.AsyncClient, sessions: int, turns: int):
+    # Follow-ups land on whichever worker accepts the connection; a session
+    # survives only if that worker can see it.
+    kept = total = 0
+    for i in range(sessions):
+        first = await client.post("/agent/query", params={"prompt": DEFAULT_QUESTIONS[i % len(DEFAULT_QUESTIONS)]})
+        session_id = first.json().get("session_id")
+        for _ in range(turns):
+            # A fresh connection per request, so the kernel may pick another worker.
+            async with httpx.AsyncClient(base_url=str(client.base_url), timeout=None) as fresh:
+                response = await fresh.post("/agent/query", params={"prompt": FOLLOW_UP, "session_id": session_id})
+            total += 1
+            kept += response.json().get("session_id") == session_id
+    return kept, total
+
+
+async def shared_cache(client: httpx.AsyncClient, repeats: int):
+    question = "What is the total revenue?"
+    await client.post("/agent/query", params={"prompt": question})
+    hits = 0
+    for _ in range(repeats):
+        async with httpx.AsyncClient(base_url=str(client.base_url), timeout=None) as fresh:
+            response = await fresh.post("/agent/query", params={"prompt": question})
+        hits += bool(response.json().get("cached"))
+    return hits
+
+
+async def run_level(args, tmp: str, workers: int, port: int):
+    server = start_server(args, tmp, workers, port, args.provider_port)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=0)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None, limits=limits) as client:
+            pids = await wait_ready(client, workers)
+            await load(client, args.concurrency, args.concurrency)  # warm-up
+            latencies, errors, wall = await load(client, args.concurrency, args.requests)
+            kept, total = await continuity(client, args.sessions, args.turns)
+            hits = await shared_cache(client, args.repeats)
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "workers": workers, "ready": len(pids), "rps": len(latencies) / wall,
+        "p50": percentile(latencies, 50) * 1000, "p95": percentile(latencies, 95) * 1000, "errors": errors,
+        "kept": kept, "turns": total, "hits": hits,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and shared state with 1..N uvicorn workers")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--state", default="sqlite", choices=["sqlite", "memory"], help="STATE_BACKEND for the server")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=120, help="measured requests per worker count")
+    parser.add_argument("--sessions", type=int, default=4, help="sessions in the continuity check")
+    parser.add_argument("--turns", type=int, default=4, help="follow-ups per session")
+    parser.add_argument("--repeats", type=int, default=8, help="repeats of a cached question")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake completion")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--port", type=int, default=8031)
+    parser.add_argument("--provider-port", type=int, default=8032)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "app", "static"))
+        create_database(os.path.join(tmp, "demo.db"), args.rows, 0)
+        provider = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "benchmarks", "fake_llm_server.py"), "--rpm", "0",
+             "--port", str(args.provider_port), "--latency", str(args.latency)],
+            env={**os.environ, "LITELLM_LOCAL_MODEL_COST_MAP": "True"},
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_provider(args.provider_port)
+            results = [asyncio.run(run_level(args, tmp, int(n), args.port)) for n in args.workers.split(",")]
+        finally:
+            provider.terminate()
+            provider.wait()
+
+    print(f"--- WORKER SCALING ({os.cpu_count()} CPUs, STATE_BACKEND={args.state}, concurrency {args.concurrency}, "
+          f"fake LLM {args.latency * 1000:.0f} ms) ---")
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'err':>5} {'sessions kept':>14} {'cache hits':>11}")
+    for r in results:
+        print(f"{r['workers']:>7} {r['rps']:>8.2f} {r['p50']:>8.0f} {r['p95']:>8.0f} {r['errors']:>5} "
+              f"{r['kept']:>7}/{r['turns']:<6} {r['hits']:>5}/{args.repeats:<5}")
+    if results[0]["rps"]:
+        print("\nScaling vs 1 worker: " + ", ".join(f"{r['workers']}w x{r['rps'] / results[0]['rps']:.2f}" for r in results))
+
+
+if __name__ == "__main__":
+    main()
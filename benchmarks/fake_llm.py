@@ -0,0 +1,124 @@
+import asyncio
+import random
+import re
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from pydantic import PrivateAttr
+
+CHART_RE = re.compile(r"\b(chart|plot|graph|visuali[sz]e)", re.IGNORECASE)
+
+
+def pick_sql(question: str, dialect: str = "SQLite") -> str:
+    q = question.lower()
+    if "month" in q or "trend" in q or "over time" in q:
+        month = "strftime(CAST(date AS DATE), '%Y-%m')" if dialect == "DuckDB" else "strftime('%Y-%m', date)"
+        return f"SELECT {month} AS month, SUM(amount) AS revenue FROM sales GROUP BY month ORDER BY month"
+    for dim in ("product", "region", "category"):
+        if dim in q:
+            return f"SELECT {dim}, SUM(amount) AS revenue FROM sales GROUP BY {dim} ORDER BY revenue DESC"
+    return "SELECT SUM(amount) AS revenue, COUNT(*) AS orders FROM sales"
+
+
+def _turn(llm_request: LlmRequest):
+    # The question is the last user text; everything after it is this turn's
+    # tool traffic, which tells us which step of the script we are on.
+    question, responses = "", []
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            if part.function_response:
+                responses.append(part.function_response)
+            elif part.text and content.role == "user":
+                question, responses = part.text, []
+    return question, responses
+
+
+def _result_text(response) -> str:
+    payload = response.response or {}
+    return str(payload.get("result", payload))
+
+
+def _call(name: str, **args) -> LlmResponse:
+    return LlmResponse(content=types.Content(
+        role="model", parts=[types.Part(function_call=types.FunctionCall(name=name, args=args))]
+    ))
+
+
+def _text(text: str) -> LlmResponse:
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+def _chart_args(result: str) -> dict:
+    # execute_sql output: "rows: N", "result_id: r_...", then a CSV header.
+    lines = result.splitlines()
+    result_id = next((line.split(":", 1)[1].strip() for line in lines if line.startswith("result_id:")), "")
+    header = next((line for line in lines if not line.startswith(("rows:", "result_id:"))), "")
+    columns = header.split(",")
+    if not result_id or len(columns) < 2:
+        return {"x": ["total"], "y": [0]}
+    return {"result_id": result_id, "x_column": columns[0], "y_column": columns[1]}
+
+
+class ScriptedLlm(BaseLlm):
+    # Deterministic stand-in for LiteLlm. It recognises the agent it is serving
+    # from the tools on the request and replays the tool calls a well-behaved
+    # model would make, sleeping `latency` (+/- `jitter`) seconds per call.
+    model: str = "scripted"
+    latency: float = 0.0
+    jitter: float = 0.0
+    seed: int = 0
+    calls: int = 0
+    llm_seconds: float = 0.0
+    _rng: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        self._rng = random.Random(self.seed)
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False):
+        self.calls += 1
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        delay = self.latency + (self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        response = self._next(llm_request)
+        self.llm_seconds += loop.time() - start
+        yield response
+
+    def _next(self, llm_request: LlmRequest) -> LlmResponse:
+        question, responses = _turn(llm_request)
+        results = [(r.name, _result_text(r)) for r in responses]
+        instruction = str(getattr(llm_request.config, "system_instruction", "") or "")
+        step = next_step(question, set(llm_request.tools_dict), results, instruction)
+        if step[0] == "call":
+            return _call(step[1], **step[2])
+        return _text(step[1])
+
+
+def next_step(question: str, tools: set, results: list, instruction: str):
+    # The scripted conversation: ("call", tool, args) or ("text", answer),
+    # given the tools on offer and this turn's (tool, result) pairs so far.
+    # Shared by ScriptedLlm and the HTTP stand-in in fake_llm_server.py.
+    done = [name for name, _ in results]
+
+    if "call_sql_agent" in tools:
+        if "call_sql_agent" not in done:
+            return "call", "call_sql_agent", {"question": question}
+        data = results[done.index("call_sql_agent")][1]
+        if CHART_RE.search(question) and "generate_plot" not in done:
+            plot_type = "pie" if "pie" in question.lower() else "line" if "trend" in question.lower() else "bar"
+            return "call", "generate_plot", {"plot_type": plot_type, **_chart_args(data)}
+        body = results[-1][1] if done[-1] == "generate_plot" else data
+        return "text", f"<answer>\n{body}\n</answer>"
+
+    if "get_schema" not in done:
+        return "call", "get_schema", {}
+    if "execute_sql" not in done:
+        dialect = "DuckDB" if "local DuckDB database" in instruction else "SQLite"
+        return "call", "execute_sql", {"query": pick_sql(question, dialect)}
+    result = results[done.index("execute_sql")][1]
+    if "<answer>" in instruction:
+        return "text", f"<answer>\n{result}\n</answer>"
+    return "text", result
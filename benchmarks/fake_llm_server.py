@@ -0,0 +1,223 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from fake_llm import next_step
+
+
+class Quota:
+    # Sliding one-minute windows of requests and tokens, like a provider's
+    # RPM/TPM limits (0 = unlimited).
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = deque()
+        self._tokens = deque()
+
+    def retry_after(self, tokens: int) -> float:
+        now = time.monotonic()
+        for window in (self._requests, self._tokens):
+            while window and window[0][0] <= now - 60:
+                window.popleft()
+        waits = []
+        if self.rpm and len(self._requests) >= self.rpm:
+            waits.append(self._requests[0][0] + 60 - now)
+        excess = sum(n for _, n in self._tokens) + tokens - self.tpm
+        if self.tpm and excess > 0:
+            # Wait until enough of the window's tokens have expired.
+            expires = 60.0
+            for at, n in self._tokens:
+                expires = at + 60 - now
+                excess -= n
+                if excess <= 0:
+                    break
+            waits.append(expires)
+        if waits:
+            return max(waits)
+        self._requests.append((now, 1))
+        self._tokens.append((now, tokens))
+        return 0.0
+
+
+class PrefixCache:
+    # Provider-side prompt caching the way OpenAI-compatible APIs do it: a
+    # prompt of at least `minimum` tokens reuses the longest prefix (tools,
+    # then messages, in order) already seen, in `block`-token steps.
+    # Tokens are approximated as 4 bytes of the serialized prompt.
+    def __init__(self, minimum: int = 1024, block: int = 128, capacity: int = 100_000):
+        self.minimum = minimum * 4
+        self.block = block * 4
+        self.capacity = capacity
+        self._seen = {}
+
+    def lookup(self, body: dict) -> int:
+        prompt = (json.dumps(body.get("tools") or [], sort_keys=True)
+                  + "".join(json.dumps(message, sort_keys=True) for message in body.get("messages", []))).encode()
+        digest, cached, start = hashlib.sha256(), 0, 0
+        for end in range(self.minimum, len(prompt) + 1, self.block):
+            digest.update(prompt[start:end])
+            start = end
+            key = digest.copy().digest()
+            if key in self._seen:
+                cached = end
+            self._seen[key] = None
+        while len(self._seen) > self.capacity:
+            del self._seen[next(iter(self._seen))]
+        return cached // 4
+
+
+def _message_text(content) -> str:
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def parse_turn(body: dict):
+    # OpenAI chat messages -> (question, tools, [(tool, result)], instruction).
+    question, results, names, instruction = "", [], {}, ""
+    for message in body.get("messages", []):
+        role = message.get("role")
+        if role == "system":
+            instruction += _message_text(message.get("content"))
+        elif role == "user":
+            question, results = _message_text(message.get("content")), []
+        elif role == "assistant":
+            for call in message.get("tool_calls") or []:
+                names[call["id"]] = call["function"]["name"]
+        elif role == "tool":
+            text = _message_text(message.get("content"))
+            try:
+                payload = json.loads(text)
+                text = str(payload.get("result", payload)) if isinstance(payload, dict) else text
+            except ValueError:
+                pass
+            results.append((names.get(message.get("tool_call_id"), message.get("name", "")), text))
+    tools = {tool["function"]["name"] for tool in body.get("tools") or []}
+    return question, tools, results, instruction
+
+
+class FakeProvider:
+    # An OpenAI-compatible /v1/chat/completions endpoint that follows the
+    # same script as ScriptedLlm, with provider-style limits: over quota it
+    # answers 429 with "Please try again in Xs", like Groq does.
+    def __init__(self, rpm: int = 0, tpm: int = 0, latency: float = 0.2):
+        self.quota = Quota(rpm, tpm)
+        self.latency = latency
+        self.cache = PrefixCache()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.largest_prompt = 0
+        self.rate_limited = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.app = Starlette(routes=[
+            Route("/v1/chat/completions", self.completions, methods=["POST"]),
+            Route("/stats", self.stats, methods=["GET"]),
+        ])
+
+    def stats_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "rate_limited": self.rate_limited,
+            "max_in_flight": self.max_in_flight,
+        }
+
+    async def stats(self, request: Request):
+        return JSONResponse(self.stats_dict())
+
+    async def completions(self, request: Request):
+        raw = await request.body()
+        body = json.loads(raw)
+        prompt_tokens = len(raw) // 4
+        self.requests += 1
+        wait = self.quota.retry_after(prompt_tokens)
+        if wait:
+            self.rate_limited += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": str(max(1, round(wait)))},
+                content={"error": {
+                    "message": f"Rate limit reached for model `{body.get('model')}`. Please try again in {wait:.2f}s.",
+                    "type": "requests", "code": "rate_limit_exceeded",
+                }},
+            )
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+        cached_tokens = self.cache.lookup(body)
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        self.largest_prompt = max(self.largest_prompt, prompt_tokens)
+        step = next_step(*parse_turn(body))
+        if step[0] == "call":
+            message = {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": step[1], "arguments": json.dumps(step[2])},
+            }]}
+            finish = "tool_calls"
+        else:
+            message = {"role": "assistant", "content": step[1]}
+            finish = "stop"
+        completion_tokens = len(json.dumps(message)) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens,
+                 "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": body.get("model")}
+
+        if not body.get("stream"):
+            return JSONResponse({**base, "object": "chat.completion", "usage": usage,
+                                 "choices": [{"index": 0, "message": message, "finish_reason": finish}]})
+
+        delta = dict(message)
+        if "tool_calls" in delta:
+            delta["tool_calls"] = [{**call, "index": 0} for call in delta["tool_calls"]]
+
+        async def chunks():
+            for choice, extra in (({"index": 0, "delta": delta, "finish_reason": None}, {}),
+                                  ({"index": 0, "delta": {}, "finish_reason": finish}, {"usage": usage})):
+                yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [choice], **extra})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+def serve_in_thread(provider: FakeProvider, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(provider.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for the LLM provider")
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--rpm", type=int, default=30, help="requests per minute before answering 429 (0 = no limit)")
+    parser.add_argument("--tpm", type=int, default=0, help="tokens per minute before answering 429 (0 = no limit)")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per completion")
+    args = parser.parse_args()
+    print(f"Point the app at it with LLM_API_BASE=http://127.0.0.1:{args.port}/v1")
+    uvicorn.run(FakeProvider(args.rpm, args.tpm, args.latency).app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
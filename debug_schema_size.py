@@ -1,9 +1,17 @@
-from app.agents.sub_agents.alloydb.tools import get_schema
+import sys
+from app.agents.sub_agents.sql_agent.schema_cache import schema_cache
 import logging
 logging.basicConfig(level=logging.INFO)
 
-s = get_schema()
+s = schema_cache.render()
 print(f"--- SCHEMA SIZE ---")
 print(f"Characters: {len(s)}")
 print(f"Estimated Tokens (char/4): {len(s)/4}")
 print(f"First 500 chars:\n{s[:500]}")
+
+if len(sys.argv) > 1:
+    question = " ".join(sys.argv[1:])
+    p = schema_cache.render_for(question)
+    print(f"--- PRUNED FOR: {question} ---")
+    print(f"Characters: {len(p)}")
+    print(f"Estimated Tokens (char/4): {len(p)/4}")
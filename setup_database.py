@@ -1,15 +1,23 @@
+import argparse
 import sqlite3
 import os
 import random
 from datetime import datetime, timedelta
 
-DB_FILE = "demo.db"
+DB_FILE = os.getenv("DB_PATH", "demo.db")
+BATCH_SIZE = 100_000
 
-def create_database():
-    if os.path.exists(DB_FILE):
-        os.remove(DB_FILE)
+def create_database(db_file=DB_FILE, rows=150, seed=None, rollup=False):
+    if os.path.exists(db_file):
+        os.remove(db_file)
     
-    conn = sqlite3.connect(DB_FILE)
+    rng = random.Random(seed)
+    conn = sqlite3.connect(db_file)
+    if rows > BATCH_SIZE:
+        # Bulk loads of millions of rows: durability doesn't matter for a
+        # freshly generated file.
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
     cursor = conn.cursor()
 
     # Create sales table
@@ -35,31 +43,48 @@ def create_database():
     
     regions = ['North', 'South', 'East', 'West']
     
-    sales_data = []
     base_date = datetime(2023, 1, 1)
+    dates = [(base_date + timedelta(days=d)).strftime('%Y-%m-%d') for d in range(181)]
+    categories = list(product_catalog.keys())
     
-    # Generate 150 records for better data density
-    for _ in range(150):
-        category = random.choice(list(product_catalog.keys()))
-        prod, price = random.choice(product_catalog[category])
-        region = random.choice(regions)
-        
-        # Add some price variation and calculate quantity
-        unit_price = price + random.randint(-5, 5)
-        quantity = random.randint(1, 5)
-        total_amount = unit_price * quantity
-        
-        # Random date within 180 days
-        day_offset = random.randint(0, 180)
-        date_str = (base_date + timedelta(days=day_offset)).strftime('%Y-%m-%d')
-        
-        sales_data.append((prod, category, region, total_amount, quantity, date_str))
-        
-    cursor.executemany("INSERT INTO sales (product, category, region, amount, quantity, date) VALUES (?, ?, ?, ?, ?, ?)", sales_data)
+    # Generate `rows` records (150 by default for better data density)
+    inserted = 0
+    while inserted < rows:
+        sales_data = []
+        for _ in range(min(BATCH_SIZE, rows - inserted)):
+            category = rng.choice(categories)
+            prod, price = rng.choice(product_catalog[category])
+            region = rng.choice(regions)
+            
+            # Add some price variation and calculate quantity
+            unit_price = price + rng.randint(-5, 5)
+            quantity = rng.randint(1, 5)
+            total_amount = unit_price * quantity
+            
+            # Random date within 180 days
+            date_str = rng.choice(dates)
+            
+            sales_data.append((prod, category, region, total_amount, quantity, date_str))
+            
+        cursor.executemany("INSERT INTO sales (product, category, region, amount, quantity, date) VALUES (?, ?, ?, ?, ?, ?)", sales_data)
+        inserted += len(sales_data)
 
     conn.commit()
+    if rollup:
+        from app.rollups import create_rollup
+
+        # Daily totals per product, category and region for the agent's usual group-bys.
+        created = create_rollup(conn, "sales", ["date", "product", "category", "region"], ["amount", "quantity"])
+        conn.commit()
+        print(f"Built {created['name']} with {created['groups']} groups.")
     conn.close()
-    print(f"Database {DB_FILE} created. Populated 'sales' table with {len(sales_data)} rows.")
+    print(f"Database {db_file} created. Populated 'sales' table with {inserted} rows.")
 
 if __name__ == "__main__":
-    create_database()
+    parser = argparse.ArgumentParser(description="Create the demo SQLite database")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--rows", type=int, default=150)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--rollup", action="store_true", help="also build the daily sales rollup table")
+    args = parser.parse_args()
+    create_database(args.db, args.rows, args.seed, args.rollup)